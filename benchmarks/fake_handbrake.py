@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Stand-in for HandBrakeCLI used by the benchmarks (and handy for trying OBSRecode without a GPU).
+
+Understands the arguments OBSRecode passes: `--scan --json -t 1 -i <file>`
+prints a title set, anything else "encodes" -i into -o while printing -v
+style log lines and carriage-return progress lines. Behaviour is set with
+environment variables so it can be swapped in through handbrake_cli_path:
+
+    FAKE_HB_DURATION     source duration in seconds (default 60)
+    FAKE_HB_SOURCE_FPS   source frame rate (default 60)
+    FAKE_HB_WIDTH/HEIGHT source resolution (default 1920x1080)
+    FAKE_HB_CODEC        source video codec (default h264)
+    FAKE_HB_FPS          encode speed in frames per second, 0 = instant (default 600)
+    FAKE_HB_UPDATE       seconds between progress lines (default 0.25)
+    FAKE_HB_OUTPUT_BYTES output size; default is -b/-B bitrate x duration
+    FAKE_HB_FAIL_RATE    probability 0-1 that an encode fails half way (default 0)
+    FAKE_HB_STALL_RATE   probability 0-1 that an encode hangs half way, like on a corrupt file (default 0)
+    FAKE_HB_LOG_LINES    extra -v log lines printed per encode (default 40)
+"""
+import os
+import sys
+import json
+import time
+import random
+
+def env(name, default, cast=float):
+    value = os.environ.get(name)
+    return cast(value) if value not in (None, "") else default
+
+def arg(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+def parse_seconds(value):
+    return float(value.split(":", 1)[1]) if value and value.startswith("seconds:") else None
+
+def scan(args):
+    duration = int(env("FAKE_HB_DURATION", 60))
+    fps = env("FAKE_HB_SOURCE_FPS", 60)
+    title = {
+        "Duration": {"Hours": duration // 3600, "Minutes": duration % 3600 // 60, "Seconds": duration % 60},
+        "FrameRate": {"Num": int(fps * 1000), "Den": 1000},
+        "Geometry": {"Width": int(env("FAKE_HB_WIDTH", 1920)), "Height": int(env("FAKE_HB_HEIGHT", 1080))},
+        "VideoCodec": os.environ.get("FAKE_HB_CODEC", "h264")
+    }
+    sys.stderr.write(f"[{time.strftime('%H:%M:%S')}] scan: DVD has 1 title\n")
+    print("JSON Title Set: " + json.dumps({"TitleList": [title]}, indent=4))
+    return 0
+
+def encode(args):
+    output_file = arg(args, "-o")
+    duration = env("FAKE_HB_DURATION", 60)
+    start = parse_seconds(arg(args, "--start-at")) or 0
+    length = parse_seconds(arg(args, "--stop-at"))
+    duration = max(min(length, duration - start) if length else duration - start, 0)
+    frame_rate = min(env("FAKE_HB_SOURCE_FPS", 60), float(arg(args, "--rate", 1000)))
+    frames = duration * frame_rate
+    speed = env("FAKE_HB_FPS", 600)
+    update = env("FAKE_HB_UPDATE", 0.25)
+    fails = random.random() < env("FAKE_HB_FAIL_RATE", 0)
+    stalls = random.random() < env("FAKE_HB_STALL_RATE", 0)
+
+    stamp = time.strftime("%H:%M:%S")
+    lines = [f"[{stamp}] hb_init: starting libhb thread", f"[{stamp}] 1 job(s) to process"]
+    lines += [f"[{stamp}]   + decoder: h264, frame {i * 1000}" for i in range(int(env("FAKE_HB_LOG_LINES", 40, int)))]
+    sys.stdout.write("\n".join(lines) + "\n")
+    with open(output_file, "wb"):
+        pass
+
+    started = time.monotonic()
+    done = 0.0
+    while done < frames:
+        if speed > 0:
+            time.sleep(update)
+            done = min(frames, (time.monotonic() - started) * speed)
+        else:
+            done = frames
+        percent = done / frames * 100 if frames else 100.0
+        elapsed = time.monotonic() - started
+        avg = done / elapsed if elapsed > 0 else 0.0
+        current = avg * random.uniform(0.9, 1.1)
+        eta = int((frames - done) / avg) if avg else 0
+        sys.stdout.write(
+            f"Encoding: task 1 of 1, {percent:.2f} % ({current:.2f} fps, avg {avg:.2f} fps, "
+            f"ETA {eta // 3600:02d}h{eta % 3600 // 60:02d}m{eta % 60:02d}s)\r"
+        )
+        sys.stdout.flush()
+        if fails and percent >= 50:
+            sys.stdout.write(f"\n[{time.strftime('%H:%M:%S')}] Encode failed (error 3)\n")
+            return 3
+        if stalls and percent >= 50:
+            while True:
+                time.sleep(60)  # Until the watchdog kills it
+
+    output_bytes = env("FAKE_HB_OUTPUT_BYTES", None, int)
+    if output_bytes is None:
+        kbps = float(arg(args, "-b", 6000)) + float(arg(args, "-B", 160))
+        output_bytes = int(kbps * 1000 / 8 * duration)
+    with open(output_file, "wb") as f:
+        f.truncate(output_bytes)  # Sparse where the file system allows it
+    sys.stdout.write(f"\n[{time.strftime('%H:%M:%S')}] Encode done!\n")
+    return 0
+
+def main():
+    args = sys.argv[1:]
+    return scan(args) if "--scan" in args else encode(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
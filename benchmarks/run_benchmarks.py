@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""OBSRecode benchmarks and regression checks against a fake HandBrakeCLI.
+
+Checks the results of the parsing helpers, the slot scheduler, disk
+space admission, journal lookups by relative and absolute path,
+cancelling a file and restarting a cancelled engine, then measures directory scans, the encode slot scheduler,
+log/UI event throughput and end-to-end per-file overhead, and writes the
+numbers to a JSON file. The exit code is 1 if any check failed. Pass an
+earlier file with --compare to see what changed:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --output after.json --compare before.json
+
+Nothing outside a temporary folder is touched; settings and the job
+journal are redirected there too.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+FAKE_HANDBRAKE = os.path.join(BENCHMARK_DIR, "fake_handbrake.py")
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+class Checks:
+    """Collects pass/fail results of the regression checks."""
+
+    def __init__(self):
+        self.passed = 0
+        self.failed = []
+
+    def equal(self, name, actual, expected):
+        if actual == expected:
+            self.passed += 1
+        else:
+            self.failed.append(f"{name}: expected {expected!r}, got {actual!r}")
+
+    def raises(self, name, exception, func, *args):
+        try:
+            result = func(*args)
+        except exception:
+            self.passed += 1
+        else:
+            self.failed.append(f"{name}: expected {exception.__name__}, got {result!r}")
+
+    def results(self):
+        return {"passed": self.passed, "failed": self.failed}
+
+def fake_cli_path(work_dir):
+    """A command that runs fake_handbrake.py, usable as handbrake_cli_path."""
+    if os.name == "nt":
+        wrapper = os.path.join(work_dir, "HandBrakeCLI.cmd")
+        with open(wrapper, "w") as f:
+            f.write(f'@"{sys.executable}" "{FAKE_HANDBRAKE}" %*\n')
+        return wrapper
+    wrapper = os.path.join(work_dir, "HandBrakeCLI")
+    with open(wrapper, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_HANDBRAKE}" "$@"\n')
+    os.chmod(wrapper, 0o755)
+    return wrapper
+
+def make_source_dir(path, count, subfolders=0):
+    """Create count empty recordings (plus 10% non-video files), spread over subfolders if given."""
+    folders = [os.path.join(path, f"2025-01-{i % 28 + 1:02d} {i}") for i in range(subfolders)] or [path]
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        folder = folders[i % len(folders)]
+        name = f"OBS 2025-01-01 00-{i // 60 % 60:02d}-{i % 60:02d} {i}.mkv" if i % 10 else f"notes {i}.txt"
+        open(os.path.join(folder, name), "wb").close()
+    # Age the folders like a real recordings folder; SourceIndex does not trust very recent folder mtimes
+    an_hour_ago = time.time() - 3600
+    for folder in folders + [path]:
+        os.utime(folder, (an_hour_ago, an_hour_ago))
+
+def walk_isfile(source_dir, recursive):
+    """A plain os.walk/listdir + isfile scan, as a reference for SourceIndex."""
+    from recode_engine import VALID_EXTENSIONS
+
+    found = []
+    for directory, subdirs, names in os.walk(source_dir):
+        found += [n for n in names if os.path.splitext(n)[1].lower() in VALID_EXTENSIONS
+                  and os.path.isfile(os.path.join(directory, n))]
+        if not recursive:
+            break
+    return found
+
+def bench_scan(work_dir, counts):
+    from recode_engine import DEFAULT_SETTINGS, SourceIndex
+
+    results = {}
+    for count in counts:
+        for layout, subfolders in (("flat", 0), ("nested", 100)):
+            source_dir = os.path.join(work_dir, f"scan-{layout}-{count}")
+            make_source_dir(source_dir, count, subfolders)
+            settings = copy.deepcopy(DEFAULT_SETTINGS)
+            settings.update(source_dir=source_dir, search_text="OBS", recursive_scan=bool(subfolders))
+            index = SourceIndex()
+            cold, found = timed(index.scan, settings)
+            warm, _ = timed(index.scan, settings)
+            baseline, _ = timed(walk_isfile, source_dir, bool(subfolders))
+            results[f"{layout}_{count}"] = {
+                "files": count, "found": len(found), "cold_s": cold, "warm_s": warm, "walk_isfile_s": baseline
+            }
+            shutil.rmtree(source_dir, ignore_errors=True)
+    return results
+
+def check_helpers(checks):
+    from recode_engine import parse_progress_line, partial_output_path
+    from recode_priority import parse_cpu_list
+    from recode_segments import split_duration
+
+    checks.equal("parse_progress_line full", parse_progress_line(
+        "Encoding: task 1 of 1, 50.00 % (120.00 fps, avg 110.00 fps, ETA 00h01m05s)"),
+        {"percent": 50.0, "fps": 120.0, "avg_fps": 110.0, "eta": 65})
+    checks.equal("parse_progress_line second pass", parse_progress_line("Encoding: task 2 of 2, 50.00 %"),
+                 {"percent": 75.0, "fps": None, "avg_fps": None, "eta": None})
+    checks.equal("parse_progress_line other output", parse_progress_line("[12:00:00] muxing: this may take awhile..."), None)
+    checks.equal("split_duration short", split_duration(100, 1800), [(0, None)])
+    checks.equal("split_duration even", split_duration(3600, 1800), [(0, 1800), (1800, None)])
+    checks.equal("split_duration remainder", split_duration(3601, 1800), [(0, 1201), (1201, 1201), (2402, None)])
+    checks.equal("parse_cpu_list ranges", parse_cpu_list("0-3,6"), {0, 1, 2, 3, 6})
+    checks.equal("parse_cpu_list mask", parse_cpu_list("0xa"), {1, 3})
+    checks.equal("parse_cpu_list list", parse_cpu_list([2, "5"]), {2, 5})
+    checks.equal("parse_cpu_list empty", parse_cpu_list(""), None)
+    checks.raises("parse_cpu_list negative", ValueError, parse_cpu_list, "-1")
+    checks.raises("parse_cpu_list zero mask", ValueError, parse_cpu_list, "0x0")
+    checks.equal("partial_output_path", partial_output_path(os.path.join("out", "RE a.mkv")), os.path.join("out", "RE a.mkv.part"))
+
+def check_scheduler(checks):
+    """A job that queues more work after shutdown() (as segment helpers do) must still see it run."""
+    from recode_engine import SlotScheduler
+
+    ran = []
+    started = threading.Event()
+    closed = threading.Event()
+
+    def run_job(job, profile):
+        ran.append(job)
+        if job == "first":
+            started.set()
+            closed.wait(5)
+            scheduler.submit("late")
+    scheduler = SlotScheduler([{"name": "cpu", "slots": 2}], 2, run_job)
+    scheduler.submit("first")
+    started.wait(5)
+    shutdown = threading.Thread(target=scheduler.shutdown, daemon=True)
+    shutdown.start()
+    while not scheduler.closed:
+        time.sleep(0.01)
+    time.sleep(0.1)  # Let the dispatcher see the empty, closed queue first
+    closed.set()
+    shutdown.join(10)
+    checks.equal("scheduler runs jobs queued after shutdown", sorted(ran), ["first", "late"])
+
+def check_admission(checks, work_dir):
+    """A running encode's original is not free space until it is deleted."""
+    from recode_engine import DEFAULT_SETTINGS, RecodeEngine
+    from recode_profiles import enabled_profiles
+
+    if os.name == "nt":
+        return  # Needs sparse files
+    free = shutil.disk_usage(work_dir).free
+    running, candidate = os.path.join(work_dir, "running.mkv"), os.path.join(work_dir, "candidate.mkv")
+    # Without probe info the output estimate is the source size
+    for path, size in ((running, free // 2), (candidate, free * 3 // 4)):
+        with open(path, "wb") as f:
+            f.truncate(size)
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(output_dir=work_dir, delete_original=True, min_free_space_mb=0)
+    engine = RecodeEngine(settings)
+    profile = enabled_profiles(settings)[0]
+    checks.equal("admission of the running file", engine.admit(running, profile), True)
+    checks.equal("admission counting originals still encoding as free", engine.admit(candidate, profile), False)
+    os.remove(running)
+    os.remove(candidate)
+
+def check_journal_paths(checks, work_dir):
+    """A file the journal finished under a relative path is found again under its absolute path."""
+    from recode_engine import DEFAULT_SETTINGS, find_video_files, output_path_for, source_file_for
+    from recode_journal import JobJournal
+
+    source_dir = os.path.join(work_dir, "paths-source")
+    make_source_dir(source_dir, 3)
+    name, other = sorted(n for n in os.listdir(source_dir) if n.endswith(".mkv"))
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(source_dir="paths-source", output_dir="paths-output", search_text="OBS")
+    journal = JobJournal(os.path.join(work_dir, "paths_jobs.sqlite"))
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        relative = os.path.join("paths-source", name)
+        journal.finish(source_file_for(relative), output_path_for(settings, relative))
+        checks.equal("journal key of a relative path", source_file_for(relative), source_file_for(os.path.join(source_dir, name)))
+        checks.equal("output path of a relative output_dir", output_path_for(settings, relative),
+                     output_path_for(dict(settings, output_dir=os.path.join(work_dir, "paths-output")), relative))
+    finally:
+        os.chdir(previous_dir)
+    settings["source_dir"] = source_dir
+    checks.equal("journal lookup by absolute path", find_video_files(settings, journal), [os.path.join(source_dir, other)])
+    journal.close()
+
+def check_resubmit(checks, work_dir):
+    """A file cancelled while encoding and submitted again gets a new job that encodes it."""
+    import asyncio
+    from recode_async import AsyncRecodeEngine
+    from recode_engine import DEFAULT_SETTINGS
+
+    source_dir = os.path.join(work_dir, "resubmit-source")
+    make_source_dir(source_dir, 2)
+    input_file = os.path.join(source_dir, sorted(os.listdir(source_dir))[-1])
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(source_dir=source_dir, output_dir=os.path.join(work_dir, "resubmit-output"), delete_original=False,
+                    handbrake_cli_path=fake_cli_path(work_dir), skip_efficient=False, max_concurrent_jobs=1)
+    os.makedirs(settings["output_dir"])
+    os.environ.update(FAKE_HB_FPS="60", FAKE_HB_DURATION="2", FAKE_HB_OUTPUT_BYTES="1024")
+
+    async def cancel_and_resubmit():
+        engine = AsyncRecodeEngine(settings)
+        await engine.start()
+        try:
+            first = engine.submit(input_file)
+            while first.status != "processing":
+                await asyncio.sleep(0.05)
+            first.cancel()
+            second = engine.submit(input_file)
+            records = await asyncio.gather(first, second)
+            return [record["status"] for record in records] + [second is not first]
+        finally:
+            await engine.wait()
+    try:
+        statuses = asyncio.run(asyncio.wait_for(cancel_and_resubmit(), 30))
+    except asyncio.TimeoutError:
+        statuses = "timed out"
+    checks.equal("cancel then resubmit while encoding", statuses, ["cancelled", "encoded", True])
+
+def check_restart(checks, work_dir):
+    """An engine whose batch was cancelled encodes the files of its next batch."""
+    from recode_engine import DEFAULT_SETTINGS, RecodeEngine
+
+    source_dir = os.path.join(work_dir, "restart-source")
+    make_source_dir(source_dir, 3)
+    input_files = [os.path.join(source_dir, name) for name in sorted(os.listdir(source_dir)) if name.endswith(".mkv")]
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(source_dir=source_dir, output_dir=os.path.join(work_dir, "restart-output"), delete_original=False,
+                    handbrake_cli_path=fake_cli_path(work_dir), skip_efficient=False)
+    os.makedirs(settings["output_dir"])
+    os.environ.update(FAKE_HB_FPS="0", FAKE_HB_DURATION="1", FAKE_HB_OUTPUT_BYTES="1024")
+    statuses = []
+    engine = RecodeEngine(settings, on_event=lambda kind, **data: kind == "job" and statuses.append(data["record"]["status"]))
+    engine.start()
+    engine.submit_many(input_files)
+    engine.cancel()
+    engine.wait()
+    statuses.clear()
+    engine.start()
+    engine.submit_many(input_files)
+    engine.wait()
+    checks.equal("second batch after cancel", statuses, ["encoded"] * len(input_files))
+
+def run_checks(work_dir):
+    checks = Checks()
+    check_helpers(checks)
+    check_scheduler(checks)
+    check_admission(checks, work_dir)
+    check_journal_paths(checks, work_dir)
+    check_resubmit(checks, work_dir)
+    check_restart(checks, work_dir)
+    return checks.results()
+
+def bench_scheduler(job_count, sleep_jobs, sleep_seconds):
+    from recode_engine import SlotScheduler
+
+    profiles = [{"name": "gpu", "slots": 4}, {"name": "cpu", "slots": 2}]
+    slot_total = 6
+
+    # Throughput: jobs that do nothing, so only dispatch and thread start-up are measured
+    scheduler = SlotScheduler(profiles, slot_total, lambda job, profile: None)
+    started = time.perf_counter()
+    for i in range(job_count):
+        scheduler.submit(i)
+    scheduler.shutdown()
+    noop_seconds = time.perf_counter() - started
+
+    # Utilisation: short sleeping jobs; how much of the slots' time was spent in jobs
+    lock = threading.Lock()
+    busy = {"gpu": 0.0, "cpu": 0.0}
+    counts = {"gpu": 0, "cpu": 0}
+
+    def run_job(job, profile):
+        job_started = time.perf_counter()
+        time.sleep(sleep_seconds)
+        with lock:
+            busy[profile["name"]] += time.perf_counter() - job_started
+            counts[profile["name"]] += 1
+    scheduler = SlotScheduler(profiles, slot_total, run_job)
+    started = time.perf_counter()
+    for i in range(sleep_jobs):
+        scheduler.submit(i, key=-i)  # Reverse order keys exercise the priority heap
+    scheduler.shutdown()
+    wall = time.perf_counter() - started
+    return {
+        "noop_jobs": job_count,
+        "noop_jobs_per_s": job_count / noop_seconds,
+        "sleep_jobs": sleep_jobs,
+        "sleep_job_s": sleep_seconds,
+        "sleep_wall_s": wall,
+        "slot_utilisation": sum(busy.values()) / (wall * slot_total),
+        "jobs_per_profile": counts
+    }
+
+def bench_events(work_dir, count):
+    from recode_engine import DEFAULT_SETTINGS, RecodeEngine
+    from recode_logging import AsyncFileLog
+
+    results = {}
+    events = queue.Queue()
+    engine = RecodeEngine(copy.deepcopy(DEFAULT_SETTINGS), on_event=lambda kind, **data: events.put((kind, data)))
+    seconds, _ = timed(lambda: [engine.log_message(f"line {i}", "DEBUG") for i in range(count)])
+    results["engine_events_per_s"] = count / seconds
+
+    file_log = AsyncFileLog(os.path.join(work_dir, "bench_log.txt"))
+    logger = logging.getLogger("OBSRecode.benchmark")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(file_log.handler)
+    enqueue, _ = timed(lambda: [logger.debug(f"line {i}") for i in range(count)])
+    flush, _ = timed(file_log.close)
+    logger.removeHandler(file_log.handler)
+    results["file_log_enqueue_per_s"] = count / enqueue
+    results["file_log_total_per_s"] = count / (enqueue + flush)
+    results["gui"] = bench_gui_events(count)
+    return results
+
+def bench_gui_events(count):
+    """Feed log lines and progress events through the window's event queue; skipped without a display."""
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+    except Exception as e:
+        return {"skipped": f"no Tk display ({e})"}
+    from recode_gui import OBSRecodeGUI
+
+    root.withdraw()
+    app = OBSRecodeGUI(root)
+    app.settings_valid = True
+    app.settings["output_dir"] = app.settings["output_dir"] or tempfile.gettempdir()
+    for i in range(count):
+        app.log_message(f"line {i}")
+        if i % 10 == 0:
+            app.handle_engine_event("progress", input_file="bench.mkv", percent=i * 100 / count, fps=100.0, avg_fps=100.0, eta=60)
+    started = time.perf_counter()
+    ticks = 0
+    while not app.ui_events.empty():
+        app.process_ui_events()
+        root.update()
+        ticks += 1
+    seconds = time.perf_counter() - started
+    root.destroy()
+    return {"events": count + count // 10, "events_per_s": (count + count // 10) / seconds, "ticks": ticks}
+
+def bench_end_to_end(work_dir, file_count, slots):
+    from recode_engine import DEFAULT_SETTINGS, PROBE_WORKERS, RecodeEngine, find_video_files
+    from recode_journal import JobJournal
+
+    source_dir = os.path.join(work_dir, "e2e-source")
+    output_dir = os.path.join(work_dir, "e2e-output")
+    make_source_dir(source_dir, file_count)
+    os.makedirs(output_dir)
+    cli_path = fake_cli_path(work_dir)
+    os.environ.update(FAKE_HB_FPS="0", FAKE_HB_DURATION="10", FAKE_HB_OUTPUT_BYTES="1024")
+
+    # Cost of the fake encoder alone, to separate OBSRecode's overhead from process start-up
+    sample = os.path.join(source_dir, os.listdir(source_dir)[0])
+    runs = 10
+    started = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run([cli_path, "-i", sample, "-o", os.path.join(work_dir, "baseline.mkv")], stdout=subprocess.DEVNULL)
+    fake_seconds = (time.perf_counter() - started) / runs
+
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(source_dir=source_dir, output_dir=output_dir, handbrake_cli_path=cli_path, delete_original=False,
+                    skip_efficient=False, max_concurrent_jobs=slots, disk_space_check=True)
+    settings["encoder_profiles"] = {"nvenc_av1": {"encoder": "nvenc_av1", "slots": slots}}
+    journal = JobJournal(os.path.join(work_dir, "bench_jobs.sqlite"))
+    events = []
+    engine = RecodeEngine(settings, on_event=lambda kind, **data: events.append(kind), journal=journal)
+    files = find_video_files(settings, journal)
+    wall, _ = timed(engine.run, files)
+    journal.close()
+    # Wall time if only the fake processes ran: probes on PROBE_WORKERS and encodes on the slots, pipelined
+    ideal = len(files) * fake_seconds / min(PROBE_WORKERS, slots) + fake_seconds
+    return {
+        "files": len(files),
+        "slots": slots,
+        "probe_workers": PROBE_WORKERS,
+        "wall_s": wall,
+        "files_per_s": len(files) / wall,
+        "fake_encoder_s": fake_seconds,
+        "ideal_wall_s": ideal,
+        "overhead_s_per_file": (wall - ideal) / len(files),
+        "failed": engine.failed_files,
+        "events": len(events)
+    }
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(previous, current):
+    """Print every numeric result next to the previous run's value."""
+    old, new = flatten(previous["results"]), flatten(current["results"])
+    width = max((len(name) for name in new), default=0)
+    print(f"{'metric'.ljust(width)}  {'previous':>12}  {'current':>12}  change")
+    for name in sorted(new):
+        if name in old and old[name]:
+            print(f"{name.ljust(width)}  {old[name]:12.4g}  {new[name]:12.4g}  {(new[name] / old[name] - 1) * 100:+.1f}%")
+        else:
+            print(f"{name.ljust(width)}  {'-':>12}  {new[name]:12.4g}")
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_DIR,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OBSRecode against a fake HandBrakeCLI.")
+    parser.add_argument("--output", default=os.path.join(BENCHMARK_DIR, "benchmark_results.json"),
+                        help="JSON file for the results (default: benchmarks/benchmark_results.json)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare against")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, for a fast smoke run")
+    parser.add_argument("--only", action="append", choices=["checks", "scan", "scheduler", "events", "end_to_end"],
+                        help="run only these benchmarks (repeatable)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="obsrecode-bench-")
+    # Settings and the job journal live under the settings folder; keep them out of the user's
+    os.environ["APPDATA"] = work_dir
+    os.environ["XDG_CONFIG_HOME"] = work_dir
+    sys.path.insert(0, REPO_DIR)
+
+    selected = args.only or ["checks", "scan", "scheduler", "events", "end_to_end"]
+    results = {}
+    try:
+        if "checks" in selected:
+            results["checks"] = run_checks(work_dir)
+        if "scan" in selected:
+            results["scan"] = bench_scan(work_dir, [1000, 10000] if args.quick else [10000, 100000])
+        if "scheduler" in selected:
+            results["scheduler"] = bench_scheduler(2000 if args.quick else 20000, 300 if args.quick else 1200, 0.005)
+        if "events" in selected:
+            results["events"] = bench_events(work_dir, 20000 if args.quick else 200000)
+        if "end_to_end" in selected:
+            results["end_to_end"] = bench_end_to_end(work_dir, 40 if args.quick else 200, 4)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "quick": args.quick,
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=4)
+    print(json.dumps(results, indent=4))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    if results.get("checks", {}).get("failed"):
+        print("Failed checks:\n" + "\n".join(results["checks"]["failed"]))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
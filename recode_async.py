@@ -0,0 +1,210 @@
+"""asyncio front end to RecodeEngine, for driving OBSRecode from other programs.
+
+    engine = AsyncRecodeEngine(settings, journal=JobJournal())
+    events = engine.events()  # Subscribe before submitting so nothing is missed
+    await engine.start()
+    jobs = engine.submit_many(paths)
+    async for event in events:  # Ends once wait() has finished
+        if isinstance(event, ProgressEvent):
+            print(event.input_file, event.percent)
+    records = await asyncio.gather(*jobs)
+
+Encodes keep running on the engine's threads: the slot scheduler starts a
+thread for each job, with at most max_concurrent_jobs of them running at
+once, and probes run on a small pool. Every event is handed to the event
+loop with call_soon_threadsafe, so handles and streams are only touched on
+the loop.
+"""
+import asyncio
+from collections import namedtuple
+
+from recode_engine import RecodeEngine
+from recode_metrics import finish_job_record, job_record
+
+# One type per RecodeEngine event kind, fields as documented there
+LogEvent = namedtuple("LogEvent", ["message", "level"])
+QueuedEvent = namedtuple("QueuedEvent", ["input_file"])
+PlanEvent = namedtuple("PlanEvent", ["input_file", "action", "reason"])
+StatusEvent = namedtuple("StatusEvent", ["input_file", "status"])
+ProgressEvent = namedtuple("ProgressEvent", ["input_file", "percent", "fps", "avg_fps", "eta"])
+BatchEvent = namedtuple("BatchEvent", ["processed", "total", "eta"])
+JobEvent = namedtuple("JobEvent", ["input_file", "record", "submission"])  # A job finished, record as in recode_metrics
+ResourcesEvent = namedtuple("ResourcesEvent", ["samples"])  # recode_resources.ResourceSamples, every resource_sample_interval
+EVENT_TYPES = {
+    "log": LogEvent,
+    "queued": QueuedEvent,
+    "plan": PlanEvent,
+    "status": StatusEvent,
+    "progress": ProgressEvent,
+    "batch": BatchEvent,
+    "job": JobEvent,
+    "resources": ResourcesEvent
+}
+END_OF_STREAM = object()
+STARTED_STATUSES = ("processing", "transferring")  # Jobs that report their own record when cancelled
+
+def cancelled_record(input_file):
+    """Job record for a file that was cancelled before it started."""
+    job = job_record(input_file)
+    job.update(status="cancelled", detail="cancelled before it started")
+    finish_job_record(job)
+    return job
+
+class RecodeJob:
+    """Awaitable handle of one submitted file; awaiting it returns the finished job record."""
+
+    def __init__(self, engine, input_file):
+        self.engine = engine
+        self.input_file = input_file
+        self.future = engine.loop.create_future()
+        self.submission = None  # The engine's submission number, matched against JobEvents
+        self.status = "awaiting"  # Latest StatusEvent status
+        self.percent = 0.0
+        self.cancelled = False
+
+    def __await__(self):
+        return asyncio.shield(self.future).__await__()  # Cancelling one awaiter must not resolve the job
+
+    def __repr__(self):
+        return f"<RecodeJob {self.input_file} {self.status}>"
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    def resolve(self, record):
+        if not self.future.done():
+            self.future.set_result(record)
+
+    def cancel(self):
+        """Stop this file; a running encode is terminated and reports its own cancelled record.
+
+        Submitting the file again afterwards returns a new RecodeJob.
+        """
+        self.cancelled = True
+        self.engine.engine.cancel_file(self.input_file)
+        if self.status not in STARTED_STATUSES:
+            self.resolve(cancelled_record(self.input_file))
+
+class EventStream:
+    """Async iterator over the engine's events from the moment it was created until wait() finishes."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.queue = asyncio.Queue()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.queue.get()
+        if event is END_OF_STREAM:
+            self.engine.streams.discard(self)
+            raise StopAsyncIteration
+        return event
+
+    def close(self):
+        """Stop receiving events; the iterator ends after the ones already queued."""
+        self.engine.streams.discard(self)
+        self.queue.put_nowait(END_OF_STREAM)
+
+class AsyncRecodeEngine:
+    """RecodeEngine with awaitable jobs and async event streams; create and use it on one event loop."""
+
+    def __init__(self, settings, journal=None):
+        self.engine = RecodeEngine(settings, on_event=self.on_event, journal=journal)
+        self.loop = None
+        self.jobs = {}  # input_file -> latest RecodeJob of the current batch
+        self.submitted = {}  # (input_file, submission) -> RecodeJob still waiting for its JobEvent
+        self.streams = set()
+        self.running = False
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.cancel()
+        await self.wait()
+
+    def events(self):
+        """A new EventStream; every stream receives every event."""
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        stream = EventStream(self)
+        self.streams.add(stream)
+        return stream
+
+    async def start(self):
+        """Open the encode slots for a new batch."""
+        self.loop = asyncio.get_running_loop()
+        self.jobs = {}
+        self.submitted = {}
+        self.engine.start()
+        self.running = True
+
+    def submit(self, input_file):
+        """Queue one file and return its RecodeJob (the existing one if it is still queued or running and not cancelled)."""
+        return self.submit_many([input_file])[0]
+
+    def submit_many(self, input_files):
+        if not self.running:
+            raise RuntimeError("start() the engine before submitting files")
+        handles, new_files = [], []
+        for input_file in input_files:
+            job = self.jobs.get(input_file)
+            if job is None or job.done or job.cancelled:
+                job = self.jobs[input_file] = RecodeJob(self, input_file)
+                new_files.append(job)
+            handles.append(job)
+        if new_files:
+            # Events reach dispatch on this loop, so no JobEvent can arrive before the numbers are set
+            numbers = self.engine.submit_many([job.input_file for job in new_files])
+            for job, number in zip(new_files, numbers):
+                job.submission = number
+                self.submitted[job.input_file, number] = job
+        return handles
+
+    def cancel(self):
+        """Cancel the whole batch; queued jobs resolve as cancelled, running encodes are terminated."""
+        self.engine.cancel()
+        for job in self.submitted.values():
+            if job.status not in STARTED_STATUSES:
+                job.resolve(cancelled_record(job.input_file))
+
+    async def wait(self):
+        """Wait until every submitted file is done, then end all event streams."""
+        if not self.running:
+            return
+        await self.loop.run_in_executor(None, self.engine.wait)
+        self.running = False
+        # Every event the engine emitted is already delivered: they were scheduled before this resumed
+        for job in self.submitted.values():
+            job.resolve(cancelled_record(job.input_file))
+        self.submitted = {}
+        for stream in list(self.streams):
+            stream.close()
+
+    def on_event(self, kind, **data):
+        # Called on engine threads (and on the loop by start()); the loop applies it in order
+        self.loop.call_soon_threadsafe(self.dispatch, kind, data)
+
+    def dispatch(self, kind, data):
+        event_type = EVENT_TYPES.get(kind)
+        if event_type is None:
+            return  # A newer engine event this module does not know yet
+        event = event_type(**data)
+        job = self.jobs.get(data.get("input_file"))
+        if kind == "job" and event.record["status"] != "retried":
+            # An earlier, cancelled submission of the file may finish after it was submitted again
+            finished = self.submitted.pop((event.input_file, event.submission), None)
+            if finished is not None:
+                finished.resolve(event.record)
+        elif job is not None:
+            if kind == "status":
+                job.status = event.status
+            elif kind == "progress":
+                job.percent = event.percent
+        for stream in self.streams:
+            stream.queue.put_nowait(event)
@@ -0,0 +1,472 @@
+"""Distributed encoding: a coordinator owns the queue, worker agents lease files from it.
+
+The coordinator builds the queue from source_dir (and keeps adding new
+recordings with watch_mode) and hands out one file per lease over a small
+HTTP/JSON protocol:
+
+    POST /lease      {"worker"}                 -> {"job": {"id", "path", "lease_seconds"} or null, "finished"}
+    POST /heartbeat  {"worker", "jobs": {id: progress}} -> {"lost": [ids]}
+    POST /complete   {"worker", "id", "record"} -> {"accepted"}
+    GET  /status                                -> queue counts and current leases
+
+Paths are sent relative to source_dir, so every machine can mount the shared
+folders wherever it likes. Workers encode with their own HandBrakeCLI and
+encoder profiles and write into their own output_dir, which should be the
+shared one. A lease that is not renewed within cluster_lease_seconds is
+requeued; a worker that cannot renew a lease stops that encode itself before
+the lease runs out, so a file is never written by two workers at once.
+"""
+import os
+import hmac
+import json
+import time
+import socket
+import threading
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from recode_engine import RecodeEngine, output_path_for, source_file_for
+from recode_metrics import finish_job_record, iso_time, job_record
+
+TOKEN_HEADER = "X-OBSRecode-Token"
+DEFAULT_PORT = 8765
+MAX_LOST_LEASES = 3  # Times a file may be requeued after its worker vanished before it counts as failed
+TICK_INTERVAL = 1.0  # Seconds between lease expiry checks and worker loop iterations
+IDLE_POLL_INTERVAL = 5.0  # Seconds a worker waits before asking an empty queue again
+REQUEST_TIMEOUT = 10
+COMPLETE_ATTEMPTS = 3
+
+# Job states on the coordinator
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+def relative_job_path(source_dir, input_file):
+    return os.path.relpath(input_file, source_dir).replace(os.sep, "/")
+
+def local_job_path(source_dir, path):
+    """Worker-side path of a job path; raises ValueError for paths that would leave source_dir."""
+    parts = path.replace("\\", "/").split("/")
+    if not path or not parts[0] or ".." in parts or ":" in parts[0]:
+        raise ValueError(f"Invalid job path: {path}")
+    return os.path.abspath(os.path.join(source_dir, *parts))
+
+def parse_address(text):
+    """Parse "[host:]port" into (host, port); an empty host listens on every interface."""
+    host, _, port = text.rpartition(":")
+    return host.strip("[]"), int(port)
+
+class ClusterJob:
+    def __init__(self, job_id, input_file, path):
+        self.id = job_id
+        self.input_file = input_file
+        self.path = path
+        self.state = QUEUED
+        self.worker = None
+        self.added = time.time()
+        self.leased = None
+        self.expires = 0.0  # time.monotonic() the current lease runs out
+        self.lost_leases = 0
+        self.progress = None  # Last heartbeat progress: percent, fps
+
+class Coordinator:
+    """Owns the job queue and hands out leases; thread-safe, served by CoordinatorServer."""
+
+    def __init__(self, settings, journal=None, metrics=None, log=None):
+        self.settings = settings
+        self.journal = journal
+        self.metrics = metrics  # JobMetrics for the records workers send back, or None
+        self.log = log or (lambda message, level="INFO": None)
+        self.token = settings.get("cluster_token") or ""
+        self.lease_seconds = float(settings.get("cluster_lease_seconds", 60))
+        self.lock = threading.Lock()
+        self.jobs = {}  # id -> ClusterJob
+        self.queue = deque()  # ids waiting for a worker, oldest first
+        self.known_files = set()  # Every input file ever queued, so repeats are ignored
+        self.next_id = 1
+        self.accepting = True  # New files may still arrive (watch mode)
+        self.done_event = threading.Event()
+        self.failed_files = 0
+        self.completed_files = 0
+
+    def add(self, input_file):
+        with self.lock:
+            if input_file in self.known_files:
+                return
+            self.known_files.add(input_file)
+            job = ClusterJob(self.next_id, input_file, relative_job_path(self.settings["source_dir"], input_file))
+            self.next_id += 1
+            self.jobs[job.id] = job
+            self.queue.append(job.id)
+            self.done_event.clear()
+
+    def close(self):
+        """No more files will be added; the coordinator is finished once the queue drains."""
+        with self.lock:
+            self.accepting = False
+            self.check_finished()
+
+    def check_finished(self):
+        # Caller holds the lock
+        if not self.accepting and all(job.state in (DONE, FAILED) for job in self.jobs.values()):
+            self.done_event.set()
+
+    @property
+    def finished(self):
+        return self.done_event.is_set()
+
+    def lease(self, worker):
+        """Next queued job for worker as a dict, or None."""
+        with self.lock:
+            while self.queue:
+                job = self.jobs[self.queue.popleft()]
+                if job.state != QUEUED:
+                    continue
+                job.state, job.worker, job.leased = LEASED, worker, time.time()
+                job.expires = time.monotonic() + self.lease_seconds
+                job.progress = None
+                break
+            else:
+                return None
+        self.log(f"Leased {job.path} to {worker}.")
+        return {"id": job.id, "path": job.path, "lease_seconds": self.lease_seconds}
+
+    def heartbeat(self, worker, progress):
+        """Renew worker's leases; returns the ids it no longer holds."""
+        lost = []
+        with self.lock:
+            for job_id, job_progress in progress.items():
+                job = self.jobs.get(int(job_id))
+                if job is None or job.state != LEASED or job.worker != worker:
+                    lost.append(int(job_id))
+                    continue
+                job.expires = time.monotonic() + self.lease_seconds
+                job.progress = job_progress
+        return lost
+
+    def complete(self, worker, job_id, record):
+        """Record a worker's result; returns False if worker no longer held the lease."""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != LEASED or job.worker != worker:
+                return False
+            status = record.get("status")
+            if status == "cancelled":
+                job.state, job.worker = QUEUED, None  # Worker shut down; someone else can take it
+                self.queue.appendleft(job.id)
+            elif status in ("encoded", "skipped"):
+                job.state = DONE
+                self.completed_files += 1
+            else:
+                job.state = FAILED
+                self.failed_files += 1
+            self.check_finished()
+        if status == "cancelled":
+            self.log(f"{worker} gave back {job.path}; requeued.")
+            return True
+        level = "ERROR" if job.state == FAILED else "INFO"
+        detail = f" ({record['detail']})" if record.get("detail") else ""
+        self.log(f"{job.path}: {status} by {worker}{detail}.", level)
+
+        if status == "encoded" and self.journal:
+            try:
+                self.journal.finish(source_file_for(job.input_file), output_path_for(self.settings, job.input_file))
+            except OSError:
+                pass  # Original already deleted, nothing to remember
+        if self.metrics:
+            # The worker measured its own queue; add the time spent waiting here
+            record = dict(record, worker=worker, input_file=job.input_file, queued_at=iso_time(job.added))
+            record["queue_wait_s"] = round((record.get("queue_wait_s") or 0) + job.leased - job.added, 3)
+            try:
+                self.metrics.add_job(record)
+            except (OSError, KeyError, ValueError) as e:
+                self.log(f"Cannot write job metrics: {e}", "WARNING")
+        return True
+
+    def expire_leases(self):
+        """Requeue jobs whose worker stopped renewing its lease."""
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for job in self.jobs.values():
+                if job.state != LEASED or job.expires > now:
+                    continue
+                job.lost_leases += 1
+                expired.append((job.path, job.worker, job.lost_leases))
+                job.worker = None
+                if job.lost_leases >= MAX_LOST_LEASES:
+                    job.state = FAILED
+                    self.failed_files += 1
+                else:
+                    job.state = QUEUED
+                    self.queue.appendleft(job.id)
+            self.check_finished()
+        for path, worker, lost_leases in expired:
+            if lost_leases >= MAX_LOST_LEASES:
+                self.log(f"Lease on {path} expired {lost_leases} times, giving up on it.", "ERROR")
+            else:
+                self.log(f"Lease of {worker} on {path} expired; requeued.", "WARNING")
+
+    def status(self):
+        with self.lock:
+            counts = {state: 0 for state in (QUEUED, LEASED, DONE, FAILED)}
+            for job in self.jobs.values():
+                counts[job.state] += 1
+            leases = [{"id": job.id, "path": job.path, "worker": job.worker, "progress": job.progress,
+                       "expires_in": round(job.expires - time.monotonic(), 1)}
+                      for job in self.jobs.values() if job.state == LEASED]
+            return {"jobs": counts, "leases": leases, "accepting": self.accepting, "finished": self.done_event.is_set()}
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    server_version = "OBSRecode"
+
+    def do_GET(self):
+        if not self.authorised():
+            return
+        if self.path == "/status":
+            self.reply(200, self.server.coordinator.status())
+        else:
+            self.reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.authorised():
+            return
+        coordinator = self.server.coordinator
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            worker = str(request["worker"])
+            if self.path == "/lease":
+                job = None if coordinator.finished else coordinator.lease(worker)
+                self.reply(200, {"job": job, "finished": coordinator.finished})
+            elif self.path == "/heartbeat":
+                self.reply(200, {"lost": coordinator.heartbeat(worker, request.get("jobs", {}))})
+            elif self.path == "/complete":
+                self.reply(200, {"accepted": coordinator.complete(worker, int(request["id"]), request.get("record", {}))})
+            else:
+                self.reply(404, {"error": "not found"})
+        except (KeyError, ValueError, TypeError) as e:
+            self.reply(400, {"error": f"bad request: {e}"})
+
+    def authorised(self):
+        token = self.server.coordinator.token
+        if token and not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), token):
+            self.reply(403, {"error": "wrong or missing token"})
+            return False
+        return True
+
+    def reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        self.server.coordinator.log(f"{self.address_string()} {format % args}", "DEBUG")
+
+class CoordinatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, coordinator):
+        super().__init__(address, CoordinatorHandler)
+        self.coordinator = coordinator
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="coordinator", daemon=True).start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class WorkerLease:
+    def __init__(self, job_id, lease_seconds):
+        self.id = job_id
+        self.lease_seconds = lease_seconds
+        self.renewed = time.monotonic()
+        self.progress = {}
+        self.submission = None  # Engine submission number of the file
+
+class Worker:
+    """Leases files from a coordinator and encodes them with a local RecodeEngine."""
+
+    def __init__(self, settings, url, journal=None, on_event=None):
+        self.settings = settings
+        self.url = url.rstrip("/")
+        self.token = settings.get("cluster_token") or ""
+        self.heartbeat_interval = float(settings.get("cluster_heartbeat_interval", 10))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.on_event = on_event
+        self.engine = RecodeEngine(settings, on_event=self.handle_event, journal=journal)
+        self.lock = threading.RLock()  # Held around engine.submit, which may report events on this thread
+        self.leases = {}  # input_file -> WorkerLease
+        self.stop_flag = threading.Event()
+        self.completed_files = 0
+        self.failed_files = 0
+        self.error = None  # Why the worker gave up on the coordinator, if it did
+
+    def log_message(self, message, level="INFO"):
+        if self.on_event:
+            self.on_event("log", message=message, level=level)
+
+    def request(self, path, payload):
+        """POST payload to the coordinator and return its JSON reply; raises OSError or ValueError."""
+        request = urllib.request.Request(
+            self.url + path, data=json.dumps(dict(payload, worker=self.worker_id)).encode("utf-8"),
+            headers={"Content-Type": "application/json", TOKEN_HEADER: self.token}
+        )
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            return json.loads(response.read())
+
+    def stop(self):
+        """Stop leasing, cancel running encodes and hand their files back. Safe from signal handlers."""
+        self.stop_flag.set()
+
+    def run(self):
+        """Lease and encode files until the coordinator is finished, then return."""
+        self.engine.start()
+        capacity = self.engine.scheduler.slot_count
+        self.log_message(f"Worker {self.worker_id} taking up to {capacity} file(s) at a time from {self.url}.")
+        give_up_after = max(float(self.settings.get("cluster_lease_seconds", 60)) * 2, 30)
+        last_contact = time.monotonic()
+        last_heartbeat = 0.0
+        next_lease = 0.0
+        finished = False
+        while not self.stop_flag.is_set():
+            now = time.monotonic()
+            if now - last_heartbeat >= self.heartbeat_interval:
+                last_heartbeat = now
+                if self.send_heartbeat():
+                    last_contact = now
+            self.fence()
+            with self.lock:
+                running = len(self.leases)
+            if finished and not running:
+                break
+            if not finished and running < capacity and now >= next_lease:
+                try:
+                    reply = self.request("/lease", {})
+                except (OSError, ValueError) as e:
+                    if getattr(e, "code", None) == 403:
+                        self.error = "the coordinator refused the token"
+                    elif not running and now - last_contact > give_up_after:
+                        self.error = f"coordinator unreachable for {give_up_after:g}s ({e})"
+                    if self.error:
+                        self.log_message(f"Stopping: {self.error}.", "ERROR")
+                        break
+                    self.log_message(f"Cannot reach coordinator: {e}", "WARNING")
+                    next_lease = now + IDLE_POLL_INTERVAL
+                else:
+                    last_contact = now
+                    finished = reply.get("finished", False)
+                    if reply.get("job"):
+                        self.start_job(reply["job"])
+                        continue  # Fill the other free slots straight away
+                    next_lease = now + IDLE_POLL_INTERVAL
+            self.stop_flag.wait(TICK_INTERVAL)
+        if self.stop_flag.is_set():
+            self.engine.cancel()
+        self.engine.wait()
+        with self.lock:
+            leftover = list(self.leases.items())
+            self.leases.clear()
+        for input_file, lease in leftover:
+            self.send_complete(lease, self.record(input_file, "cancelled"))
+
+    def start_job(self, job):
+        try:
+            input_file = local_job_path(self.settings["source_dir"], job["path"])
+        except ValueError as e:
+            self.log_message(str(e), "ERROR")
+            self.send_complete(WorkerLease(job["id"], job["lease_seconds"]), self.record(job["path"], "failed", str(e)))
+            return
+        lease = WorkerLease(job["id"], float(job["lease_seconds"]))
+        if not self.settings["auto_overwrite"] and os.path.exists(output_path_for(self.settings, input_file)):
+            # Finished by a worker whose result never reached the coordinator
+            self.log_message(f"Skipping {input_file}: output already exists.")
+            self.send_complete(lease, self.record(input_file, "skipped", "output already exists"))
+            return
+        with self.lock:
+            # A lease dropped earlier may still be stopping its encode; its record must not release this one
+            self.leases[input_file] = lease
+            lease.submission = self.engine.submit(input_file)
+
+    def handle_event(self, kind, **data):
+        if kind == "progress":
+            with self.lock:
+                lease = self.leases.get(data["input_file"])
+                if lease:
+                    lease.progress = {"percent": data["percent"], "fps": data["fps"]}
+        elif kind == "job" and data["record"]["status"] != "retried":  # A retried file stays leased
+            with self.lock:
+                lease = self.leases.get(data["input_file"])
+                if lease and lease.submission != data["submission"]:
+                    lease = None  # Record of a lease already dropped
+                if lease:
+                    del self.leases[data["input_file"]]
+                if lease and data["record"]["status"] != "cancelled":
+                    if data["record"]["status"] == "failed":
+                        self.failed_files += 1
+                    else:
+                        self.completed_files += 1
+            if lease:
+                self.send_complete(lease, data["record"])
+        if self.on_event:
+            self.on_event(kind, **data)
+
+    def send_heartbeat(self):
+        """Renew every lease; returns False if the coordinator could not be reached."""
+        with self.lock:
+            sent = {lease.id: lease for lease in self.leases.values()}
+            progress = {job_id: lease.progress for job_id, lease in sent.items()}
+        try:
+            lost = set(self.request("/heartbeat", {"jobs": progress})["lost"])
+        except (OSError, ValueError, KeyError) as e:
+            self.log_message(f"Heartbeat failed: {e}", "WARNING")
+            return False
+        now = time.monotonic()
+        for job_id, lease in sent.items():
+            if job_id in lost:
+                self.drop(lease, "the coordinator gave the file to another worker")
+            else:
+                lease.renewed = now
+        return True
+
+    def fence(self):
+        """Stop encodes whose lease may have run out on the coordinator before anyone else starts them."""
+        now = time.monotonic()
+        with self.lock:
+            stale = [lease for lease in self.leases.values()
+                     if now - lease.renewed > lease.lease_seconds - self.heartbeat_interval]
+        for lease in stale:
+            self.drop(lease, "its lease could not be renewed")
+
+    def drop(self, lease, reason):
+        with self.lock:
+            input_file = next((f for f, held in self.leases.items() if held is lease), None)
+            if input_file is None:
+                return
+            del self.leases[input_file]
+        self.log_message(f"Stopping {input_file}: {reason}.", "WARNING")
+        self.engine.cancel_file(input_file)
+
+    def record(self, input_file, status, detail=None):
+        """Job record for a file the engine never saw."""
+        record = job_record(input_file)
+        record.update(status=status, detail=detail)
+        finish_job_record(record)
+        return record
+
+    def send_complete(self, lease, record):
+        for attempt in range(COMPLETE_ATTEMPTS):
+            try:
+                if not self.request("/complete", {"id": lease.id, "record": record})["accepted"]:
+                    self.log_message(f"Coordinator no longer expected the result of job {lease.id}.", "WARNING")
+                return
+            except (OSError, ValueError, KeyError) as e:
+                error = e
+                time.sleep(attempt + 1)
+        self.log_message(f"Cannot report job {lease.id} to the coordinator: {error}", "ERROR")
@@ -0,0 +1,1603 @@
+"""GUI-free scan/encode/delete pipeline shared by the OBSRecode window and the headless CLI.
+
+Nothing in this module may import tkinter: the headless entry point has to
+start on machines without a display or a Tk installation.
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+import copy
+import json
+import fnmatch
+import heapq
+import shutil
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from recode_probe import plan_encode, probe_source
+from recode_segments import (
+    JOIN_TIMEOUT, SegmentedEncode, find_joiner, join_command, join_succeeded, segment_args, split_duration, write_concat_list
+)
+from recode_metrics import JobMetrics, finish_job_record, job_record
+from recode_priority import THROTTLED, apply_priority, encoder_priority, inherited_priority
+from recode_resources import RESOURCES_FILE, ResourceSampler, sampling_supported
+from recode_staging import StagingCache
+from recode_profiles import (
+    DEFAULT_ENCODER_PROFILES, build_encode_command, enabled_profiles, primary_profile, resolve_profile, target_bitrate
+)
+
+def get_settings_dir():
+    """Per-user settings folder: %APPDATA%\\OBSRecode on Windows, the XDG config folder elsewhere."""
+    base_dir = os.getenv('APPDATA') or os.getenv('XDG_CONFIG_HOME') or os.path.join(os.path.expanduser('~'), '.config')
+    return os.path.join(base_dir, 'OBSRecode')
+
+# Define settings file location in AppData\Roaming\OBSRecode (~/.config/OBSRecode without APPDATA)
+SETTINGS_DIR = get_settings_dir()
+SETTINGS_FILE = os.path.join(SETTINGS_DIR, 'OBSRecodeSettings.json')
+LOG_FILE = "reencode_log.txt"
+VALID_EXTENSIONS = {".mkv", ".mp4", ".mov"}
+REQUIRED_SETTINGS = ["source_dir", "output_dir", "handbrake_cli_path"]
+DEFAULT_SETTINGS = {
+    "source_dir": "",
+    "search_text": "",
+    "output_dir": "",
+    "bitrate": 6000,
+    "max_concurrent_jobs": 2,
+    "handbrake_cli_path": r"C:\Handbrake\HandBrakeCLI.exe",
+    "debug_mode": False,
+    "auto_overwrite": False,
+    "delete_original": True,
+    "write_logfile": False,
+    "log_max_mb": 10,  # Log file size before it is rotated
+    "log_backup_count": 5,  # Rotated log files kept
+    "log_rotate_daily": False,  # Rotate at midnight instead of by size
+    "log_view_lines": 5000,  # Lines kept in the GUI log view
+    "log_view_level": "DEBUG",  # Lowest level shown in the GUI log view
+    "write_metrics": False,  # Append per-job and per-batch metrics to files in output_dir
+    "metrics_format": "jsonl",  # "jsonl" or "csv"
+    "prometheus_file": "",  # Optional .prom file rewritten for the node exporter's textfile collector
+    "shutdown_after_completion": False,
+    "watch_mode": False,
+    "watch_quiet_period": 30,  # Seconds a file's size and mtime must stay unchanged before it is encoded
+    "watch_poll_interval": 5,  # Seconds between directory scans when inotify is unavailable
+    "recursive_scan": False,  # Also look in subfolders of source_dir (e.g. OBS per-day folders)
+    "include_globs": [],  # Relative paths must match one of these when set, e.g. ["2025-*/*"]
+    "exclude_globs": [],  # Relative paths (files or folders) matching any of these are skipped
+    "max_frame_rate": 60,  # Peak frame rate; sources at or below it keep their own rate
+    "skip_efficient": True,  # Skip sources that are already in skip_codecs or would not shrink
+    "skip_codecs": ["av1"],
+    "skip_bitrate_ratio": 1.2,  # Only encode sources above this multiple of the target bitrate
+    "job_order": "fifo",  # One of JOB_ORDERS
+    "segment_encoding": False,  # Split long recordings into time ranges encoded on several slots at once
+    "segment_min_duration": 7200,  # Seconds; shorter recordings are encoded in one piece
+    "segment_length": 1800,  # Seconds per segment
+    "segment_joiner_path": "",  # mkvmerge or ffmpeg; empty looks for either on PATH
+    "disk_space_check": True,  # Hold encodes whose estimated output would not fit on the output drive
+    "min_free_space_mb": 1024,  # Kept free on the output drive on top of the estimates
+    "cluster_token": "",  # Shared secret between --coordinator and --worker; empty accepts anyone
+    "cluster_lease_seconds": 60,  # A worker's file is requeued when its lease is not renewed for this long
+    "cluster_heartbeat_interval": 10,  # Seconds between a worker's lease renewals
+    "throttle_encoders": False,  # Run every encoder at recode_priority.THROTTLED, e.g. while gaming
+    "stall_timeout": 300,  # Seconds without progress or output growth before an encode is killed; 0 disables
+    "encode_timeout_ratio": 10,  # Kill encodes running this many times longer than the recording; 0 disables
+    "max_retries": 2,  # Failed or killed encodes are retried this often within a batch
+    "retry_backoff": 30,  # Seconds before the first retry, doubled for each further one
+    "quarantine_failed": True,  # Files that fail every retry are left out of later scans until they change
+    "resource_sample_interval": 2,  # Seconds between CPU, memory and I/O samples of OBSRecode and its encoders; 0 disables
+    "write_resource_samples": False,  # Also write each batch's samples to a CSV file in output_dir
+    "scratch_dir": "",  # Fast local folder HandBrake writes to; finished files are moved to output_dir in the background
+    "scratch_max_gb": 100,  # Encodes wait while scratch_dir holds this much output being encoded or waiting to move
+    "stage_dir": "",  # Fast local folder queued sources are copied to before their encode; empty reads them in place
+    "stage_ahead": 2,  # Queued files kept copied in stage_dir
+    "stage_max_gb": 50,  # Staged copies kept at most; the least recently used unneeded one is removed first
+    "encoder_profiles": DEFAULT_ENCODER_PROFILES  # See recode_profiles; first enabled profile is preferred
+}
+# Matches HandBrakeCLI progress lines, e.g.
+# "Encoding: task 1 of 1, 42.17 % (312.5 fps, avg 298.1 fps, ETA 00h03m12s)"
+PROGRESS_PATTERN = re.compile(
+    r"Encoding: task (\d+) of (\d+), ([\d.]+) %"
+    r"(?: \(([\d.]+) fps, avg ([\d.]+) fps, ETA (\d+)h(\d+)m(\d+)s\))?"
+)
+OUTPUT_TAIL_LINES = 200  # Raw HandBrakeCLI lines kept per file for error reports
+PROGRESS_UPDATE_INTERVAL = 0.5  # Seconds between per-file progress updates
+PROBE_WORKERS = 2  # Sources scanned ahead of the encode slots
+# "fifo" keeps scan order; largest_first starts long jobs early so no single job runs on alone at the end
+JOB_ORDERS = ["fifo", "largest_first", "shortest_first", "oldest_first"]
+ORDER_HOLD_SECONDS = 10  # With a job order set, wait this long for the first probes before starting encodes
+BATCH_ETA_INTERVAL = 5  # Seconds between batch ETA updates while files are encoding
+ADMISSION_RETRY_SECONDS = 10  # How often a job held for disk space rechecks the free space
+OUTPUT_SIZE_MARGIN = 1.1  # Encoders overshoot the average bitrate a little
+SEGMENT_DURATION_TOLERANCE = 2  # Seconds the joined output may differ from the source, per segment
+WATCHDOG_INTERVAL = 5  # Seconds between the watchdog's checks of running encoders
+ENCODE_TIMEOUT_MIN = 600  # Seconds; short recordings still get time for HandBrake's scan and startup
+SCAN_PROGRESS_ENTRIES = 1000  # A scan reports progress and checks for cancel this often within one folder
+TRANSFER_ATTEMPTS = 3  # Tries to move a finished encode from scratch_dir to output_dir
+TRANSFER_RETRY_SECONDS = 30
+STAGE_POLL_SECONDS = 2  # How often the staging thread looks for newly queued files
+
+def missing_required_settings(settings):
+    return [key for key in REQUIRED_SETTINGS if not settings.get(key)]
+
+def load_and_validate_settings(path=SETTINGS_FILE):
+    """Return (settings, valid); missing keys are filled from DEFAULT_SETTINGS."""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    if not os.path.exists(path):
+        return settings, False
+
+    try:
+        with open(path, "r") as f:
+            settings.update(json.load(f))
+    except (json.JSONDecodeError, Exception):
+        return copy.deepcopy(DEFAULT_SETTINGS), False
+    return settings, not missing_required_settings(settings)
+
+def save_settings_file(settings, path=SETTINGS_FILE):
+    """Write settings atomically, so a crash mid-write leaves the previous file intact."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(settings, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def handbrake_cli_found(settings):
+    cli_path = settings.get("handbrake_cli_path", "")
+    return bool(cli_path) and os.path.exists(cli_path)
+
+def matches_search(settings, file_name):
+    """True if file_name has a video extension and starts with search_text (if set)."""
+    search_text = settings["search_text"]
+    return (not search_text or file_name.startswith(search_text)) and \
+        os.path.splitext(file_name)[1].lower() in VALID_EXTENSIONS
+
+def compile_globs(patterns):
+    """Compile a list of glob patterns into one regex, or None for an empty list."""
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile("|".join(fnmatch.translate(p.replace("\\", "/")) for p in patterns), flags)
+
+SourceFile = namedtuple("SourceFile", ["path", "size", "mtime_ns"])
+
+class ScanCancelled(Exception):
+    """Raised by a scan whose cancel event was set."""
+
+class SourceIndex:
+    """Cached, single-pass index of the video files under source_dir.
+
+    Each directory is read with os.scandir and its listing (names, sizes and
+    mtimes of the video files) is reused until the directory's own mtime
+    changes, so repeated scans of an unchanged folder cost one stat per
+    directory. Sizes and mtimes are as of the last listing; anything that
+    needs the current values must stat the file itself.
+    """
+
+    # Directory mtimes this recent are not trusted, coarse timestamps may hide a change
+    MTIME_GRACE_NS = 2 * 10**9
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.listings = {}  # directory -> (mtime_ns, [(name, SourceFile)], [subdirectory names])
+        self.globs = {}  # (include, exclude) -> compiled regexes
+
+    def invalidate(self):
+        with self.lock:
+            self.listings.clear()
+
+    def list_dir(self, directory, on_entries=None, cancel=None):
+        """(mtime_ns, files, subdirs) of directory; on_entries(count) hears about every SCAN_PROGRESS_ENTRIES read."""
+        dir_mtime = os.stat(directory).st_mtime_ns
+        with self.lock:
+            cached = self.listings.get(directory)
+        if cached and cached[0] == dir_mtime and time.time_ns() - dir_mtime > self.MTIME_GRACE_NS:
+            return cached
+
+        files, subdirs = [], []
+        with os.scandir(directory) as entries:
+            for count, entry in enumerate(entries, 1):
+                if count % SCAN_PROGRESS_ENTRIES == 0:
+                    if cancel and cancel.is_set():
+                        raise ScanCancelled()
+                    if on_entries:
+                        on_entries(SCAN_PROGRESS_ENTRIES)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif os.path.splitext(entry.name)[1].lower() in VALID_EXTENSIONS and entry.is_file():
+                        # DirEntry.stat() is free on Windows and one syscall elsewhere
+                        stat = entry.stat()
+                        path = os.path.normpath(os.path.join(directory, entry.name))
+                        files.append((entry.name, SourceFile(path, stat.st_size, stat.st_mtime_ns)))
+                except OSError:
+                    continue  # Vanished or unreadable while listing
+        listing = (dir_mtime, files, subdirs)
+        with self.lock:
+            self.listings[directory] = listing
+        return listing
+
+    def compiled_globs(self, settings):
+        key = (tuple(settings.get("include_globs") or ()), tuple(settings.get("exclude_globs") or ()))
+        with self.lock:
+            if key not in self.globs:
+                self.globs[key] = (compile_globs(key[0]), compile_globs(key[1]))
+            return self.globs[key]
+
+    def scan(self, settings, keep=None, on_progress=None, cancel=None):
+        """Return a SourceFile for every video file in source_dir that matches the settings (and keep, if given).
+
+        on_progress(files found so far, directory entries read) is called as
+        the scan goes; setting the cancel event makes it raise ScanCancelled.
+        """
+        source_dir = os.path.abspath(settings["source_dir"])  # Journal keys must not depend on the working directory
+        recursive = settings.get("recursive_scan", False)
+        include, exclude = self.compiled_globs(settings)
+        found = []
+        entries_read = [0]
+
+        def on_entries(count):
+            entries_read[0] += count
+            on_progress(len(found), entries_read[0])
+
+        pending = [""]  # Directories relative to source_dir, "" is source_dir itself
+        while pending:
+            if cancel and cancel.is_set():
+                raise ScanCancelled()
+            relative_dir = pending.pop()
+            directory = os.path.join(source_dir, relative_dir) if relative_dir else source_dir
+            try:
+                _, files, subdirs = self.list_dir(directory, on_entries if on_progress else None, cancel)
+            except OSError:
+                if not relative_dir:
+                    raise
+                continue  # Subfolder removed or unreadable
+            for name, source_file in files:
+                if not matches_search(settings, name):
+                    continue
+                if include or exclude:
+                    relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                    if include and not include.match(relative_path):
+                        continue
+                    if exclude and exclude.match(relative_path):
+                        continue
+                if keep is None or keep(source_file):
+                    found.append(source_file)
+            if recursive:
+                for name in subdirs:
+                    relative_path = f"{relative_dir}/{name}" if relative_dir else name
+                    if not (exclude and exclude.match(relative_path)):
+                        pending.append(relative_path)
+            if on_progress:
+                on_progress(len(found), entries_read[0])
+        found.sort(key=lambda f: f.path)
+        return found
+
+# Shared by every scan so the GUI, CLI and watcher reuse one cached listing
+SOURCE_INDEX = SourceIndex()
+
+def find_source_files(settings, journal=None, on_progress=None, cancel=None):
+    """Return a SourceFile for every video file in source_dir that matches the settings.
+
+    Files the journal records as already encoded or quarantined (same path, size and mtime) are left out.
+    on_progress and cancel are passed on to SourceIndex.scan.
+    """
+    keep = (lambda f: not journal.is_settled(f)) if journal else None
+    return SOURCE_INDEX.scan(settings, keep, on_progress, cancel)
+
+def find_video_files(settings, journal=None, on_progress=None, cancel=None):
+    """Return absolute paths of the video files find_source_files finds."""
+    return [f.path for f in find_source_files(settings, journal, on_progress, cancel)]
+
+def source_file_for(input_file):
+    stat = os.stat(input_file)
+    return SourceFile(os.path.abspath(input_file), stat.st_size, stat.st_mtime_ns)
+
+def partial_output_path(output_file):
+    """Encoders write here first; the file is renamed to output_file only after a successful encode."""
+    return output_file + ".part"
+
+def copy_verified(source, target):
+    """Copy source to target and make sure all of it reached the target's disk; raises OSError."""
+    shutil.copyfile(source, target)
+    with open(target, "rb+") as f:
+        os.fsync(f.fileno())  # On a share this waits for the server to have the data
+    size, copied = os.path.getsize(source), os.path.getsize(target)
+    if copied != size:
+        raise OSError(f"copied {copied} of {size} bytes")
+
+def output_path_for(settings, input_file):
+    # Use the base name without extension and append .mkv
+    base_name_no_ext = os.path.splitext(os.path.basename(input_file))[0]
+    return os.path.abspath(os.path.join(settings["output_dir"], f"RE {base_name_no_ext}.mkv"))
+
+def find_existing_outputs(settings, input_files):
+    return [output_file for output_file in (output_path_for(settings, f) for f in input_files) if os.path.exists(output_file)]
+
+def resolution_key(info):
+    return f"{info['width']}x{info['height']}" if info and info.get("width") and info.get("height") else None
+
+def output_frames(settings, info):
+    """Frames the encode will produce, from the probed duration and frame rate (peak-limited)."""
+    if not info or not info.get("duration") or not info.get("fps"):
+        return None
+    return info["duration"] * min(info["fps"], float(settings["max_frame_rate"]))
+
+def order_key(settings, source_file, info, estimate):
+    """Sort key of a planned job under settings["job_order"]; smaller keys start first."""
+    order = settings.get("job_order", "fifo")
+    if order == "largest_first":
+        return -source_file.size
+    if order == "shortest_first":
+        # Predicted time, else probed duration, else size; they only need to rank similar files sensibly
+        return estimate or (info or {}).get("duration") or source_file.size
+    if order == "oldest_first":
+        return source_file.mtime_ns
+    return 0
+
+def estimate_output_bytes(settings, profile, info, source_size):
+    """Expected output size: (video + audio bitrate) x probed duration, or the source size if unknown."""
+    if not info or not info.get("duration"):
+        return source_size
+    return int(target_bitrate(settings, profile) * 1000 / 8 * info["duration"] * OUTPUT_SIZE_MARGIN)
+
+def predict_makespan(running, queued, slots):
+    """Seconds until the last job finishes when queued job times run in order on the first free slot."""
+    free_at = sorted(running)[-slots:] if running else []
+    free_at += [0.0] * (slots - len(free_at))
+    heapq.heapify(free_at)
+    for seconds in queued:
+        heapq.heappush(free_at, heapq.heappop(free_at) + seconds)
+    return max(free_at)
+
+def parse_progress_line(line):
+    """Return percent/fps/avg_fps/eta (seconds) from a HandBrakeCLI progress line, or None."""
+    match = PROGRESS_PATTERN.search(line)
+    if not match:
+        return None
+    task, task_count, percent = int(match.group(1)), int(match.group(2)), float(match.group(3))
+    # Spread multi-pass encodes over one 0-100 range
+    overall = ((task - 1) * 100 + percent) / max(task_count, 1)
+    progress = {"percent": min(overall, 100.0), "fps": None, "avg_fps": None, "eta": None}
+    if match.group(4):
+        hours, minutes, seconds = (int(match.group(i)) for i in (6, 7, 8))
+        progress["fps"] = float(match.group(4))
+        progress["avg_fps"] = float(match.group(5))
+        progress["eta"] = hours * 3600 + minutes * 60 + seconds
+    return progress
+
+def iter_output_lines(stream, chunk_size=65536, max_line=1 << 20):
+    """Yield decoded lines from a binary stream as they arrive.
+
+    HandBrakeCLI rewrites its progress line with a carriage return, so both
+    carriage returns and newlines end a line. Nothing is buffered beyond the
+    current line.
+    """
+    pending = b""
+    while True:
+        chunk = stream.read1(chunk_size)
+        if not chunk:
+            break
+        parts = re.split(rb"[\r\n]", pending + chunk)
+        pending = parts.pop()
+        if len(pending) > max_line:
+            parts.append(pending)
+            pending = b""
+        for part in parts:
+            if part:
+                yield part.decode("utf-8", "replace")
+    if pending:
+        yield pending.decode("utf-8", "replace")
+
+def remove_file(path):
+    """Delete path if it exists; failures are ignored."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def format_eta(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+class SlotScheduler:
+    """Runs queued jobs on per-profile encode slots.
+
+    Every enabled profile gets its own number of slots and max_running caps
+    the total. When several profiles have a free slot the job goes to the
+    one listed first, so a GPU profile is filled before a CPU fallback.
+    Queued jobs start in order of their submit key (ties in submit order);
+    a job submitted with a delay joins the queue once the delay is over.
+    run_job(job, profile) is called on a new thread for every job. If
+    admit(job, profile) returns False the next job is held back (and so is
+    everything queued behind it) until a job finishes or the retry timer
+    fires.
+    """
+
+    def __init__(self, profiles, max_running, run_job, admit=None):
+        self.profiles = profiles
+        self.admit = admit
+        self.free_slots = {profile["name"]: int(profile["slots"]) for profile in profiles}
+        self.max_running = max(1, max_running)
+        self.run_job = run_job
+        self.condition = threading.Condition()
+        self.jobs = []  # Heap of (key, sequence, job)
+        self.delayed = []  # Heap of (monotonic time due, sequence, key, job)
+        self.sequence = 0
+        self.running = 0
+        self.closed = False
+        self.held_until = 0.0
+        self.dispatcher = threading.Thread(target=self.dispatch, name="encode-dispatch", daemon=True)
+        self.dispatcher.start()
+
+    @property
+    def slot_count(self):
+        return min(self.max_running, sum(int(p["slots"]) for p in self.profiles))
+
+    def submit(self, job, key=0, delay=0):
+        with self.condition:
+            if delay > 0:
+                heapq.heappush(self.delayed, (time.monotonic() + delay, self.sequence, key, job))
+            else:
+                heapq.heappush(self.jobs, (key, self.sequence, job))
+            self.sequence += 1
+            self.condition.notify_all()
+
+    def queued_jobs(self):
+        """Jobs not started yet, in the order they will start."""
+        with self.condition:
+            return [job for _, _, job in sorted(self.jobs)] + [job for _, _, _, job in sorted(self.delayed)]
+
+    def promote_delayed(self):
+        """Move delayed jobs that are due into the queue; caller holds the condition."""
+        now = time.monotonic()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, sequence, key, job = heapq.heappop(self.delayed)
+            heapq.heappush(self.jobs, (key, sequence, job))
+
+    def hold(self, seconds):
+        """Start nothing for up to seconds (or until release) so early jobs can be ordered."""
+        with self.condition:
+            self.held_until = time.monotonic() + seconds
+
+    def release(self):
+        with self.condition:
+            self.held_until = 0.0
+            self.condition.notify_all()
+
+    def wake(self):
+        """Check the next job's admission again now, e.g. after space was freed."""
+        with self.condition:
+            self.condition.notify_all()
+
+    def remove(self, job):
+        """Drop job if it has not started yet (queued or delayed); returns True if it was found."""
+        with self.condition:
+            jobs = [entry for entry in self.jobs if entry[2] != job]
+            delayed = [entry for entry in self.delayed if entry[3] != job]
+            if len(jobs) == len(self.jobs) and len(delayed) == len(self.delayed):
+                return False
+            heapq.heapify(jobs)
+            heapq.heapify(delayed)
+            self.jobs, self.delayed = jobs, delayed
+            self.condition.notify_all()
+        return True
+
+    def clear(self):
+        """Drop every job that has not started yet."""
+        with self.condition:
+            self.jobs.clear()
+            self.delayed.clear()
+            self.condition.notify_all()
+
+    def free_profile(self):
+        if self.running >= self.max_running:
+            return None
+        return next((p for p in self.profiles if self.free_slots[p["name"]] > 0), None)
+
+    def dispatch(self):
+        while True:
+            with self.condition:
+                while True:
+                    self.promote_delayed()
+                    if self.closed and not self.jobs and not self.delayed and not self.running:
+                        return  # Closed and drained; running jobs may still requeue work (retries, segments)
+                    hold_left = self.held_until - time.monotonic()
+                    if hold_left <= 0 and self.jobs and self.free_profile():
+                        if self.admit is None or self.admit(self.jobs[0][2], self.free_profile()):
+                            break
+                        self.condition.wait(ADMISSION_RETRY_SECONDS)
+                        continue
+                    timeouts = [hold_left] if hold_left > 0 else []
+                    if self.delayed:
+                        timeouts.append(max(self.delayed[0][0] - time.monotonic(), 0))
+                    self.condition.wait(min(timeouts) if timeouts else None)
+                profile = self.free_profile()
+                _, _, job = heapq.heappop(self.jobs)
+                self.free_slots[profile["name"]] -= 1
+                self.running += 1
+            threading.Thread(target=self.run_slot, args=(job, profile), name=f"encode-{profile['name']}", daemon=True).start()
+
+    def run_slot(self, job, profile):
+        try:
+            self.run_job(job, profile)
+        finally:
+            with self.condition:
+                self.free_slots[profile["name"]] += 1
+                self.running -= 1
+                self.condition.notify_all()
+
+    def shutdown(self):
+        """Stop accepting jobs and block until every queued and running job has finished."""
+        with self.condition:
+            self.closed = True
+            self.held_until = 0.0
+            self.condition.notify_all()
+        self.dispatcher.join()
+        with self.condition:
+            while self.running:
+                self.condition.wait()
+
+def format_size(size):
+    return f"{size / 1024**3:.1f} GB" if size >= 1024**3 else f"{size / 1024**2:.0f} MB"
+
+class EncodeWatch:
+    """What the watchdog knows about one running HandBrakeCLI process."""
+
+    def __init__(self, process, output_file, timeout):
+        self.process = process
+        self.output_file = output_file
+        self.timeout = timeout  # Seconds the encode may take, or None for no limit
+        self.started = self.changed = time.monotonic()  # changed: last progress or output growth
+        self.percent = 0.0
+        self.size = 0
+
+    def progressed(self, percent):
+        if percent > self.percent:
+            self.percent = percent
+            self.changed = time.monotonic()
+
+class RecodeEngine:
+    """Encodes a batch of files on the HandBrakeCLI slots of the enabled encoder profiles.
+
+    The engine never touches a UI. Everything a front end needs is reported
+    through on_event(kind, **data), called from worker threads:
+
+    - "log": message, level
+    - "queued": input_file
+    - "plan": input_file, action ("encode" or "skip"), reason
+    - "status": input_file, status ("processing", "transferring" from scratch_dir, "completed", "skipped"
+      or "awaiting", also for a retry)
+    - "progress": input_file, percent, fps, avg_fps, eta
+    - "batch": processed, total, eta (predicted seconds until the batch is done, or None)
+    - "job": input_file, record (the finished job's metrics, see recode_metrics.job_record),
+      submission (which submit of input_file in this batch it finishes, as returned by submit_many)
+    - "resources": samples (recode_resources.ResourceSamples of OBSRecode and each running encoder)
+    """
+
+    def __init__(self, settings, on_event=None, journal=None):
+        self.settings = settings
+        self.on_event = on_event
+        self.journal = journal  # Optional JobJournal recording every job's state
+        self.cancel_flag = threading.Event()
+        self.dropped_files = set()  # Files stopped with cancel_file while the rest of the batch goes on
+        self.submissions = {}  # input_file -> times it was submitted in this batch
+        self.active = {}  # input_file -> number of its submission being planned, queued or encoded
+        self.deferred = {}  # input_file -> numbers of later submissions waiting for the active one to finish
+        self.state_lock = threading.Lock()  # Guards counters and processes shared by workers
+        self.current_processes = {}  # input_file, or (input_file, segment index) -> running HandBrakeCLI process
+        self.process_profiles = {}  # Same keys -> profile the process encodes with, for live priority changes
+        self.priority_errors = set()  # Priority failures already logged, so each is reported once
+        self.watches = {}  # Same keys -> EncodeWatch of the running process
+        self.watchdog_kills = {}  # Same keys -> why the watchdog killed the process
+        self.watchdog_stop = threading.Event()
+        self.watchdog = None
+        self.sampler = None  # ResourceSampler of the running batch
+        self.attempts = {}  # input_file -> failed encodes in this batch
+        self.job_info = {}  # input_file -> probe info of planned files
+        self.job_estimates = {}  # input_file -> predicted encode seconds (None if unknown)
+        self.job_remaining = {}  # input_file -> HandBrake's ETA for running files
+        self.planning = 0  # Files submitted but not probed yet
+        self.reservations = {}  # input_file -> (estimated output bytes, partial path)
+        self.scratch_dir = None  # scratch_dir of the running batch, None writes straight to output_dir
+        self.scratch_use = {}  # input_file -> bytes it holds in scratch_dir (estimated while encoding)
+        self.held_for_scratch = set()
+        self.transfers = {}  # input_file -> its finished encode in scratch_dir, waiting to move to output_dir
+        self.transfer_pool = None
+        self.staging = None  # StagingCache of the running batch when stage_dir is set
+        self.staging_stop = threading.Event()
+        self.staging_wake = threading.Event()
+        self.stager = None
+        self.held_for_space = set()  # Files already reported as waiting for disk space
+        self.queued_at = {}  # input_file -> time.time() it was submitted, for queue wait metrics
+        self.metrics = None  # JobMetrics when metrics files are enabled
+        self.last_batch_update = 0.0
+        self.scheduler = None
+        self.probe_pool = None
+        self.total_files = 0
+        self.processed_files = 0  # Encoded or skipped
+        self.skipped_files = 0
+        self.failed_files = 0
+
+    def emit(self, kind, **data):
+        if self.on_event:
+            self.on_event(kind, **data)
+
+    def log_message(self, message, level="INFO"):
+        self.emit("log", message=message, level=level)
+
+    @property
+    def cancelled(self):
+        return self.cancel_flag.is_set()
+
+    def stopped(self, input_file):
+        """True once the batch or this one file has been cancelled."""
+        if self.cancel_flag.is_set():
+            return True
+        with self.state_lock:
+            return input_file in self.dropped_files
+
+    def run(self, input_files):
+        """Encode input_files and block until the batch finishes or is cancelled."""
+        self.start()
+        self.submit_many(input_files)
+        self.wait()
+
+    def start(self):
+        """Open the encode slots; files can be submitted until wait() is called."""
+        self.cancel_flag.clear()  # A cancelled earlier batch must not cancel this one
+        with self.state_lock:
+            self.total_files = 0
+            self.processed_files = 0
+            self.skipped_files = 0
+            self.failed_files = 0
+            self.queued_at.clear()
+            self.dropped_files.clear()
+            self.submissions.clear()
+            self.active.clear()
+            self.deferred.clear()
+            self.attempts.clear()
+            self.planning = 0
+            self.job_info.clear()
+            self.job_estimates.clear()
+            self.job_remaining.clear()
+            self.reservations.clear()
+            self.held_for_space.clear()
+            self.held_for_scratch.clear()
+        self.emit("batch", processed=0, total=0, eta=None)
+
+        profiles = enabled_profiles(self.settings)
+        if not profiles:
+            raise ValueError("No encoder profile has any slots.")
+        max_jobs = max(1, int(self.settings.get("max_concurrent_jobs", 2)))
+        slots = ", ".join(f"{p['name']} x{p['slots']}" for p in profiles)
+        self.log_message(f"Encoding with {slots}, at most {max_jobs} at a time.", "DEBUG")
+        self.metrics = JobMetrics.from_settings(self.settings)
+        if self.metrics:
+            self.metrics.start_batch()
+        self.scheduler = SlotScheduler(profiles, max_jobs, self.run_encode, self.admit)
+        if self.settings.get("job_order", "fifo") != "fifo":
+            self.scheduler.hold(ORDER_HOLD_SECONDS)
+        self.probe_pool = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="probe")
+        self.start_transfers()
+        self.start_staging()
+        self.watchdog_stop = threading.Event()
+        self.watchdog = threading.Thread(target=self.watch_encodes, args=(self.watchdog_stop,), name="encode-watchdog", daemon=True)
+        self.watchdog.start()
+        self.start_sampler()
+
+    def submit(self, input_file):
+        """Queue one file for the next free slot and return its submission number. Safe to call from any thread."""
+        return self.submit_many([input_file])[0]
+
+    def submit_many(self, input_files):
+        """Queue several files and return their submission numbers; a job order applies across all of them.
+
+        A file whose earlier submission is still queued or encoding (e.g. cancelled with
+        cancel_file but not stopped yet) is planned once that submission has finished.
+        """
+        numbers = []
+        ready = []
+        with self.state_lock:
+            self.total_files += len(input_files)
+            now = time.time()
+            for input_file in input_files:
+                number = self.submissions[input_file] = self.submissions.get(input_file, 0) + 1
+                numbers.append(number)
+                if input_file in self.active:
+                    self.deferred.setdefault(input_file, []).append(number)
+                    continue
+                self.active[input_file] = number
+                self.dropped_files.discard(input_file)  # A cancel_file before this submit does not apply to it
+                self.queued_at[input_file] = now
+                ready.append(input_file)
+            self.planning += len(ready)  # Nothing starts out of order while these are probed
+        for input_file in input_files:
+            self.emit("queued", input_file=input_file)
+        for input_file in ready:
+            self.probe_pool.submit(self.plan_file, input_file)
+        self.emit_batch()
+        return numbers
+
+    def wait(self):
+        """Block until every submitted file has finished or been cancelled."""
+        self.probe_pool.shutdown(wait=True)  # Every planned encode has been handed to the scheduler
+        self.scheduler.shutdown()
+        if self.transfer_pool:
+            self.transfer_pool.shutdown(wait=True)  # Encodes already in scratch_dir are moved even after cancel
+        if self.staging:
+            self.staging_stop.set()
+            self.staging_wake.set()
+            self.stager.join()
+            self.staging.clear()
+        self.watchdog_stop.set()
+        self.watchdog.join()
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler = None
+        if self.metrics:
+            self.finish_batch_metrics()
+
+    def probe(self, input_file):
+        """Probe input_file, using the journal's cache when the file is unchanged."""
+        source_file = source_file_for(input_file)
+        if self.journal:
+            info = self.journal.get_probe(source_file)
+            if info is not None:
+                return info
+        info = probe_source(self.settings["handbrake_cli_path"], input_file)
+        if self.journal and info is not None:
+            self.journal.put_probe(source_file, info)
+        return info
+
+    def estimate_seconds(self, info):
+        """Predicted encode time from the journal's measured fps for this resolution, or None."""
+        frames = output_frames(self.settings, info)
+        if not self.journal or not frames:
+            return None
+        fps = self.journal.get_speed(resolution_key(info), primary_profile(self.settings)["encoder"])
+        return frames / fps if fps else None
+
+    def plan_file(self, input_file):
+        """Probe stage: decide whether input_file is worth encoding, then queue or skip it."""
+        try:
+            self.plan(input_file)
+        finally:
+            with self.state_lock:
+                self.planning -= 1
+                planning = self.planning
+            if not planning:
+                self.scheduler.release()  # Every known file is in the queue, order is final
+
+    def plan(self, input_file):
+        if self.stopped(input_file):
+            self.abandon(input_file)
+            return
+        try:
+            source_file = source_file_for(input_file)
+            info = self.probe(input_file)
+        except Exception as e:
+            self.log_message(f"Probe of {input_file} failed: {e}", "DEBUG")
+            source_file = SourceFile(os.path.abspath(input_file), 0, 0)
+            info = None
+        action, reason = plan_encode(self.settings, info, target_bitrate(self.settings, primary_profile(self.settings)))
+        self.emit("plan", input_file=input_file, action=action, reason=reason)
+        if action == "skip":
+            self.log_message(f"Skipping {input_file}: {reason}")
+            job = self.new_job(input_file)
+            job.update(status="skipped", detail=reason, input_bytes=source_file.size)
+            self.record_job(job)
+            self.record_success(input_file, skipped=True)
+            return
+        estimate = self.estimate_seconds(info)
+        with self.state_lock:
+            self.job_info[input_file] = info
+            self.job_estimates[input_file] = estimate
+        if estimate:
+            self.log_message(f"Queued {input_file} for encoding ({reason}), about {format_eta(estimate)}.", "DEBUG")
+        else:
+            self.log_message(f"Queued {input_file} for encoding ({reason}).", "DEBUG")
+        # reencode_file returns straight away for queued files once cancel is set
+        self.scheduler.submit(input_file, order_key(self.settings, source_file, info, estimate))
+        self.staging_wake.set()
+
+    def batch_eta(self):
+        """Predicted seconds until every queued and running file is done, or None without speed history."""
+        if not self.scheduler:
+            return None
+        queued = self.scheduler.queued_jobs()
+        with self.state_lock:
+            known = [e for e in self.job_estimates.values() if e]
+            if not known:
+                return None
+            typical = sum(known) / len(known)  # Stands in for files without a prediction
+            running_files = {key if isinstance(key, str) else key[0] for key in self.current_processes}
+            running = [self.job_remaining.get(f, self.job_estimates.get(f) or typical) for f in running_files]
+            queued_times = [self.job_estimates.get(f) or typical for f in queued if isinstance(f, str)]
+            queued_times += [typical] * self.planning
+        return predict_makespan(running, queued_times, self.scheduler.slot_count)
+
+    def emit_batch(self):
+        with self.state_lock:
+            processed, total = self.processed_files, self.total_files
+            self.last_batch_update = time.monotonic()
+        self.emit("batch", processed=processed, total=total, eta=self.batch_eta())
+
+    def cancel(self):
+        """Stop queued files from starting and terminate every running encoder."""
+        self.cancel_flag.set()
+        if self.scheduler:
+            self.scheduler.clear()
+        with self.state_lock:
+            running = list(self.current_processes.values())
+        for process in running:
+            try:
+                process.terminate()
+            except OSError:
+                pass  # Already exited
+        if running:
+            self.log_message(f"Terminating {len(running)} running encoding process(es).", "INFO")
+
+    def cancel_file(self, input_file):
+        """Stop one file: its queued submissions are cancelled and its running encoder is terminated.
+
+        Every cancelled submission still reports a "job" event with a cancelled record.
+        """
+        with self.state_lock:
+            if input_file not in self.active:
+                return  # Not submitted, or already finished
+            self.dropped_files.add(input_file)
+            waiting = self.deferred.pop(input_file, [])
+            running = [process for key, process in self.current_processes.items()
+                       if (key if isinstance(key, str) else key[0]) == input_file]
+        for number in waiting:
+            self.record_job(self.cancelled_job(input_file), number)
+        if self.scheduler and self.scheduler.remove(input_file):
+            self.abandon(input_file)  # Taken out of the queue; otherwise reencode_file or plan reports it
+        for process in running:
+            try:
+                process.terminate()
+            except OSError:
+                pass  # Already exited
+
+    def set_throttled(self, throttled):
+        """Throttle or unthrottle every running and future encoder; what could not be changed is logged as a warning."""
+        self.settings["throttle_encoders"] = throttled
+        errors = self.reapply_priorities()
+        if not errors:
+            self.log_message("Encoders throttled." if throttled else "Encoders back at their profile priority.")
+            return
+        message = f"Encoders {'throttled' if throttled else 'unthrottled'} only in part ({'; '.join(errors)})."
+        if not throttled and any(error.startswith("nice:") for error in errors):
+            message += " Only root (or CAP_SYS_NICE) can lower a nice value again; running encoders stay at nice " \
+                       f"{THROTTLED['nice']} until they finish, the next ones start at their profile priority."
+        self.log_message(message, "WARNING")
+
+    def set_profile_priority(self, name, **values):
+        """Change a profile's nice, cpu_affinity or io_class, including for its running encoders."""
+        profiles = {key: dict(profile) for key, profile in self.settings["encoder_profiles"].items()}
+        profiles[name].update(values)
+        self.settings["encoder_profiles"] = profiles
+        self.reapply_priorities()
+
+    def reapply_priorities(self):
+        """Apply the current priority settings to every running encoder; returns what could not be set."""
+        with self.state_lock:
+            running = [(process, self.process_profiles[key]) for key, process in self.current_processes.items()]
+        errors = set()
+        for process, profile in running:
+            if profile["name"] in self.settings["encoder_profiles"]:
+                profile = resolve_profile(self.settings, profile["name"])  # Picks up edited settings
+            errors.update(self.set_process_priority(process, profile, restore=True))
+        return sorted(errors)
+
+    def set_process_priority(self, process, profile, restore=False):
+        """Give an encoder its profile's nice level, CPU affinity and I/O class, or the throttled ones.
+
+        restore also resets what the profile leaves unset, undoing an earlier throttle. Returns
+        what could not be set; each failure is only logged the first time.
+        """
+        if process.poll() is not None:
+            return []
+        try:
+            priority = encoder_priority(profile, self.settings.get("throttle_encoders"))
+        except ValueError as e:
+            errors = [str(e)]
+        else:
+            if restore:
+                for name, value in inherited_priority().items():
+                    if priority[name] is None:
+                        priority[name] = value
+            if all(value is None for value in priority.values()):
+                return []
+            errors = apply_priority(process.pid, priority)
+        with self.state_lock:
+            new_errors = [error for error in errors if error not in self.priority_errors]
+            self.priority_errors.update(new_errors)
+        for error in new_errors:
+            self.log_message(f"Cannot set encoder priority for profile {profile['name']}: {error}", "WARNING")
+        return errors
+
+    def admit(self, input_file, profile):
+        """Disk-space admission: start input_file only if its estimated output fits on the output drive.
+
+        Space still to be written by running encodes is reserved. Originals
+        removed by delete_original only count once they are deleted and show
+        up in the drive's free space, never while they are still encoding.
+        """
+        if isinstance(input_file, SegmentedEncode):
+            return True  # Covered by the reservation of the file's first slot
+        output_dir = self.settings["output_dir"]
+        with self.state_lock:
+            info = self.job_info.get(input_file)
+        try:
+            source_size = os.path.getsize(input_file)
+        except OSError:
+            source_size = 0  # reencode_file reports the missing file
+        estimate = estimate_output_bytes(self.settings, profile, info, source_size)
+        if self.segments_for(info):
+            estimate *= 2  # Segments and the joined output exist side by side while joining
+        # On the output drive the file only grows once it is moved there, so this is the partial path either way
+        reservation = (estimate, partial_output_path(output_path_for(self.settings, input_file)))
+        if self.scratch_dir and not self.admit_scratch(input_file, estimate):
+            return False
+        if not self.settings.get("disk_space_check", True):
+            self.reserve(input_file, reservation)
+            return True
+
+        try:
+            free = shutil.disk_usage(output_dir).free
+        except OSError:
+            free = None  # Output folder not created yet or not reachable; let the encode report it
+        with self.state_lock:
+            running = list(self.reservations.values())
+        outstanding = 0
+        for running_estimate, partial_file in running:
+            try:
+                written = os.path.getsize(partial_file)
+            except OSError:
+                written = 0
+            outstanding += max(0, running_estimate - written)
+        available = None if free is None else free - outstanding - int(self.settings.get("min_free_space_mb", 1024)) * 1024 * 1024
+
+        if available is not None and estimate > available:
+            if input_file not in self.held_for_space:
+                self.held_for_space.add(input_file)
+                self.log_message(
+                    f"Waiting for disk space: {os.path.basename(input_file)} needs about {format_size(estimate)}, "
+                    f"{format_size(max(available, 0))} available on the output drive.", "WARNING")
+            return False
+        if input_file in self.held_for_space:
+            self.held_for_space.discard(input_file)
+            self.log_message(f"Disk space available, starting {os.path.basename(input_file)}.")
+        self.reserve(input_file, reservation)
+        return True
+
+    def admit_scratch(self, input_file, estimate):
+        """False while scratch_dir holds too much to add input_file's estimated output; one file always fits."""
+        budget = float(self.settings.get("scratch_max_gb", 100)) * 1024**3
+        with self.state_lock:
+            used = sum(self.scratch_use.values())
+        if used and used + estimate > budget:
+            if input_file not in self.held_for_scratch:
+                self.held_for_scratch.add(input_file)
+                self.log_message(
+                    f"Waiting for scratch space: {os.path.basename(input_file)} needs about {format_size(estimate)}, "
+                    f"{format_size(used)} of {format_size(budget)} in use.", "WARNING")
+            return False
+        self.held_for_scratch.discard(input_file)
+        return True
+
+    def reserve(self, input_file, reservation):
+        with self.state_lock:
+            self.reservations[input_file] = reservation
+            if self.scratch_dir:
+                self.scratch_use[input_file] = reservation[0]
+
+    def run_encode(self, input_file, profile):
+        if isinstance(input_file, SegmentedEncode):
+            # An extra slot helping with a segmented file; segments must all come from one encoder
+            if profile["name"] == input_file.profile["name"]:
+                self.encode_segments(input_file)
+            return
+        self.staging_wake.set()  # Another queued file is now among the next stage_ahead
+        try:
+            self.reencode_file(input_file, profile)
+        finally:
+            with self.state_lock:
+                if input_file not in self.transfers:  # Otherwise released by transfer_output
+                    self.reservations.pop(input_file, None)
+                    self.scratch_use.pop(input_file, None)
+
+    def reencode_file(self, input_file, profile):
+        if self.stopped(input_file):
+            self.abandon(input_file)
+            return
+        job = self.new_job(input_file, profile)
+        transferring = False
+        try:
+            transferring = self.encode_file(input_file, profile, job)
+        finally:
+            if not transferring:  # Otherwise transfer_output records it once the file has moved
+                self.record_job(job)
+
+    def encode_file(self, input_file, profile, job):
+        """Encode one file, filling in its job metrics record as it goes; True if it was queued for transfer."""
+        output_file = output_path_for(self.settings, input_file)
+        partial_file = self.encode_path(output_file)
+        try:
+            source_file = source_file_for(input_file)
+        except OSError as e:
+            self.log_message(f"Cannot read {input_file}: {e}", "ERROR")
+            job["detail"] = str(e)
+            self.record_failure(input_file)
+            return
+        job.update(output_file=output_file, input_bytes=source_file.size)
+        if self.journal and self.journal.is_done(source_file):
+            self.log_message(f"Skipping {input_file}: already encoded according to the job journal.")
+            job.update(status="skipped", detail="already encoded according to the job journal")
+            self.record_success(input_file, skipped=True)
+            return
+
+        self.emit("status", input_file=input_file, status="processing")
+        self.log_message(f"Starting processing: {input_file} -> {output_file} ({profile['name']})")
+
+        with self.state_lock:
+            info = self.job_info.get(input_file)
+        segments = self.segments_for(info)
+        job["segments"] = len(segments) if segments else 0
+
+        try:
+            if self.journal:
+                self.journal.start(source_file, output_file)
+            read_file = self.staging.checkout(input_file) if self.staging else input_file
+            if read_file != input_file:
+                self.log_message(f"Reading {input_file} from its staged copy {read_file}", "DEBUG")
+            started = time.monotonic()
+            if segments:
+                segmented = SegmentedEncode(input_file, profile, partial_file, segments, info["duration"])
+                segmented.read_file = read_file
+                self.log_message(f"Encoding {input_file} as {len(segments)} segments.")
+                returncode, output_tail, avg_fps = self.run_segmented(segmented)
+            else:
+                command = build_encode_command(self.settings, profile, read_file, partial_file)
+                self.log_message(f"Executing command: {' '.join(command)}", "DEBUG")
+                report = self.progress_reporter(input_file)
+                returncode, output_tail, avg_fps = self.run_handbrake(
+                    input_file, command, report, profile, partial_file, info.get("duration") if info else None)
+            killed = self.watchdog_reason(input_file)
+            frames = output_frames(self.settings, info)
+            elapsed = time.monotonic() - started
+            job.update(exit_code=returncode, avg_fps=avg_fps or (frames / elapsed if frames and elapsed > 0 else None))
+
+            stopped = self.stopped(input_file)
+            failed = returncode != 0 and not stopped
+            tail_text = "\n".join(output_tail)
+            self.log_message(f"HandBrakeCLI output (last {len(output_tail)} lines):\n{tail_text}", "ERROR" if failed else "DEBUG")
+
+            if stopped:
+                self.log_message(f"Processing of {input_file} was cancelled.", "WARNING")
+                remove_file(partial_file)
+                job["status"] = "cancelled"
+                if self.journal:
+                    self.journal.requeue(source_file, output_file)
+                self.emit("status", input_file=input_file, status="awaiting")
+                return
+
+            if returncode != 0:
+                if killed:
+                    self.log_message(f"Error encoding {input_file}: HandBrakeCLI was {killed}", "ERROR")
+                else:
+                    self.log_message(f"Error encoding {input_file}: Process returned {returncode}", "ERROR")
+                remove_file(partial_file)
+                job["detail"] = f"HandBrakeCLI was {killed}" if killed else f"HandBrakeCLI returned {returncode}"
+                if self.retry_later(input_file, source_file, info):
+                    job["status"] = "retried"
+                else:
+                    self.fail_for_good(input_file, source_file, output_file, job["detail"])
+                return
+
+            if not os.path.exists(partial_file):
+                self.log_message(f"Output file {output_file} was not created.", "ERROR")
+                self.log_message(f"Directory writable: {os.access(self.settings['output_dir'], os.W_OK)}", "DEBUG")
+                job["detail"] = "output not created"
+                self.record_failure(input_file, source_file, output_file, job["detail"])
+                return
+
+            if self.journal and not segments:  # Segmented encodes run on several slots, their speed is not one encoder's
+                self.record_speed(input_file, profile, avg_fps, elapsed)
+            if self.scratch_dir:
+                self.queue_transfer(input_file, source_file, partial_file, output_file, job)
+                return True
+            # Only a complete encode ever appears under the final name
+            os.replace(partial_file, output_file)
+            self.complete_encode(input_file, source_file, output_file, job)
+
+        except Exception as e:
+            self.log_message(f"Unexpected error with {input_file}: {e}", "ERROR")
+            job.update(status="failed", detail=str(e))
+            remove_file(partial_file)
+            self.record_failure(input_file, source_file, output_file, str(e))
+        finally:
+            if self.staging:
+                self.staging.release(input_file, keep=job["status"] == "retried")
+            with self.state_lock:
+                self.job_remaining.pop(input_file, None)
+                if job["status"] != "retried":  # A retry is ordered and planned with these again
+                    self.job_estimates.pop(input_file, None)
+                    self.job_info.pop(input_file, None)
+
+    def complete_encode(self, input_file, source_file, output_file, job):
+        """Finish a job whose output is in place under its final name, deleting the original if wanted."""
+        job.update(status="encoded", output_bytes=os.path.getsize(output_file))
+        self.log_message(f"Successfully encoded {input_file}")
+        if self.journal:
+            self.journal.finish(source_file, output_file)
+        if self.settings["delete_original"]:
+            self.log_message(f"Output file {output_file} exists, deleting original.", "DEBUG")
+            try:
+                os.remove(input_file)
+            except OSError as e:
+                # The encode is done and journaled; failing it now would only encode it again
+                self.log_message(f"Cannot delete original file {input_file}: {e}", "WARNING")
+            else:
+                job["original_deleted"] = True
+                self.log_message(f"Deleted original file: {input_file}")
+        else:
+            self.log_message(f"Output file {output_file} exists, original file retained.", "DEBUG")
+        self.record_success(input_file)
+
+    def encode_path(self, output_file):
+        """Where HandBrake writes output_file: in scratch_dir if set, else as a partial file next to it."""
+        partial_file = partial_output_path(output_file)
+        return os.path.join(self.scratch_dir, os.path.basename(partial_file)) if self.scratch_dir else partial_file
+
+    def start_transfers(self):
+        """Use scratch_dir for this batch if it is set and can be created."""
+        self.scratch_dir = self.settings.get("scratch_dir") or None
+        self.transfer_pool = None
+        if not self.scratch_dir:
+            return
+        try:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+        except OSError as e:
+            self.log_message(f"Cannot use scratch folder {self.scratch_dir}: {e}. Encoding straight to the output directory.", "WARNING")
+            self.scratch_dir = None
+            return
+        # One transfer at a time: parallel copies to a share only compete for the same link
+        self.transfer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transfer")
+
+    def start_staging(self):
+        """Copy upcoming files to stage_dir on a background thread, if stage_dir is set and usable."""
+        self.staging = None
+        stage_dir = self.settings.get("stage_dir")
+        if not stage_dir:
+            return
+        try:
+            os.makedirs(stage_dir, exist_ok=True)
+        except OSError as e:
+            self.log_message(f"Cannot use staging folder {stage_dir}: {e}. Reading sources in place.", "WARNING")
+            return
+        budget = float(self.settings.get("stage_max_gb", 50)) * 1024**3
+        self.staging = StagingCache(stage_dir, budget, self.log_message)
+        self.staging_stop = threading.Event()
+        self.stager = threading.Thread(target=self.stage_ahead, args=(self.staging, self.staging_stop), name="stager", daemon=True)
+        self.stager.start()
+
+    def stage_ahead(self, cache, stop):
+        """Staging thread: keep the next stage_ahead queued files copied to stage_dir, one at a time."""
+        ahead = max(0, int(self.settings.get("stage_ahead", 2)))
+        should_stop = lambda: stop.is_set() or self.cancelled
+        while not stop.is_set():
+            upcoming = [job for job in self.scheduler.queued_jobs() if isinstance(job, str)][:ahead]
+            input_file = next((f for f in upcoming if cache.needs_staging(f) and not self.stopped(f)), None)
+            staged = False
+            if input_file and not self.cancelled:
+                started = time.monotonic()
+                staged = cache.stage(input_file, should_stop, set(upcoming))
+                if staged:
+                    elapsed = max(time.monotonic() - started, 0.001)
+                    size = cache.staged_size(input_file)
+                    self.log_message(f"Staged {os.path.basename(input_file)} ({format_size(size)}) in {elapsed:.0f} s, "
+                                     f"{size / elapsed / 1024**2:.0f} MB/s.", "DEBUG")
+            if not staged:
+                # Nothing queued, no room or the copy failed: look again once something changes
+                self.staging_wake.wait(STAGE_POLL_SECONDS)
+                self.staging_wake.clear()
+
+    def queue_transfer(self, input_file, source_file, scratch_file, output_file, job):
+        """Hand a finished encode in scratch_dir to the transfer thread; the slot is free for the next file."""
+        size = os.path.getsize(scratch_file)
+        with self.state_lock:
+            self.transfers[input_file] = scratch_file
+            self.scratch_use[input_file] = size
+        self.emit("status", input_file=input_file, status="transferring")
+        self.log_message(f"Encoded {input_file} to scratch, moving {format_size(size)} to {output_file}.", "DEBUG")
+        self.transfer_pool.submit(self.transfer_output, input_file, source_file, scratch_file, output_file, job)
+
+    def transfer_output(self, input_file, source_file, scratch_file, output_file, job):
+        """Transfer thread: copy an encode from scratch_dir to output_dir, then finish its job.
+
+        The copy is written as the partial file, checked for size and renamed, so the original
+        is only deleted once the complete output is on the output drive.
+        """
+        target_file = partial_output_path(output_file)
+        try:
+            for attempt in range(1, TRANSFER_ATTEMPTS + 1):
+                try:
+                    copy_verified(scratch_file, target_file)
+                    break
+                except OSError as e:
+                    remove_file(target_file)
+                    if attempt == TRANSFER_ATTEMPTS or self.cancel_flag.is_set():
+                        raise
+                    self.log_message(f"Moving {os.path.basename(output_file)} to the output directory failed ({e}), "
+                                     f"retrying in {TRANSFER_RETRY_SECONDS} seconds.", "WARNING")
+                    if self.cancel_flag.wait(TRANSFER_RETRY_SECONDS):
+                        raise
+            os.replace(target_file, output_file)
+            remove_file(scratch_file)
+            self.complete_encode(input_file, source_file, output_file, job)
+        except Exception as e:
+            self.log_message(f"Cannot move {scratch_file} to {output_file}: {e}", "ERROR")
+            job.update(status="failed", detail=f"move from scratch failed: {e}")
+            remove_file(target_file)
+            remove_file(scratch_file)
+            self.record_failure(input_file, source_file, output_file, job["detail"])
+        finally:
+            with self.state_lock:
+                self.transfers.pop(input_file, None)
+                self.scratch_use.pop(input_file, None)
+                self.reservations.pop(input_file, None)
+            self.scheduler.wake()  # A file held for scratch space may fit now
+            self.record_job(job)
+
+    def progress_reporter(self, input_file):
+        """Return a callback that forwards a file's progress at most every PROGRESS_UPDATE_INTERVAL."""
+        last_update = [0.0]
+
+        def report(progress):
+            now = time.monotonic()
+            if now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update[0] = now
+            self.emit("progress", input_file=input_file, **progress)
+            with self.state_lock:
+                if progress["eta"] is not None:
+                    self.job_remaining[input_file] = progress["eta"]
+                batch_due = now - self.last_batch_update >= BATCH_ETA_INTERVAL
+            if batch_due:
+                self.emit_batch()
+        return report
+
+    def run_handbrake(self, key, command, on_progress, profile=None, output_file=None, duration=None):
+        """Run one HandBrakeCLI process and return (exit code, last output lines, last average fps).
+
+        key identifies the process in current_processes so cancel() can stop it; profile sets its priority.
+        The watchdog kills it if neither its progress nor output_file grows for stall_timeout, or if it
+        runs past the timeout for duration seconds of video.
+        """
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Windows only
+        )
+        watch = EncodeWatch(process, output_file, self.encode_timeout(duration))
+        with self.state_lock:
+            self.current_processes[key] = process
+            self.watches[key] = watch
+            if profile:
+                self.process_profiles[key] = profile
+        try:
+            if self.stopped(key if isinstance(key, str) else key[0]):
+                # Cancel raced with the launch; make sure this encoder does not outlive it
+                process.terminate()
+            elif profile:
+                self.set_process_priority(process, profile)
+
+            # Parse progress as it streams and keep only the tail of the raw output
+            output_tail = deque(maxlen=OUTPUT_TAIL_LINES)
+            avg_fps = None
+            encoding = False
+            for line in iter_output_lines(process.stdout):
+                progress = parse_progress_line(line)
+                if progress is None:
+                    output_tail.append(line)
+                    continue
+                if not encoding and profile:
+                    # Linux priorities are per thread and HandBrake only starts its encoder threads now
+                    encoding = True
+                    self.set_process_priority(process, profile)
+                watch.progressed(progress["percent"])
+                avg_fps = progress["avg_fps"] or avg_fps
+                on_progress(progress)
+            process.stdout.close()
+            process.wait()
+        except BaseException:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            raise
+        finally:
+            with self.state_lock:
+                self.current_processes.pop(key, None)
+                self.process_profiles.pop(key, None)
+                self.watches.pop(key, None)
+        return process.returncode, output_tail, avg_fps
+
+    def encode_timeout(self, duration):
+        """Seconds an encode of duration seconds of video may run, or None for no limit."""
+        ratio = float(self.settings.get("encode_timeout_ratio", 10))
+        if not ratio or not duration:
+            return None
+        return max(ENCODE_TIMEOUT_MIN, duration * ratio)
+
+    def watch_encodes(self, stop):
+        """Watchdog thread: kill encoders that stop making progress or run past their timeout."""
+        while not stop.wait(WATCHDOG_INTERVAL):
+            stall_timeout = float(self.settings.get("stall_timeout", 300))
+            with self.state_lock:
+                watched = list(self.watches.items())
+            for key, watch in watched:
+                now = time.monotonic()
+                try:
+                    size = os.path.getsize(watch.output_file) if watch.output_file else 0
+                except OSError:
+                    size = 0  # HandBrake has not created it yet
+                if size > watch.size:
+                    watch.size = size
+                    watch.changed = now
+                if stall_timeout and now - watch.changed > stall_timeout:
+                    reason = f"killed after {format_eta(now - watch.changed)} without progress"
+                elif watch.timeout and now - watch.started > watch.timeout:
+                    reason = f"killed after running for {format_eta(now - watch.started)}"
+                else:
+                    continue
+                input_file = key if isinstance(key, str) else key[0]
+                self.log_message(f"Watchdog: {os.path.basename(input_file)} stalled or timed out, HandBrakeCLI {reason}.", "WARNING")
+                with self.state_lock:
+                    self.watchdog_kills[key] = reason
+                    self.watches.pop(key, None)
+                try:
+                    watch.process.kill()
+                except OSError:
+                    pass  # Already exited
+
+    def start_sampler(self):
+        """Sample resource use of OBSRecode and the encoders for this batch, unless disabled."""
+        interval = float(self.settings.get("resource_sample_interval", 2))
+        if not interval or not sampling_supported():
+            return
+        on_sample = lambda samples: self.emit("resources", samples=samples)
+        path = None
+        if self.settings.get("write_resource_samples") and self.settings.get("output_dir"):
+            batch_id = self.metrics.batch_id if self.metrics else time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.settings["output_dir"], f"{RESOURCES_FILE}_{batch_id}.csv")
+        try:
+            self.sampler = ResourceSampler(interval, self.encoder_pids, path, on_sample)
+            if path:
+                self.log_message(f"Writing resource samples to {path}", "DEBUG")
+        except OSError as e:
+            self.log_message(f"Cannot write resource samples to {path}: {e}", "WARNING")
+            self.sampler = ResourceSampler(interval, self.encoder_pids, None, on_sample)
+        self.sampler.start()
+
+    def encoder_pids(self):
+        """{pid: label} of the running HandBrakeCLI processes, for the resource sampler."""
+        with self.state_lock:
+            processes = list(self.current_processes.items())
+        pids = {}
+        for key, process in processes:
+            if isinstance(key, str):
+                pids[process.pid] = os.path.basename(key)
+            else:
+                pids[process.pid] = f"{os.path.basename(key[0])} segment {key[1] + 1}"
+        return pids
+
+    def watchdog_reason(self, input_file):
+        """Why the watchdog killed input_file's encoder (or one of its segments), or None; forgets it."""
+        with self.state_lock:
+            keys = [key for key in self.watchdog_kills if (key if isinstance(key, str) else key[0]) == input_file]
+            reasons = [self.watchdog_kills.pop(key) for key in keys]
+        return reasons[0] if reasons else None
+
+    def retry_later(self, input_file, source_file, info):
+        """Requeue a failed encode after a backoff; returns False once max_retries is used up."""
+        with self.state_lock:
+            attempts = self.attempts[input_file] = self.attempts.get(input_file, 0) + 1
+            estimate = self.job_estimates.get(input_file)
+        max_retries = int(self.settings.get("max_retries", 2))
+        if attempts > max_retries or self.stopped(input_file):
+            return False
+        delay = float(self.settings.get("retry_backoff", 30)) * 2 ** (attempts - 1)
+        self.log_message(f"Retrying {input_file} in {delay:.1f}s (attempt {attempts + 1} of {max_retries + 1}).", "WARNING")
+        with self.state_lock:
+            self.queued_at[input_file] = time.time() + delay
+        self.emit("status", input_file=input_file, status="awaiting")
+        self.scheduler.submit(input_file, order_key(self.settings, source_file, info, estimate), delay)
+        return True
+
+    def fail_for_good(self, input_file, source_file, output_file, error):
+        """Record a failure that will not be retried in this batch; quarantine it if it was retried before."""
+        self.record_failure(input_file, source_file, output_file, error)
+        with self.state_lock:
+            retried = self.attempts.get(input_file, 0) > 1
+        if retried and self.journal and self.settings.get("quarantine_failed", True):
+            self.journal.quarantine(source_file, output_file, error)
+            self.log_message(f"Quarantined {input_file}: it failed every attempt and is left out of later scans "
+                             "until it changes (or --retry-quarantined).", "WARNING")
+
+    def segments_for(self, info):
+        """Time ranges to encode in parallel, or None to encode the file in one piece."""
+        if not self.settings.get("segment_encoding") or not info or not info.get("duration"):
+            return None
+        if info["duration"] < float(self.settings.get("segment_min_duration", 7200)) or not find_joiner(self.settings):
+            return None
+        segments = split_duration(info["duration"], float(self.settings.get("segment_length", 1800)))
+        return segments if len(segments) > 1 else None
+
+    def run_segmented(self, job):
+        """Encode job's segments on this and every other free slot of its profile, then join them.
+
+        Returns the same (exit code, output lines, average fps) as run_handbrake.
+        """
+        started = time.monotonic()
+        report = self.progress_reporter(job.input_file)
+        job.on_progress = lambda percent, fps: report({
+            "percent": percent, "fps": fps, "avg_fps": None,
+            "eta": (time.monotonic() - started) * (100 - percent) / percent if percent > 0 else None
+        })
+        # Helpers run ahead of every queued file; one that finds no segment left returns at once
+        for _ in range(min(len(job.segments), self.scheduler.slot_count) - 1):
+            self.scheduler.submit(job, float("-inf"))
+        try:
+            self.encode_segments(job)
+            job.wait()
+            if self.stopped(job.input_file) or not job.succeeded:
+                return job.returncode or 1, job.output_tail, None
+            returncode, output_tail = self.join_segments(job)
+            return returncode, output_tail, None
+        finally:
+            job.wait()  # An exception must not leave helpers writing segments that are about to be removed
+            for segment_file in job.segment_files:
+                remove_file(segment_file)
+
+    def encode_segments(self, job):
+        """Encode segments of job until none are left; runs on every slot helping with it."""
+        while True:
+            index = job.take(self.stopped(job.input_file))
+            if index is None:
+                return
+            start, length = job.segments[index]
+            command = build_encode_command(self.settings, job.profile, job.read_file, job.segment_files[index])
+            command += segment_args(start, length)
+            self.log_message(f"Executing command: {' '.join(command)}", "DEBUG")
+            try:
+                returncode, output_tail, _ = self.run_handbrake(
+                    (job.input_file, index), command, lambda progress: job.on_progress(*job.report(index, progress)),
+                    job.profile, job.segment_files[index], length)
+            except Exception as e:
+                returncode, output_tail = -1, [f"Segment {index + 1} failed: {e}"]
+            job.finish(index, returncode, output_tail)
+
+    def join_segments(self, job):
+        """Join the encoded segments into the partial output and check its duration."""
+        joiner = find_joiner(self.settings)
+        partial_file = self.encode_path(output_path_for(self.settings, job.input_file))
+        list_file = partial_file + ".txt"
+        command = join_command(joiner, job.segment_files, partial_file, list_file)
+        self.log_message(f"Joining {len(job.segment_files)} segments: {' '.join(command)}", "DEBUG")
+        try:
+            write_concat_list(list_file, job.segment_files)
+            result = subprocess.run(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                timeout=JOIN_TIMEOUT,
+                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Windows only
+            )
+        finally:
+            remove_file(list_file)
+        output_tail = result.stdout.decode("utf-8", "replace").splitlines()[-OUTPUT_TAIL_LINES:]
+        if not join_succeeded(joiner, result.returncode):
+            return result.returncode or 1, output_tail
+        joined = probe_source(job.profile["handbrake_cli_path"] or self.settings["handbrake_cli_path"], partial_file)
+        tolerance = SEGMENT_DURATION_TOLERANCE * len(job.segments)
+        if not joined or not joined.get("duration") or abs(joined["duration"] - job.duration) > tolerance:
+            found = joined.get("duration") if joined else None
+            output_tail.append(f"Joined output is {found} s long, source is {job.duration} s.")
+            return 1, output_tail
+        return 0, output_tail
+
+    def record_speed(self, input_file, profile, avg_fps, elapsed):
+        """Remember how fast this resolution encoded with this encoder for future estimates."""
+        with self.state_lock:
+            info = self.job_info.get(input_file)
+        resolution = resolution_key(info)
+        if resolution is None:
+            return
+        frames = output_frames(self.settings, info)
+        fps = avg_fps or (frames / elapsed if frames and elapsed > 0 else None)
+        if fps:
+            self.journal.record_speed(resolution, profile["encoder"], fps)
+
+    def new_job(self, input_file, profile=None):
+        with self.state_lock:
+            queued_at = self.queued_at.pop(input_file, None)
+        return job_record(input_file, profile, queued_at)
+
+    def cancelled_job(self, input_file):
+        job = self.new_job(input_file)
+        job.update(status="cancelled", detail="cancelled before it started")
+        return job
+
+    def abandon(self, input_file):
+        """Report a file dropped with cancel_file before its encode started; a cancelled batch reports nothing."""
+        if not self.cancelled:
+            self.record_job(self.cancelled_job(input_file))
+
+    def record_job(self, job, submission=None):
+        """Report a job of the file's active submission, or of the given waiting one."""
+        finish_job_record(job)
+        if self.metrics:
+            try:
+                self.metrics.add_job(job)
+            except OSError as e:
+                self.log_message(f"Cannot write job metrics: {e}", "WARNING")
+        input_file = job["input_file"]
+        plan_next = False
+        if submission is None:
+            with self.state_lock:
+                submission = self.active.get(input_file)
+                if job["status"] != "retried" and submission is not None:
+                    plan_next = self.finish_submission(input_file)
+        self.emit("job", input_file=input_file, record=job, submission=submission)
+        if plan_next:
+            try:
+                self.probe_pool.submit(self.plan_file, input_file)
+            except RuntimeError:
+                self.plan_file(input_file)  # wait() has shut the probe pool; the scheduler still runs this slot
+
+    def finish_submission(self, input_file):
+        """The active submission of input_file is done; True if a waiting one became active. Caller holds state_lock."""
+        del self.active[input_file]
+        self.dropped_files.discard(input_file)
+        waiting = self.deferred.get(input_file)
+        if not waiting:
+            return False
+        self.active[input_file] = waiting.pop(0)
+        if not waiting:
+            del self.deferred[input_file]
+        self.queued_at[input_file] = time.time()
+        self.planning += 1
+        return True
+
+    def finish_batch_metrics(self):
+        try:
+            summary = self.metrics.finish_batch()
+        except OSError as e:
+            self.log_message(f"Cannot write batch metrics: {e}", "WARNING")
+            return
+        if summary["encoded"]:
+            self.log_message(
+                f"Batch metrics: {format_size(summary['input_bytes'])} encoded to {format_size(summary['output_bytes'])}, "
+                f"{format_size(summary['bytes_saved'])} saved ({summary['compression_ratio']}x)."
+            )
+
+    def record_success(self, input_file, skipped=False):
+        with self.state_lock:
+            self.processed_files += 1
+            if skipped:
+                self.skipped_files += 1
+        self.emit_batch()
+        self.emit("status", input_file=input_file, status="skipped" if skipped else "completed")
+
+    def record_failure(self, input_file, source_file=None, output_file=None, error=None):
+        with self.state_lock:
+            self.failed_files += 1
+        if self.journal and source_file:
+            self.journal.fail(source_file, output_file, error)
+        self.emit("status", input_file=input_file, status="awaiting")
@@ -0,0 +1,187 @@
+"""File list of the main window.
+
+Only the rows that fit in the view exist as Treeview items. Scrolling and
+sorting refill those few items from plain Python rows, so a batch of tens of
+thousands of recordings costs about as much to show as a batch of ten.
+"""
+import os
+import tkinter as tk
+from tkinter import ttk
+
+from recode_engine import format_eta, format_size
+
+COLUMNS = [  # (column, heading, width, anchor)
+    ("name", "File", 360, "w"),
+    ("size", "Size", 70, "e"),
+    ("status", "Status", 110, "w"),
+    ("progress", "Progress", 70, "e"),
+    ("fps", "FPS", 60, "e"),
+    ("eta", "ETA", 70, "e"),
+    ("note", "Note", 300, "w")
+]
+STATUS_TEXT = {
+    "awaiting": "⌛ Waiting", "processing": "▶ Processing", "transferring": "⇪ Moving", "completed": "✓ Completed", "skipped": "⏭ Skipped"
+}
+STATUS_RANK = {"processing": 0, "transferring": 1, "awaiting": 2, "completed": 3, "skipped": 4}
+STATUS_COLORS = {"completed": "pale green", "skipped": "light gray"}
+FLASH_COLOR = "yellow"
+SORT_FIELDS = {"progress": "percent"}  # Columns shown from a differently named FileRow field
+WHEEL_ROWS = 3  # Rows scrolled per mouse wheel notch
+
+class FileRow:
+    __slots__ = ("seq", "name", "size", "status", "percent", "fps", "eta", "note")
+
+    def __init__(self, seq, input_file, size):
+        self.seq = seq
+        self.name = os.path.basename(input_file)
+        self.size = size  # As found by the scan; None if unknown
+        self.status = "awaiting"
+        self.percent = 0.0
+        self.fps = None
+        self.eta = None
+        self.note = ""
+
+class FileList(tk.Frame):
+    """Sortable list of the batch's files, keyed by input file, drawing only the visible rows."""
+
+    def __init__(self, master, height=10):
+        super().__init__(master)
+        self.height = height
+        self.tree = ttk.Treeview(self, columns=[c[0] for c in COLUMNS], show="headings", height=height, selectmode="none")
+        for column, heading, width, anchor in COLUMNS:
+            self.tree.heading(column, text=heading, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=width, anchor=anchor, stretch=column in ("name", "note"))
+        for status, color in STATUS_COLORS.items():
+            self.tree.tag_configure(status, background=color)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill="both", expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.tree.bind("<MouseWheel>", self.on_wheel)  # Windows and macOS
+        self.tree.bind("<Button-4>", lambda event: self.scroll_to(self.top - WHEEL_ROWS) or "break")  # X11
+        self.tree.bind("<Button-5>", lambda event: self.scroll_to(self.top + WHEEL_ROWS) or "break")
+
+        self.rows = {}  # input_file -> FileRow
+        self.order = []  # input_files in display order
+        self.shown = set()  # input_files with a Treeview item right now
+        self.top = 0  # Index in order of the first visible row
+        self.sort_column = None  # None keeps the order files were added in
+        self.sort_reverse = False
+        self.needs_sort = False
+        self.render_pending = False
+
+    def __contains__(self, input_file):
+        return input_file in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, input_file, size=None):
+        """Add a row; size is the one the scan found, so the Tk thread never has to stat the file."""
+        if input_file in self.rows:
+            return
+        self.rows[input_file] = FileRow(len(self.rows), input_file, size)
+        self.order.append(input_file)
+        self.needs_sort = self.sort_column is not None
+        self.schedule_render()
+
+    def update(self, input_file, **fields):
+        """Change a row's status, percent, fps, eta or note; redrawn at the next idle moment if visible."""
+        row = self.rows.get(input_file)
+        if row is None:
+            return
+        for name, value in fields.items():
+            setattr(row, name, value)
+        if SORT_FIELDS.get(self.sort_column, self.sort_column) in fields:
+            self.needs_sort = True
+        if input_file in self.shown or self.needs_sort:
+            self.schedule_render()
+
+    def clear(self):
+        self.rows.clear()
+        self.order.clear()
+        self.top = 0
+        self.schedule_render()
+
+    def flash(self, on):
+        """Blink every processing row with one tag change."""
+        self.tree.tag_configure("processing", background=FLASH_COLOR if on else "")
+
+    def sort_by(self, column):
+        """Sort by column; clicking the same heading again reverses the order."""
+        self.sort_reverse = not self.sort_reverse if column == self.sort_column else False
+        self.sort_column = column
+        for name, heading, _, _ in COLUMNS:
+            arrow = (" ▼" if self.sort_reverse else " ▲") if name == column else ""
+            self.tree.heading(name, text=heading + arrow)
+        self.needs_sort = True
+        self.schedule_render()
+
+    def sort_key(self, column):
+        rows = self.rows
+        if column == "name":
+            return lambda f: rows[f].name.lower()
+        if column == "size":
+            return lambda f: rows[f].size or 0
+        if column == "status":
+            return lambda f: STATUS_RANK.get(rows[f].status, len(STATUS_RANK))
+        if column == "progress":
+            return lambda f: rows[f].percent
+        if column == "fps":
+            return lambda f: rows[f].fps or 0
+        if column == "eta":
+            return lambda f: rows[f].eta if rows[f].eta is not None else float("inf")
+        if column == "note":
+            return lambda f: rows[f].note
+        return lambda f: rows[f].seq
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.order)))
+        else:
+            self.scroll_to(self.top + int(amount) * (self.height if unit == "pages" else 1))
+
+    def on_wheel(self, event):
+        self.scroll_to(self.top - WHEEL_ROWS * (1 if event.delta > 0 else -1))
+        return "break"
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.order) - self.height))
+        if top != self.top:
+            self.top = top
+            self.schedule_render()
+
+    def schedule_render(self):
+        # Any number of changes between two idle moments cost one redraw
+        if not self.render_pending:
+            self.render_pending = True
+            self.after_idle(self.render)
+
+    def row_values(self, row):
+        eta = format_eta(row.eta) if row.eta is not None and row.status == "processing" else ""
+        return (
+            row.name,
+            format_size(row.size) if row.size else "",
+            STATUS_TEXT.get(row.status, row.status),
+            f"{row.percent:.1f}%" if row.percent else "",
+            f"{row.fps:.1f}" if row.fps is not None else "",
+            eta,
+            row.note
+        )
+
+    def render(self):
+        """Refill the Treeview with the rows between top and top + height."""
+        self.render_pending = False
+        if self.needs_sort:
+            self.needs_sort = False
+            self.order.sort(key=self.sort_key(self.sort_column), reverse=self.sort_reverse)
+        self.top = max(0, min(self.top, len(self.order) - self.height))
+        visible = self.order[self.top:self.top + self.height]
+        self.tree.delete(*self.tree.get_children())
+        for input_file in visible:
+            row = self.rows[input_file]
+            self.tree.insert("", tk.END, values=self.row_values(row), tags=(row.status,))
+        self.shown = set(visible)
+        if self.order:
+            self.scrollbar.set(self.top / len(self.order), (self.top + len(visible)) / len(self.order))
+        else:
+            self.scrollbar.set(0, 1)
@@ -0,0 +1,1059 @@
+import os
+import copy
+import time
+import queue
+import logging
+import sqlite3
+from datetime import datetime
+from collections import deque
+import tkinter as tk
+from tkinter import ttk, scrolledtext, filedialog, messagebox
+import threading
+import webbrowser
+import platform
+
+from recode_engine import (
+    JOB_ORDERS, LOG_FILE, RecodeEngine, ScanCancelled, find_existing_outputs, find_source_files, format_eta, format_size,
+    handbrake_cli_found, load_and_validate_settings, save_settings_file
+)
+from recode_filelist import FileList
+from recode_journal import JobJournal
+from recode_logging import AsyncFileLog
+from recode_metrics import METRICS_FORMATS
+from recode_profiles import apply_slot_overrides, enabled_profiles, format_slots, parse_slot_overrides
+from recode_resources import APP_LABEL
+
+PAYPAL_LINK = "https://www.paypal.com/donate/?hosted_button_id=KDGESDGHAJGLN"
+HELP_LINK = "https://github.com/Callidus80/OBSRecode"
+UI_TICK_MS = 50  # Queued worker events are applied to the widgets at this rate
+MAX_EVENTS_PER_TICK = 20000  # Leaves time for input and redraws when workers flood the queue
+FLASH_INTERVAL_MS = 500
+FILE_LIST_ROWS = 10
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
+SETTINGS_SAVE_DELAY_MS = 500  # Changes made within this time of each other are written to disk once
+SCAN_PROGRESS_INTERVAL = 0.2  # Seconds between updates of the file count while the source is scanned
+# Settings whose change needs a rescan of the source directory or a new log file
+SCAN_SETTINGS = {"source_dir", "search_text", "recursive_scan", "include_globs", "exclude_globs"}
+LOG_FILE_SETTINGS = {"write_logfile", "output_dir", "log_max_mb", "log_backup_count", "log_rotate_daily"}
+
+def format_rate(rate):
+    return f"{rate / 1024**2:.1f} MB/s"
+
+def format_resources(samples):
+    """One line for the resource readout, e.g. "OBSRecode 2% CPU, 80 MB | 2 encoders 750% CPU, 1.2 GB, 180 threads, ..."."""
+    parts = [f"{APP_LABEL} {s.cpu_percent or 0:.0f}% CPU, {format_size(s.rss_bytes)}" for s in samples if s.process == APP_LABEL]
+    encoders = [s for s in samples if s.process != APP_LABEL]
+    if not encoders:
+        return " | ".join(parts + ["no encoder running"])
+    total = lambda field: sum(getattr(s, field) or 0 for s in encoders)
+    text = f"{len(encoders)} encoder{'s' if len(encoders) > 1 else ''} {total('cpu_percent'):.0f}% CPU, {format_size(total('rss_bytes'))}"
+    if any(s.threads is not None for s in encoders):
+        text += f", {total('threads')} threads"
+    if any(s.read_rate is not None for s in encoders):
+        text += f", read {format_rate(total('read_rate'))}, write {format_rate(total('write_rate'))}"
+    return " | ".join(parts + [text])
+
+class OBSRecodeGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("OBSRecode")
+        self.root.geometry("1170x500")
+        self.root.minsize(500, 600)
+
+        # Worker threads never touch widgets; they queue events for process_ui_events
+        self.ui_events = queue.Queue()
+
+        # Load and validate settings
+        self.settings, self.settings_valid = load_and_validate_settings()
+        self.applied_settings = copy.deepcopy(self.settings)  # What the widgets and file list reflect
+        self.settings_save_id = None  # Pending after() call that writes the settings file
+        self.journal = None  # JobJournal remembering jobs between runs; opened by the first scan, off the Tk thread
+        self.journal_lock = threading.Lock()
+
+        # Log file output goes through file_log's queue, never straight to disk
+        self.logger = logging.getLogger("OBSRecode")
+        self.logger.propagate = False
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.setLevel(logging.DEBUG if self.settings.get("debug_mode", False) else logging.INFO)
+        self.file_log = None
+
+        # Toggle states with persistence from settings
+        self.debug_mode = tk.BooleanVar(value=self.settings.get("debug_mode", False))
+        self.auto_overwrite = tk.BooleanVar(value=self.settings.get("auto_overwrite", False))
+        self.delete_original = tk.BooleanVar(value=self.settings.get("delete_original", True))
+        self.write_logfile = tk.BooleanVar(value=self.settings.get("write_logfile", False))
+        self.shutdown_after_completion = tk.BooleanVar(value=self.settings.get("shutdown_after_completion", False))
+        self.watch_mode = tk.BooleanVar(value=self.settings.get("watch_mode", False))
+        self.throttle_encoders = tk.BooleanVar(value=self.settings.get("throttle_encoders", False))
+
+        # Setup menu
+        self.menu_bar = tk.Menu(root)
+        self.root.config(menu=self.menu_bar)
+        
+        # Settings menu
+        self.settings_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Settings", menu=self.settings_menu)
+        self.settings_menu.add_command(label="Configure Settings", command=self.open_settings_window)
+        
+        # Support My Work menu
+        self.support_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Support My Work", menu=self.support_menu)
+        self.support_menu.add_command(label="Buy Me a Beer", command=self.open_support_window)
+
+        # Help menu
+        self.help_menu = tk.Menu(self.menu_bar, tearoff=0)
+        self.menu_bar.add_cascade(label="Help", menu=self.help_menu)
+        self.help_menu.add_command(label="Documentation", command=lambda: webbrowser.open(HELP_LINK))
+
+        # Header
+        self.header_label = tk.Label(root, text="OBSRecode", font=("Helvetica", 14, "bold"), fg="#00B7EB")
+        self.header_label.pack(pady=5)
+
+        # Main frame for dynamic content
+        self.main_frame = tk.Frame(root)
+        self.main_frame.pack(side=tk.TOP, fill="both", expand=True)
+
+        # Note label for settings status
+        self.note_label = tk.Label(self.main_frame, font=("Helvetica", 10, "bold"))
+        self.update_note_label()
+        self.note_label.pack(pady=5)
+
+        # Files found frame
+        self.files_found_frame = tk.Frame(self.main_frame)
+        self.files_found_frame.pack(pady=5)
+        self.files_found_label = tk.Label(self.files_found_frame, text="Files found for processing: 0")
+        self.files_found_label.pack(side=tk.LEFT, padx=5)
+        self.refresh_button = tk.Button(self.files_found_frame, text="Refresh", command=self.update_files_found)
+        self.refresh_button.pack(side=tk.LEFT, padx=5)
+        self.view_button = tk.Button(self.files_found_frame, text="View", command=self.view_files_to_process)
+        self.view_button.pack(side=tk.LEFT, padx=5)
+        self.scan_cancel = None  # Event stopping the running source scan
+        self.scan_generation = 0  # Results of older scans are ignored
+        self.starting = False  # Start was clicked; processing begins once the running scan finishes
+
+        # Progress label
+        self.progress_label = tk.Label(self.main_frame, text="0 of 0 processed")
+        self.progress_label.pack(pady=5)
+
+        # HandbrakeCLI status label
+        self.cli_status_label = tk.Label(self.main_frame, text="")
+        self.update_cli_status()
+        self.cli_status_label.pack(pady=5)
+
+        # Progress bar
+        self.progress = ttk.Progressbar(self.main_frame, length=1000, mode="determinate")
+        self.progress.pack(pady=5)
+
+        # Resource readout, filled in from the engine's samples while a batch runs
+        self.resources_label = tk.Label(self.main_frame, text="", fg="gray")
+        self.resources_label.pack()
+
+        # File list, only the visible rows are drawn
+        self.file_list = FileList(self.main_frame, height=FILE_LIST_ROWS)
+        self.file_list.pack(pady=5, fill="x")
+
+        # Button frame (above log area)
+        self.button_frame = tk.Frame(self.main_frame)
+        self.button_frame.pack(pady=5, fill="x")
+
+        # Start button
+        self.start_button = tk.Button(self.button_frame, text="Start", command=self.start_processing)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+
+        # Cancel button
+        self.cancel_button = tk.Button(self.button_frame, text="Cancel", command=self.cancel_processing, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+
+        # Close button (for processing completion)
+        self.close_button = tk.Button(self.button_frame, text="Processing", state="disabled", command=self.close_gui)
+        self.close_button.pack(side=tk.LEFT, padx=5)
+
+        # Exit button
+        self.exit_button = tk.Button(self.button_frame, text="Exit", command=self.close_gui)
+        self.exit_button.pack(side=tk.LEFT, padx=5)
+
+        # Options frame (below buttons)
+        self.options_frame = tk.Frame(self.main_frame)
+        self.options_frame.pack(pady=5, fill="x")
+
+        # Debug tick box
+        self.debug_check = tk.Checkbutton(self.options_frame, text="Debug", variable=self.debug_mode, command=self.toggle_debug)
+        self.debug_check.pack(side=tk.LEFT, padx=5)
+
+        # Automatically Overwrite tick box
+        self.overwrite_check = tk.Checkbutton(self.options_frame, text="Automatically Overwrite", variable=self.auto_overwrite, command=self.save_options)
+        self.overwrite_check.pack(side=tk.LEFT, padx=5)
+
+        # Delete Original Files tick box
+        self.delete_check = tk.Checkbutton(self.options_frame, text="Delete Original Files", variable=self.delete_original, command=self.save_options)
+        self.delete_check.pack(side=tk.LEFT, padx=5)
+
+        # Write to Logfile tick box
+        self.logfile_check = tk.Checkbutton(self.options_frame, text="Write to Logfile", variable=self.write_logfile, command=self.toggle_logfile)
+        self.logfile_check.pack(side=tk.LEFT, padx=5)
+
+        # Shutdown After Completion tick box
+        self.shutdown_check = tk.Checkbutton(self.options_frame, text="Shutdown PC After Completion", variable=self.shutdown_after_completion, command=self.save_options)
+        self.shutdown_check.pack(side=tk.LEFT, padx=5)
+
+        # Watch Folder tick box
+        self.watch_check = tk.Checkbutton(self.options_frame, text="Watch Folder", variable=self.watch_mode, command=self.save_options)
+        self.watch_check.pack(side=tk.LEFT, padx=5)
+
+        # Throttle Encoders tick box, stays usable during a batch to throttle it live
+        self.throttle_check = tk.Checkbutton(self.options_frame, text="Throttle Encoders", variable=self.throttle_encoders, command=self.toggle_throttle)
+        self.throttle_check.pack(side=tk.LEFT, padx=5)
+
+        # Log level filter
+        self.log_filter_frame = tk.Frame(self.main_frame)
+        self.log_filter_frame.pack(fill="x")
+        tk.Label(self.log_filter_frame, text="Show:").pack(side=tk.LEFT, padx=5)
+        self.log_view_level = tk.StringVar(value=self.settings.get("log_view_level", "DEBUG"))
+        self.log_level_box = ttk.Combobox(self.log_filter_frame, textvariable=self.log_view_level, values=LOG_LEVELS, state="readonly", width=10)
+        self.log_level_box.bind("<<ComboboxSelected>>", self.change_log_view_level)
+        self.log_level_box.pack(side=tk.LEFT)
+
+        # Log text area, keeps only the last log_view_lines lines
+        self.log_text = scrolledtext.ScrolledText(self.main_frame, width=130, height=20)
+        self.log_text.pack(pady=5, fill="x", expand=True)
+        self.log_lines = deque(maxlen=max(100, int(self.settings.get("log_view_lines", 5000))))  # (level number, entry)
+        self.log_view_count = 0  # Lines currently in log_text
+
+        self.files_to_process = []
+        self.file_sizes = {}  # input_file -> size found by the last scan, shown in the file list
+        self.total_files = 0
+        self.processed_files = 0
+        self.batch_eta = None  # Predicted seconds left in the batch, from past encode speeds
+        self.engine = None  # RecodeEngine of the running batch
+        self.cancel_flag = threading.Event()
+        self.flash_on = False
+        self.is_processing = False
+        self.settings_window = None
+        self.support_window = None
+        self.view_window = None  # Track view window instance
+
+        # Initial logfile setup
+        self.toggle_logfile()
+
+        # Recovery and the first scan may wait on a sleeping NAS, so they run after the window is up
+        self.update_files_found(recover=True)
+
+        self.root.after(UI_TICK_MS, self.process_ui_events)
+        self.root.after(FLASH_INTERVAL_MS, self.flash_labels)
+
+    def save_settings(self, refresh_all=False):
+        """Schedule a write of the settings and refresh only what depends on the keys that changed.
+
+        Returns the set of changed keys.
+        """
+        changed = {key for key, value in self.settings.items() if self.applied_settings.get(key) != value}
+        if changed:
+            self.applied_settings = copy.deepcopy(self.settings)
+            if self.settings_save_id:
+                self.root.after_cancel(self.settings_save_id)
+            self.settings_save_id = self.root.after(SETTINGS_SAVE_DELAY_MS, self.write_settings)
+        if refresh_all or "handbrake_cli_path" in changed:
+            self.update_cli_status()
+        if refresh_all or changed & SCAN_SETTINGS:
+            self.update_files_found()
+        return changed
+
+    def write_settings(self):
+        """Write a pending settings change to disk now."""
+        if self.settings_save_id:
+            self.root.after_cancel(self.settings_save_id)
+        self.settings_save_id = None
+        try:
+            save_settings_file(self.settings)
+        except OSError as e:
+            self.log_message(f"Cannot save settings: {e}", "ERROR")
+
+    def save_options(self):
+        self.settings["debug_mode"] = self.debug_mode.get()
+        self.settings["auto_overwrite"] = self.auto_overwrite.get()
+        self.settings["delete_original"] = self.delete_original.get()
+        self.settings["write_logfile"] = self.write_logfile.get()
+        self.settings["shutdown_after_completion"] = self.shutdown_after_completion.get()
+        self.settings["watch_mode"] = self.watch_mode.get()
+        self.save_settings()
+
+    def toggle_throttle(self):
+        self.settings["throttle_encoders"] = self.throttle_encoders.get()
+        self.save_settings()
+        if self.engine and self.is_processing:
+            self.engine.set_throttled(self.settings["throttle_encoders"])
+
+    def toggle_debug(self):
+        self.save_options()
+        self.logger.setLevel(logging.DEBUG if self.debug_mode.get() else logging.INFO)
+        self.log_message(f"Debug mode {'enabled' if self.debug_mode.get() else 'disabled'}.")
+
+    def toggle_logfile(self):
+        """Enable or disable logging to file based on write_logfile toggle."""
+        self.save_options()
+        # Reopen on every call so a new output directory or rotation setting takes effect
+        self.close_file_log()
+        if self.write_logfile.get() and self.settings_valid and self.settings["output_dir"]:
+            log_path = os.path.normpath(os.path.join(self.settings["output_dir"], LOG_FILE))
+            try:
+                self.file_log = AsyncFileLog.from_settings(log_path, self.settings)
+            except OSError as e:
+                self.log_message(f"Cannot open log file {log_path}: {e}", "ERROR")
+                return
+            self.logger.addHandler(self.file_log.handler)
+            self.log_message("Logging to file enabled.")
+        else:
+            self.log_message("Logging to file disabled.")
+
+    def close_file_log(self):
+        if self.file_log:
+            self.logger.removeHandler(self.file_log.handler)
+            self.file_log.close()
+            self.file_log = None
+
+    def update_note_label(self):
+        if self.settings_valid:
+            self.note_label.config(text="Settings loaded successfully", fg="green")
+        else:
+            self.note_label.config(text="Settings not set or invalid", fg="red")
+
+    def update_cli_status(self):
+        """Check for HandBrakeCLI on a background thread; a network path may take a while to answer."""
+        cli_path = self.settings.get("handbrake_cli_path", "")
+        self.cli_status_label.config(text=f"Checking for HandbrakeCLI at: {cli_path or 'Not set'}", fg="gray")
+        check = lambda: self.post_ui(self.show_cli_status, cli_path, handbrake_cli_found({"handbrake_cli_path": cli_path}))
+        threading.Thread(target=check, daemon=True).start()
+
+    def show_cli_status(self, cli_path, found):
+        if cli_path != self.settings.get("handbrake_cli_path", ""):
+            return  # Changed again while this check ran; a newer check is on its way
+        if found:
+            self.cli_status_label.config(text=f"HandbrakeCLI found at: {cli_path}", fg="green")
+        else:
+            self.cli_status_label.config(text=f"HandbrakeCLI not found at: {cli_path or 'Not set'}. Configure Settings.", fg="red")
+
+    def update_files_found(self, recover=False):
+        """Rescan the source directory on a background thread; the count fills in as files are found.
+
+        recover first cleans up after encodes interrupted in an earlier run.
+        """
+        self.cancel_scan()
+        self.scan_generation += 1
+        if not self.settings_valid or not self.settings["source_dir"]:
+            self.finish_scan(self.scan_generation, [], None)
+            if recover:
+                threading.Thread(target=self.recover_interrupted, daemon=True).start()
+            return
+
+        self.scan_cancel = threading.Event()
+        self.files_found_label.config(text="Files found for processing: scanning...")
+        self.refresh_button.config(text="Stop", command=self.stop_scan)
+        if not self.is_processing:
+            self.start_button.config(state="disabled")
+        # A copy, so settings saved while the scan runs cannot change it half way
+        args = (copy.deepcopy(self.settings), self.scan_cancel, self.scan_generation, recover, self.starting)
+        threading.Thread(target=self.scan_source_dir, args=args, daemon=True).start()
+
+    def cancel_scan(self):
+        if self.scan_cancel:
+            self.scan_cancel.set()
+            self.scan_cancel = None
+
+    def stop_scan(self):
+        """Stop button: give up on the running scan at once, even if its thread is stuck waiting for the disk."""
+        self.cancel_scan()
+        self.finish_scan(self.scan_generation, None, "scan stopped, press Refresh to scan again")
+        self.scan_generation += 1
+
+    def open_journal(self):
+        """Background threads only: the job journal, opened on first use; its drive may be slow to wake."""
+        with self.journal_lock:
+            if self.journal is None:
+                self.journal = JobJournal()
+            return self.journal
+
+    def recover_interrupted(self):
+        for input_file in self.open_journal().recover_interrupted(self.settings.get("scratch_dir")):
+            self.log_message(f"Previous encode of {input_file} was interrupted; partial output removed, file requeued.", "WARNING")
+
+    def scan_source_dir(self, settings, cancel, generation, recover, starting):
+        """Scan thread: find the files to process and hand the result to finish_scan.
+
+        starting (Start was clicked) also looks up which of their outputs already exist and whether
+        HandBrakeCLI is there, so the Tk thread can start the batch without touching the disk.
+        """
+        try:
+            journal = self.open_journal()
+        except (OSError, sqlite3.Error) as e:
+            self.post_ui(self.finish_scan, generation, None, f"cannot open the job journal: {e}")
+            return
+        if recover:
+            self.recover_interrupted()
+        last_update = [0.0]
+
+        def on_progress(found, entries_read):
+            now = time.monotonic()
+            if now - last_update[0] >= SCAN_PROGRESS_INTERVAL:
+                last_update[0] = now
+                self.post_ui(self.show_scan_progress, generation, found, entries_read)
+
+        try:
+            source_files = find_source_files(settings, journal, on_progress, cancel)
+        except ScanCancelled:
+            pass  # stop_scan or a newer scan has already updated the window
+        except OSError:
+            self.post_ui(self.finish_scan, generation, None, "Source directory not found")
+        else:
+            files = [f.path for f in source_files]
+            start_checks = (find_existing_outputs(settings, files), handbrake_cli_found(settings)) if starting else None
+            self.post_ui(self.finish_scan, generation, files, None, {f.path: f.size for f in source_files}, start_checks)
+
+    def show_scan_progress(self, generation, found, entries_read):
+        if generation == self.scan_generation:
+            self.files_found_label.config(text=f"Files found for processing: {found} so far (scanning, {entries_read} entries read)")
+
+    def finish_scan(self, generation, files, problem, sizes=None, start_checks=None):
+        """Show a scan's result; start_checks is (existing outputs, HandBrakeCLI found) for a scan started by Start."""
+        if generation != self.scan_generation:
+            return  # A newer scan has started since
+        self.scan_cancel = None
+        starting, self.starting = self.starting, False
+        self.refresh_button.config(text="Refresh", command=self.update_files_found)
+        if not self.is_processing:
+            self.start_button.config(state="normal")
+            self.files_to_process = files or []
+            self.file_sizes = sizes or {}
+        if problem:
+            self.files_found_label.config(text=f"Files found for processing: 0 ({problem})")
+            if starting:
+                self.log_message(f"Processing not started: {problem}.", "WARNING")
+            return
+        self.files_found_label.config(text=f"Files found for processing: {len(files)}")
+        self.log_message(f"Refreshed file list: {len(files)} files found.", "DEBUG")
+        if starting:
+            self.check_overwrites_and_start(*start_checks)
+
+    def view_files_to_process(self):
+        """Open a popup window showing all files to be processed."""
+        if self.view_window and self.view_window.winfo_exists():
+            self.view_window.lift()
+            self.view_window.focus_force()
+            return
+
+        if not self.files_to_process:
+            messagebox.showinfo("No Files", "No files found to process. Please check your settings and source directory.")
+            return
+
+        self.view_window = tk.Toplevel(self.root)
+        self.view_window.title("Files to Process")
+        self.view_window.geometry("600x400")
+        self.view_window.minsize(600, 400)
+        self.view_window.grab_set()
+
+        # Header
+        tk.Label(self.view_window, text="Files to be Processed", font=("Helvetica", 12, "bold")).pack(pady=5)
+
+        # Scrolled text area for file list
+        file_list_text = scrolledtext.ScrolledText(self.view_window, width=80, height=20)
+        file_list_text.pack(pady=5, fill="both", expand=True)
+
+        # Populate the file list in one insert
+        file_list_text.insert(tk.END, "\n".join(self.files_to_process) + "\n")
+        file_list_text.config(state="disabled")  # Make read-only
+
+        # Close button
+        tk.Button(self.view_window, text="Close", command=self.view_window.destroy).pack(pady=5)
+
+    def open_settings_window(self):
+        if self.is_processing:
+            messagebox.showinfo("Processing", "Cannot configure settings while processing.")
+            return
+
+        if self.settings_window and self.settings_window.winfo_exists():
+            self.settings_window.lift()
+            self.settings_window.focus_force()
+            return
+
+        self.settings_window = tk.Toplevel(self.root)
+        self.settings_window.title("Settings")
+        self.settings_window.geometry("500x480")
+        self.settings_window.minsize(500, 450)
+        self.settings_window.grab_set()
+
+        temp_settings = self.settings.copy()
+
+        # Tabs keep the window short enough for small screens; Save and Close stay below them
+        notebook = ttk.Notebook(self.settings_window)
+        general_tab = tk.Frame(notebook)
+        encoding_tab = tk.Frame(notebook)
+        advanced_tab = tk.Frame(notebook)
+        notebook.add(general_tab, text="General")
+        notebook.add(encoding_tab, text="Encoding")
+        notebook.add(advanced_tab, text="Advanced")
+
+        tk.Label(general_tab, text="* HandbrakeCLI Executable:", fg="red").pack(pady=2)
+        cli_frame = tk.Frame(general_tab)
+        cli_frame.pack(fill="x", pady=2)
+        self.cli_entry = tk.Entry(cli_frame, width=50, fg="gray")
+        cli_placeholder = r"C:\Handbrake\HandBrakeCLI.exe"
+        self.cli_entry.insert(0, cli_placeholder if not temp_settings["handbrake_cli_path"] else temp_settings["handbrake_cli_path"])
+        self.cli_entry.bind("<FocusIn>", lambda event: self.clear_placeholder(event, cli_placeholder))
+        self.cli_entry.bind("<FocusOut>", lambda event: self.add_placeholder(event, cli_placeholder))
+        self.cli_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(cli_frame, text="Browse", command=lambda: self.browse_file(self.cli_entry, "*.exe")).pack(side=tk.LEFT)
+
+        tk.Label(general_tab, text="* Source Directory:", fg="red").pack(pady=2)
+        source_frame = tk.Frame(general_tab)
+        source_frame.pack(fill="x", pady=2)
+        self.source_entry = tk.Entry(source_frame, width=50, fg="gray")
+        source_placeholder = r"E:\Recorded Gaming"
+        self.source_entry.insert(0, source_placeholder if not temp_settings["source_dir"] else temp_settings["source_dir"])
+        self.source_entry.bind("<FocusIn>", lambda event: self.clear_placeholder(event, source_placeholder))
+        self.source_entry.bind("<FocusOut>", lambda event: self.add_placeholder(event, source_placeholder))
+        self.source_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(source_frame, text="Browse", command=lambda: self.browse_dir(self.source_entry, self.settings_window)).pack(side=tk.LEFT)
+
+        tk.Label(general_tab, text="Filename starts with:").pack(pady=2)
+        tk.Label(general_tab, text="Optional, searches for filenames starting with text string.").pack()
+        tk.Label(general_tab, text="If not specified all video files (.mkv, .mp4, .mov) in source directory will be re-encoded.", fg="gray").pack()
+        search_frame = tk.Frame(general_tab)
+        search_frame.pack(fill="x", pady=2)
+        self.search_entry = tk.Entry(search_frame, width=50, fg="gray")
+        search_placeholder = "example OBS e.g: \"OBS Game Name.mkv\""
+        self.search_entry.insert(0, search_placeholder if not temp_settings["search_text"] else temp_settings["search_text"])
+        self.search_entry.bind("<FocusIn>", lambda event: self.clear_placeholder(event, search_placeholder))
+        self.search_entry.bind("<FocusOut>", lambda event: self.add_placeholder(event, search_placeholder))
+        self.search_entry.pack(side=tk.LEFT, padx=5)
+
+        self.recursive_var = tk.BooleanVar(value=temp_settings["recursive_scan"])
+        tk.Checkbutton(general_tab, text="Include subfolders", variable=self.recursive_var).pack(pady=2)
+        tk.Label(general_tab, text="Include / Exclude patterns:").pack(pady=2)
+        tk.Label(general_tab, text="Optional, comma separated, matched against the path inside the source directory e.g: 2025-*/*", fg="gray").pack()
+        globs_frame = tk.Frame(general_tab)
+        globs_frame.pack(fill="x", pady=2)
+        self.include_entry = tk.Entry(globs_frame, width=24)
+        self.include_entry.insert(0, ", ".join(temp_settings["include_globs"]))
+        self.include_entry.pack(side=tk.LEFT, padx=5)
+        self.exclude_entry = tk.Entry(globs_frame, width=24)
+        self.exclude_entry.insert(0, ", ".join(temp_settings["exclude_globs"]))
+        self.exclude_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(general_tab, text="* Output Directory:", fg="red").pack(pady=2)
+        output_frame = tk.Frame(general_tab)
+        output_frame.pack(fill="x", pady=2)
+        self.output_entry = tk.Entry(output_frame, width=50, fg="gray")
+        output_placeholder = r"E:\Recorded Gaming"
+        self.output_entry.insert(0, output_placeholder if not temp_settings["output_dir"] else temp_settings["output_dir"])
+        self.output_entry.bind("<FocusIn>", lambda event: self.clear_placeholder(event, output_placeholder))
+        self.output_entry.bind("<FocusOut>", lambda event: self.add_placeholder(event, output_placeholder))
+        self.output_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(output_frame, text="Browse", command=lambda: self.browse_dir(self.output_entry, self.settings_window)).pack(side=tk.LEFT)
+
+        tk.Label(encoding_tab, text="Bitrate (kbps):").pack(pady=2)
+        tk.Label(encoding_tab, text="Optional, defaults to ~6000kbps ~230MB per 5 minutes", fg="gray").pack()
+        bitrate_frame = tk.Frame(encoding_tab)
+        bitrate_frame.pack(fill="x", pady=2)
+        self.bitrate_entry = tk.Entry(bitrate_frame, width=50, fg="gray")
+        self.bitrate_entry.insert(0, str(temp_settings["bitrate"]))
+        self.bitrate_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(encoding_tab, text="Concurrent encodes:").pack(pady=2)
+        tk.Label(encoding_tab, text="Optional, number of files encoded at the same time, defaults to 2", fg="gray").pack()
+        jobs_frame = tk.Frame(encoding_tab)
+        jobs_frame.pack(fill="x", pady=2)
+        self.jobs_entry = tk.Entry(jobs_frame, width=50, fg="gray")
+        self.jobs_entry.insert(0, str(temp_settings["max_concurrent_jobs"]))
+        self.jobs_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(encoding_tab, text="Job order:").pack(pady=2)
+        self.order_var = tk.StringVar(value=temp_settings["job_order"])
+        ttk.Combobox(encoding_tab, textvariable=self.order_var, values=JOB_ORDERS, state="readonly", width=20).pack(pady=2)
+
+        self.segments_var = tk.BooleanVar(value=temp_settings["segment_encoding"])
+        tk.Checkbutton(encoding_tab, text="Split long recordings across encode slots", variable=self.segments_var).pack(pady=2)
+
+        tk.Label(encoding_tab, text="Encoder slots:").pack(pady=2)
+        tk.Label(encoding_tab, text="Optional, slots per encoder profile, e.g: nvenc_av1=2, svt_av1=1", fg="gray").pack()
+        slots_frame = tk.Frame(encoding_tab)
+        slots_frame.pack(fill="x", pady=2)
+        self.slots_entry = tk.Entry(slots_frame, width=50)
+        self.slots_entry.insert(0, format_slots(temp_settings))
+        self.slots_entry.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(advanced_tab, text="Scratch Directory:").pack(pady=2)
+        tk.Label(advanced_tab, text="Optional, fast local folder to encode to when the output directory is a network share", fg="gray").pack()
+        scratch_frame = tk.Frame(advanced_tab)
+        scratch_frame.pack(fill="x", pady=2)
+        self.scratch_entry = tk.Entry(scratch_frame, width=50)
+        self.scratch_entry.insert(0, temp_settings["scratch_dir"])
+        self.scratch_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(scratch_frame, text="Browse", command=lambda: self.browse_dir(self.scratch_entry, self.settings_window)).pack(side=tk.LEFT)
+
+        tk.Label(advanced_tab, text="Staging Directory:").pack(pady=2)
+        tk.Label(advanced_tab, text="Optional, fast local folder the next recordings are copied to while one encodes", fg="gray").pack()
+        stage_frame = tk.Frame(advanced_tab)
+        stage_frame.pack(fill="x", pady=2)
+        self.stage_entry = tk.Entry(stage_frame, width=50)
+        self.stage_entry.insert(0, temp_settings["stage_dir"])
+        self.stage_entry.pack(side=tk.LEFT, padx=5)
+        tk.Button(stage_frame, text="Browse", command=lambda: self.browse_dir(self.stage_entry, self.settings_window)).pack(side=tk.LEFT)
+
+        metrics_frame = tk.Frame(advanced_tab)
+        metrics_frame.pack(pady=2)
+        self.metrics_var = tk.BooleanVar(value=temp_settings["write_metrics"])
+        tk.Checkbutton(metrics_frame, text="Write job metrics to output directory as", variable=self.metrics_var).pack(side=tk.LEFT)
+        self.metrics_format_var = tk.StringVar(value=temp_settings["metrics_format"])
+        ttk.Combobox(metrics_frame, textvariable=self.metrics_format_var, values=METRICS_FORMATS, state="readonly", width=6).pack(side=tk.LEFT)
+        self.resource_samples_var = tk.BooleanVar(value=temp_settings["write_resource_samples"])
+        tk.Checkbutton(advanced_tab, text="Write CPU, memory and I/O samples to output directory", variable=self.resource_samples_var).pack(pady=2)
+
+        legend_frame = tk.Frame(self.settings_window)
+        legend_frame.pack(side=tk.BOTTOM, pady=5, fill="x")
+        tk.Label(legend_frame, text="* = Required Field", fg="red").pack()
+
+        button_frame = tk.Frame(self.settings_window)
+        button_frame.pack(side=tk.BOTTOM, pady=10)
+
+        tk.Button(button_frame, text="Save", command=lambda: self.save_settings_from_window(self.settings_window)).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Close", command=self.settings_window.destroy).pack(side=tk.LEFT, padx=5)
+
+        notebook.pack(fill="both", expand=True, padx=5, pady=(5, 0))
+
+    def open_support_window(self):
+        """Open a support window with a Buy Me a Beer explanation and PayPal link."""
+        if self.support_window and self.support_window.winfo_exists():
+            self.support_window.lift()
+            self.support_window.focus_force()
+            return
+
+        self.support_window = tk.Toplevel(self.root)
+        self.support_window.title("Support My Work")
+        self.support_window.geometry("400x200")
+        self.support_window.minsize(400, 200)
+        self.support_window.grab_set()
+
+        # Support message
+        tk.Label(self.support_window, text="Support My Work", font=("Helvetica", 12, "bold")).pack(pady=10)
+        tk.Label(self.support_window, text="If you find OBSRecode useful and want to support its development,", wraplength=350).pack()
+        tk.Label(self.support_window, text="consider buying me a beer! Your support helps keep this project going.", wraplength=350).pack()
+
+        # Button to PayPal
+        tk.Button(self.support_window, text="Buy Me a Beer", command=lambda: webbrowser.open(PAYPAL_LINK)).pack(pady=10)
+        
+        # Close button
+        tk.Button(self.support_window, text="Close", command=self.support_window.destroy).pack(pady=5)
+
+    def clear_placeholder(self, event, placeholder):
+        if event.widget.get() == placeholder:
+            event.widget.delete(0, tk.END)
+            event.widget.config(fg="black")
+
+    def add_placeholder(self, event, placeholder):
+        if not event.widget.get():
+            event.widget.insert(0, placeholder)
+            event.widget.config(fg="gray")
+
+    def browse_dir(self, entry, window):
+        dir_path = filedialog.askdirectory()
+        if dir_path:
+            entry.delete(0, tk.END)
+            entry.insert(0, os.path.normpath(dir_path))
+            entry.config(fg="black")
+            window.lift()
+            window.focus_force()
+
+    def browse_file(self, entry, file_type):
+        file_path = filedialog.askopenfilename(filetypes=[(f"{file_type} files", file_type)])
+        if file_path:
+            entry.delete(0, tk.END)
+            entry.insert(0, os.path.normpath(file_path))
+            entry.config(fg="black")
+            if self.settings_window:
+                self.settings_window.lift()
+                self.settings_window.focus_force()
+
+    def save_settings_from_window(self, window):
+        cli_text = self.cli_entry.get()
+        self.settings["handbrake_cli_path"] = os.path.normpath(cli_text) if cli_text else ""
+        
+        source_text = self.source_entry.get()
+        self.settings["source_dir"] = os.path.normpath(source_text) if source_text else ""
+        
+        search_text = self.search_entry.get()
+        search_placeholder = "example OBS e.g: \"OBS Game Name.mkv\""
+        self.settings["search_text"] = search_text if search_text and search_text != search_placeholder else ""
+        
+        self.settings["recursive_scan"] = self.recursive_var.get()
+        self.settings["include_globs"] = [g.strip() for g in self.include_entry.get().split(",") if g.strip()]
+        self.settings["exclude_globs"] = [g.strip() for g in self.exclude_entry.get().split(",") if g.strip()]
+
+        output_text = self.output_entry.get()
+        self.settings["output_dir"] = os.path.normpath(output_text) if output_text else ""
+        scratch_text = self.scratch_entry.get().strip()
+        self.settings["scratch_dir"] = os.path.normpath(scratch_text) if scratch_text else ""
+        stage_text = self.stage_entry.get().strip()
+        self.settings["stage_dir"] = os.path.normpath(stage_text) if stage_text else ""
+        
+        bitrate_text = self.bitrate_entry.get()
+        try:
+            self.settings["bitrate"] = int(bitrate_text) if bitrate_text else 6000
+        except ValueError:
+            messagebox.showerror("Error", "Bitrate must be a valid integer.")
+            return
+
+        jobs_text = self.jobs_entry.get()
+        try:
+            jobs = int(jobs_text) if jobs_text else 2
+            if jobs < 1:
+                raise ValueError
+            self.settings["max_concurrent_jobs"] = jobs
+        except ValueError:
+            messagebox.showerror("Error", "Concurrent encodes must be a whole number of 1 or more.")
+            return
+
+        self.settings["job_order"] = self.order_var.get()
+        self.settings["segment_encoding"] = self.segments_var.get()
+        self.settings["write_metrics"] = self.metrics_var.get()
+        self.settings["metrics_format"] = self.metrics_format_var.get()
+        self.settings["write_resource_samples"] = self.resource_samples_var.get()
+
+        try:
+            apply_slot_overrides(self.settings, parse_slot_overrides(self.slots_entry.get()))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Encoder slots: {e}")
+            return
+        if not enabled_profiles(self.settings):
+            messagebox.showerror("Error", "At least one encoder profile needs 1 or more slots.")
+            return
+        
+        if not self.settings["source_dir"] or not self.settings["output_dir"] or not self.settings["handbrake_cli_path"]:
+            messagebox.showerror("Error", "HandbrakeCLI executable, source directory, and output directory are required.")
+            return
+        was_valid = self.settings_valid
+        self.settings_valid = True
+        self.update_note_label()
+        changed = self.save_settings(refresh_all=not was_valid)
+        if not was_valid or changed & LOG_FILE_SETTINGS:
+            self.toggle_logfile()  # Update logging state after saving settings
+        self.log_message("Settings saved successfully.")
+        window.destroy()
+
+    def start_processing(self):
+        if not self.settings_valid:
+            messagebox.showerror("Error", "Please configure and save valid settings before starting.")
+            return
+        self.clear_gui()
+        # Scan again off the Tk thread so the list is current; finish_scan carries on from there
+        self.starting = True
+        self.update_files_found()
+
+    def check_overwrites_and_start(self, existing_files, cli_found):
+        """Confirm the scanned files (existing_files are their outputs already present) and start."""
+        if not self.settings["search_text"]:
+            confirm_msg = "No 'Filename starts with' specified. All video files (.mkv, .mp4, .mov) in the source directory will be re-encoded.\nDo you want to proceed?"
+            if not messagebox.askyesno("Confirm Processing All Files", confirm_msg):
+                self.log_message("Processing cancelled by user.")
+                return
+        
+        self.total_files = len(self.files_to_process)
+        
+        if self.total_files == 0 and not self.watch_mode.get():
+            self.log_message(f"No video files (.mkv, .mp4, .mov) found in {self.settings['source_dir']} to process.", "WARNING")
+            self.enable_close_button(cancelled=False)
+            return
+
+        if not self.auto_overwrite.get():
+            if existing_files:
+                overwrite_msg = f"The following output files already exist:\n{', '.join(existing_files[:5])}{', ...' if len(existing_files) > 5 else ''}\n\nDo you want to overwrite them?"
+                if not messagebox.askyesno("File Overwrite Warning", overwrite_msg):
+                    self.log_message("Processing stopped due to existing output files.")
+                    return
+
+        self.setup_and_start(cli_found)
+
+    def clear_gui(self):
+        self.file_list.clear()
+        self.log_text.delete(1.0, tk.END)
+        self.log_lines.clear()
+        self.log_view_count = 0
+        self.progress["value"] = 0
+        self.processed_files = 0
+        self.total_files = 0
+        self.batch_eta = None
+        self.progress_label.config(text="0 of 0 processed")
+        self.close_button.config(text="Processing", state="disabled")
+        self.cancel_flag.clear()
+        self.cancel_button.config(state="disabled")
+
+    def log_message(self, message, level="INFO"):
+        """Queue a log line for the next UI tick and the log file. Safe to call from any thread."""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if self.file_log:
+            self.logger.log(logging.getLevelName(level), message)
+        self.ui_events.put(("log", {"message": message, "level": level, "entry": f"{timestamp} - {level} - {message}"}))
+
+    def handle_engine_event(self, kind, **data):
+        """Queue a RecodeEngine event for the next UI tick (called from worker threads)."""
+        self.ui_events.put((kind, data))
+
+    def post_ui(self, func, *args):
+        """Run func(*args) on the Tk thread at the next UI tick. Safe to call from any thread."""
+        self.ui_events.put(("call", (func, args)))
+
+    def process_ui_events(self):
+        """Apply everything queued since the last tick.
+
+        Log lines are written with a single insert and only the latest
+        progress of each file is drawn, however many events arrived.
+        """
+        log_lines = []
+        latest_progress = {}
+        latest_batch = None
+        latest_resources = None
+        current_level = logging.DEBUG if self.debug_mode.get() else logging.INFO
+        for _ in range(MAX_EVENTS_PER_TICK):
+            try:
+                kind, data = self.ui_events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "log":
+                # Always log to GUI text area if valid settings
+                level_number = logging.getLevelName(data["level"])
+                if self.settings_valid and self.settings["output_dir"] and level_number >= current_level:
+                    log_lines.append((level_number, data["entry"]))
+            elif kind == "progress":
+                latest_progress[data["input_file"]] = data
+            elif kind == "batch":
+                latest_batch = data
+            elif kind == "resources":
+                latest_resources = data["samples"]
+            elif kind == "queued":
+                self.add_file_row(data["input_file"])
+            elif kind == "plan":
+                self.update_file_note(data["input_file"], data["reason"])
+            elif kind == "status":
+                latest_progress.pop(data["input_file"], None)  # Older than the new status
+                self.update_file_status(data["input_file"], data["status"])
+            elif kind == "call":
+                func, args = data
+                func(*args)
+
+        if log_lines:
+            self.append_log_lines(log_lines)
+        for input_file, progress in latest_progress.items():
+            self.update_file_progress(input_file, progress)
+        if latest_batch:
+            self.processed_files, self.total_files = latest_batch["processed"], latest_batch["total"]
+            self.batch_eta = latest_batch["eta"]
+            self.update_progress()
+        if latest_resources is not None and self.is_processing:
+            self.resources_label.config(text=format_resources(latest_resources))
+        self.root.after(UI_TICK_MS, self.process_ui_events)
+
+    def append_log_lines(self, lines):
+        """Add (level number, entry) lines to the log view, dropping the oldest beyond the line cap."""
+        self.log_lines.extend(lines)
+        view_level = logging.getLevelName(self.log_view_level.get())
+        shown = [entry for level_number, entry in lines if level_number >= view_level]
+        if not shown:
+            return
+        shown = shown[-self.log_lines.maxlen:]
+        self.log_text.insert(tk.END, "\n".join(shown) + "\n")
+        self.log_view_count += len(shown)
+        excess = self.log_view_count - self.log_lines.maxlen
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_view_count -= excess
+        self.log_text.see(tk.END)
+
+    def change_log_view_level(self, event=None):
+        """Redraw the log view from the kept lines at the newly selected level."""
+        self.settings["log_view_level"] = self.log_view_level.get()
+        self.save_settings()
+        view_level = logging.getLevelName(self.log_view_level.get())
+        shown = [entry for level_number, entry in self.log_lines if level_number >= view_level]
+        self.log_text.delete(1.0, tk.END)
+        if shown:
+            self.log_text.insert(tk.END, "\n".join(shown) + "\n")
+        self.log_view_count = len(shown)
+        self.log_text.see(tk.END)
+
+    def update_progress(self):
+        processed, total = self.processed_files, self.total_files
+        if total > 0:
+            progress_value = (processed / total) * 100
+            self.progress["value"] = progress_value
+            eta = f" - ETA {format_eta(self.batch_eta)}" if self.batch_eta is not None and processed < total else ""
+            self.progress_label.config(text=f"{processed} of {total} processed{eta}")
+
+    def flash_labels(self):
+        """One shared timer blinks the rows of every file being processed."""
+        self.flash_on = not self.flash_on and not self.cancel_flag.is_set()
+        self.file_list.flash(self.flash_on)
+        self.root.after(FLASH_INTERVAL_MS, self.flash_labels)
+
+    def update_file_status(self, input_file, status):
+        if status == "completed":
+            self.file_list.update(input_file, status=status, percent=100.0, fps=None, eta=None)
+        else:
+            self.file_list.update(input_file, status=status, fps=None, eta=None)
+
+    def update_file_note(self, input_file, note):
+        """Show the probe result or skip reason on a file's row until encoding starts."""
+        self.file_list.update(input_file, note=note)
+
+    def update_file_progress(self, input_file, progress):
+        """Show a file's encode percent, fps and ETA on its row."""
+        self.file_list.update(input_file, percent=progress["percent"], fps=progress["fps"], eta=progress["eta"])
+
+    def process_files(self):
+        """Batch thread: feed the engine and wait for it; widgets are only updated through post_ui."""
+        self.engine.start()
+        self.engine.submit_many(self.files_to_process)
+        if self.settings["watch_mode"]:
+            self.watch_source_dir()
+        self.engine.wait()
+        self.post_ui(self.finish_processing)
+
+    def finish_processing(self):
+        if self.cancel_flag.is_set():
+            self.log_message("Processing cancelled by user.", "WARNING")
+            self.enable_close_button(cancelled=True)
+        else:
+            self.log_message("Processing complete.")
+            self.enable_close_button(cancelled=False)
+        self.start_button.config(state="normal")
+        self.cancel_button.config(state="disabled")
+        self.exit_button.config(state="normal")
+        self.is_processing = False
+        self.resources_label.config(text="")
+        self.settings_menu.entryconfig("Configure Settings", state="normal")
+        self.help_menu.entryconfig("Documentation", state="normal")
+        self.enable_tick_boxes()
+
+    def watch_source_dir(self):
+        """Queue new recordings as they finish writing until processing is cancelled."""
+        from recode_watch import FolderWatcher
+
+        def on_ready(input_file):
+            if not self.settings["auto_overwrite"] and find_existing_outputs(self.settings, [input_file]):
+                self.log_message(f"Skipping {input_file}: output file already exists.", "WARNING")
+                return
+            try:
+                self.file_sizes[input_file] = os.path.getsize(input_file)  # Here, not on the Tk thread
+            except OSError:
+                pass
+            self.engine.submit(input_file)
+
+        watcher = FolderWatcher(self.settings, on_ready, known_files=self.files_to_process, log=self.log_message, journal=self.journal)
+        watcher.start()
+        self.cancel_flag.wait()
+        watcher.stop()
+
+    def cancel_processing(self):
+        self.cancel_flag.set()
+        if self.engine:
+            self.engine.cancel()
+        self.cancel_button.config(state="disabled")
+        self.start_button.config(state="normal")
+        self.exit_button.config(state="normal")
+        self.is_processing = False
+        self.resources_label.config(text="")
+        self.settings_menu.entryconfig("Configure Settings", state="normal")
+        self.help_menu.entryconfig("Documentation", state="normal")
+        self.enable_tick_boxes()
+
+    def enable_tick_boxes(self):
+        self.debug_check.config(state="normal")
+        self.overwrite_check.config(state="normal")
+        self.delete_check.config(state="normal")
+        self.logfile_check.config(state="normal")
+        self.shutdown_check.config(state="normal")
+        self.watch_check.config(state="normal")
+
+    def disable_tick_boxes(self):
+        self.debug_check.config(state="disabled")
+        self.overwrite_check.config(state="disabled")
+        self.delete_check.config(state="disabled")
+        self.logfile_check.config(state="disabled")
+        self.shutdown_check.config(state="disabled")
+        self.watch_check.config(state="disabled")
+
+    def enable_close_button(self, cancelled=False):
+        if cancelled:
+            self.close_button.config(text="Process Cancelled - Click to Close", state="normal", bg="red", fg="white")
+        else:
+            self.close_button.config(text="COMPLETED - Click to Close", state="normal", bg="green", fg="white")
+            if self.shutdown_after_completion.get():
+                self.log_message("Shutdown PC option enabled. System will shut down after closing.")
+                self.root.after(2000, self.shutdown_pc)  # Delay shutdown by 2 seconds
+
+    def shutdown_pc(self):
+        """Shutdown the PC based on the operating system."""
+        system = platform.system()
+        try:
+            if system == "Windows":
+                os.system("shutdown /s /t 5")  # Shutdown in 5 seconds
+                self.log_message("Initiating Windows shutdown in 5 seconds.")
+            elif system == "Linux" or system == "Darwin":  # Darwin is macOS
+                os.system("shutdown -h now")  # Immediate shutdown for Linux/macOS
+                self.log_message("Initiating shutdown now.")
+            else:
+                self.log_message(f"Shutdown not supported on {system}. Please shut down manually.", "WARNING")
+        except Exception as e:
+            self.log_message(f"Failed to initiate shutdown: {e}", "ERROR")
+        finally:
+            self.close_gui()  # Close the GUI after initiating shutdown
+
+    def close_gui(self):
+        if self.is_processing:
+            messagebox.showwarning("Processing", "Cannot exit while processing. Please cancel processing first.")
+            return
+        if self.settings_save_id:
+            self.write_settings()
+        self.close_file_log()
+        self.root.quit()
+        self.root.destroy()
+
+    def setup_and_start(self, cli_found):
+        self.total_files = len(self.files_to_process)
+        self.processed_files = 0
+        self.progress["maximum"] = 100
+        self.update_progress()
+
+        if self.total_files == 0 and not self.watch_mode.get():
+            self.log_message(f"No video files (.mkv, .mp4, .mov) found in {self.settings['source_dir']} to process.", "WARNING")
+            self.enable_close_button(cancelled=False)
+            return
+
+        self.log_message(f"Found {self.total_files} video files to process in {self.settings['source_dir']}.")
+        for input_file in self.files_to_process:
+            self.add_file_row(input_file)
+
+        if not cli_found:
+            self.log_message(f"HandBrakeCLI not found at {self.settings['handbrake_cli_path']}", "ERROR")
+            self.enable_close_button()
+            return
+
+        self.log_message("Starting re-encoding process.")
+        self.start_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+        self.exit_button.config(state="disabled")
+        self.is_processing = True
+        self.settings_menu.entryconfig("Configure Settings", state="disabled")
+        self.help_menu.entryconfig("Documentation", state="disabled")
+        self.disable_tick_boxes()
+
+        self.engine = RecodeEngine(self.settings, on_event=self.handle_engine_event, journal=self.journal)
+        threading.Thread(target=self.process_files, daemon=True).start()
+
+    def add_file_row(self, input_file):
+        """Add a row for one queued file; rows are keyed by input file, so repeats are ignored."""
+        self.file_list.add(input_file, self.file_sizes.get(input_file))
+
+def run_gui():
+    root = tk.Tk()
+    app = OBSRecodeGUI(root)
+    root.mainloop()
+    if app.settings_save_id:  # Closed with the window's X before the delayed write ran
+        save_settings_file(app.settings)
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""Persistent SQLite job journal kept next to OBSRecodeSettings.json.
+
+Every encode job is recorded under its source path, size and mtime, so a new
+run can skip files that were already encoded and clean up after jobs that
+were interrupted by a crash, a reboot or Cancel.
+"""
+import os
+import glob
+import json
+import socket
+import sqlite3
+import threading
+import time
+
+from recode_engine import SETTINGS_DIR, partial_output_path
+
+JOURNAL_NAME = 'OBSRecodeJobs.sqlite'
+JOURNAL_FILE = os.path.join(SETTINGS_DIR, JOURNAL_NAME)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+QUARANTINED = "quarantined"  # Failed every retry; not scanned again until the file changes
+SPEED_SAMPLES = 20  # Older encodes fade out of the speed average after this many newer ones
+
+def pid_alive(pid):
+    """True if a process with this id is running on this machine."""
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def journal_path_for(settings_path):
+    """The job journal kept next to the settings file at settings_path."""
+    return os.path.join(os.path.dirname(os.path.abspath(settings_path)), JOURNAL_NAME)
+
+class JobJournal:
+    """Thread-safe job state store; source files are SourceFile(path, size, mtime_ns) tuples."""
+
+    def __init__(self, path=JOURNAL_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " source_path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+                " state TEXT NOT NULL, output_path TEXT, owner TEXT, error TEXT, updated_at REAL NOT NULL,"
+                " PRIMARY KEY (source_path, size, mtime_ns))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                " source_path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, info TEXT NOT NULL,"
+                " PRIMARY KEY (source_path, size, mtime_ns))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS speeds ("
+                " resolution TEXT NOT NULL, encoder TEXT NOT NULL, fps REAL NOT NULL, samples INTEGER NOT NULL,"
+                " PRIMARY KEY (resolution, encoder))"
+            )
+            rows = self.connection.execute(
+                "SELECT source_path, size, mtime_ns, state FROM jobs WHERE state IN (?, ?)", (DONE, QUARANTINED))
+            # Kept in memory so "already encoded?" is a set lookup during scans
+            self.done, self.quarantined = set(), set()
+            for row in rows:
+                (self.done if row[3] == DONE else self.quarantined).add(tuple(row[:3]))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def is_done(self, source_file):
+        with self.lock:
+            return tuple(source_file) in self.done
+
+    def is_settled(self, source_file):
+        """True if scans should leave the file out: encoded already, or quarantined."""
+        key = tuple(source_file)
+        with self.lock:
+            return key in self.done or key in self.quarantined
+
+    def mark(self, source_file, state, output_path=None, error=None):
+        key = tuple(source_file)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO jobs (source_path, size, mtime_ns, state, output_path, owner, error, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                key + (state, output_path, self.owner, error, time.time())
+            )
+            self.done.discard(key)
+            self.quarantined.discard(key)
+            if state == DONE:
+                self.done.add(key)
+            elif state == QUARANTINED:
+                self.quarantined.add(key)
+
+    def start(self, source_file, output_path):
+        self.mark(source_file, RUNNING, output_path)
+
+    def finish(self, source_file, output_path):
+        self.mark(source_file, DONE, output_path)
+
+    def fail(self, source_file, output_path, error):
+        self.mark(source_file, FAILED, output_path, error)
+
+    def requeue(self, source_file, output_path):
+        self.mark(source_file, QUEUED, output_path)
+
+    def quarantine(self, source_file, output_path, error):
+        self.mark(source_file, QUARANTINED, output_path, error)
+
+    def release_quarantined(self):
+        """Make every quarantined file eligible again; returns their source paths."""
+        with self.lock, self.connection:
+            rows = self.connection.execute("SELECT source_path FROM jobs WHERE state = ?", (QUARANTINED,)).fetchall()
+            self.connection.execute("UPDATE jobs SET state = ?, updated_at = ? WHERE state = ?", (FAILED, time.time(), QUARANTINED))
+            self.quarantined.clear()
+        return [row[0] for row in rows]
+
+    def get_probe(self, source_file):
+        """Cached probe info for this exact file version, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT info FROM probes WHERE source_path = ? AND size = ? AND mtime_ns = ?", tuple(source_file)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_probe(self, source_file, info):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO probes (source_path, size, mtime_ns, info) VALUES (?, ?, ?, ?)",
+                tuple(source_file) + (json.dumps(info),)
+            )
+
+    def get_speed(self, resolution, encoder):
+        """Average encode fps measured for this resolution and encoder, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fps FROM speeds WHERE resolution = ? AND encoder = ?", (resolution, encoder)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_speed(self, resolution, encoder, fps):
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT fps, samples FROM speeds WHERE resolution = ? AND encoder = ?", (resolution, encoder)
+            ).fetchone()
+            if row:
+                samples = min(row[1], SPEED_SAMPLES - 1)
+                fps = (row[0] * samples + fps) / (samples + 1)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO speeds (resolution, encoder, fps, samples) VALUES (?, ?, ?, ?)",
+                (resolution, encoder, fps, (row[1] if row else 0) + 1)
+            )
+
+    def recover_interrupted(self, scratch_dir=None):
+        """Requeue jobs left running by a process that no longer exists and delete their partial outputs.
+
+        Partial outputs are looked for next to the output file and in scratch_dir. Returns the source
+        paths that were requeued.
+        """
+        host = socket.gethostname()
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT source_path, size, mtime_ns, output_path, owner FROM jobs WHERE state = ?", (RUNNING,)
+            ).fetchall()
+        recovered = []
+        for source_path, size, mtime_ns, output_path, owner in rows:
+            owner_host, _, owner_pid = (owner or "").rpartition(":")
+            if owner_host == host and owner_pid.isdigit() and pid_alive(int(owner_pid)):
+                continue  # Another OBSRecode on this machine is still working on it
+            if owner_host and owner_host != host:
+                continue  # Owned by another machine sharing this journal; leave it alone
+            if output_path:
+                partial_files = [partial_output_path(output_path)]
+                if scratch_dir:
+                    partial_files.append(os.path.join(scratch_dir, os.path.basename(partial_files[0])))
+                # Segmented encodes also leave numbered segment files next to it
+                leftovers = partial_files + [f for p in partial_files for f in glob.glob(glob.escape(p) + ".*")]
+                try:
+                    for leftover in leftovers:
+                        if os.path.exists(leftover):
+                            os.remove(leftover)
+                except OSError:
+                    continue  # Still locked, retry on the next run
+            self.mark((source_path, size, mtime_ns), QUEUED, output_path, "interrupted")
+            recovered.append(source_path)
+        return recovered
@@ -0,0 +1,33 @@
+"""Log file output that never blocks the caller.
+
+Records are put on a queue by a QueueHandler and written by a QueueListener
+thread into a rotating file, so encode workers and the Tk loop never wait on
+the disk.
+"""
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+class AsyncFileLog:
+    """Rotating log file fed through a queue; add .handler to a logger to use it."""
+
+    def __init__(self, path, max_mb=10, backup_count=5, rotate_daily=False):
+        if rotate_daily:
+            self.file_handler = TimedRotatingFileHandler(path, when="midnight", backupCount=backup_count, encoding="utf-8")
+        else:
+            self.file_handler = RotatingFileHandler(path, maxBytes=int(max_mb * 1024 * 1024), backupCount=backup_count, encoding="utf-8")
+        self.file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.handler = QueueHandler(queue.SimpleQueue())
+        self.listener = QueueListener(self.handler.queue, self.file_handler)
+        self.listener.start()
+
+    @classmethod
+    def from_settings(cls, path, settings):
+        return cls(path, settings.get("log_max_mb", 10), settings.get("log_backup_count", 5), settings.get("log_rotate_daily", False))
+
+    def close(self):
+        """Write out everything still queued and close the file."""
+        self.listener.stop()
+        self.file_handler.close()
@@ -0,0 +1,214 @@
+"""Structured per-job metrics written next to the encoded files.
+
+Every finished job appends one record to OBSRecode_jobs.jsonl (or .csv) in
+output_dir and every batch appends a summary to OBSRecode_batches.jsonl, so
+compression and encoder speed can be compared across runs. Optionally the
+running totals are also written as a Prometheus text file for the node
+exporter's textfile collector.
+"""
+import os
+import csv
+import json
+import time
+import threading
+
+METRICS_FORMATS = ["jsonl", "csv"]
+JOBS_FILE = "OBSRecode_jobs"
+BATCHES_FILE = "OBSRecode_batches"
+
+JOB_FIELDS = [
+    "batch_id", "worker", "input_file", "output_file", "profile", "encoder", "status", "detail", "exit_code",
+    "queued_at", "started_at", "finished_at", "queue_wait_s", "wall_s", "avg_fps", "segments",
+    "input_bytes", "output_bytes", "compression_ratio", "original_deleted"
+]
+BATCH_FIELDS = [
+    "batch_id", "started_at", "finished_at", "wall_s", "files", "encoded", "skipped", "failed", "cancelled", "retried",
+    "input_bytes", "output_bytes", "bytes_saved", "compression_ratio", "encode_s", "queue_wait_s"
+]
+JOB_STATUSES = ["encoded", "skipped", "failed", "cancelled", "retried"]  # retried: this attempt failed, the file was requeued
+
+def iso_time(timestamp):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp)) if timestamp else None
+
+def compression_ratio(input_bytes, output_bytes):
+    """Source size divided by output size, e.g. 4.0 for an output a quarter of the original."""
+    return round(input_bytes / output_bytes, 3) if input_bytes and output_bytes else None
+
+def append_record(path, fields, record, file_format):
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        if file_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=fields)
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerow(record)
+        else:
+            f.write(json.dumps(record) + "\n")
+
+def job_record(input_file, profile=None, queued_at=None):
+    """A job record for the engine to fill in while the job runs; finish_job_record completes it."""
+    now = time.time()
+    return {
+        "batch_id": None,
+        "worker": None,  # Set by a cluster coordinator for jobs encoded on a worker
+        "input_file": input_file,
+        "output_file": None,
+        "profile": profile["name"] if profile else None,
+        "encoder": profile["encoder"] if profile else None,
+        "status": "failed",
+        "detail": None,
+        "exit_code": None,
+        "queued_at": queued_at or now,
+        "started_at": now,
+        "finished_at": None,
+        "queue_wait_s": None,
+        "wall_s": None,
+        "avg_fps": None,
+        "segments": 0,
+        "input_bytes": None,
+        "output_bytes": None,
+        "compression_ratio": None,
+        "original_deleted": False
+    }
+
+def finish_job_record(job):
+    """Fill in the timings and ratio of a finished job_record."""
+    job["finished_at"] = time.time()
+    job["queue_wait_s"] = round(max(job["started_at"] - job["queued_at"], 0), 3)
+    job["wall_s"] = round(job["finished_at"] - job["started_at"], 3)
+    job["compression_ratio"] = compression_ratio(job["input_bytes"], job["output_bytes"])
+    if job["avg_fps"]:
+        job["avg_fps"] = round(job["avg_fps"], 2)
+    for key in ("queued_at", "started_at", "finished_at"):
+        job[key] = iso_time(job[key])
+
+class BatchTotals:
+    """Counters summed over finished jobs."""
+
+    def __init__(self):
+        self.jobs = dict.fromkeys(JOB_STATUSES, 0)
+        self.input_bytes = 0  # Encoded jobs only, so the saving compares like with like
+        self.output_bytes = 0
+        self.encode_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+
+    def add(self, job):
+        self.jobs[job["status"]] = self.jobs.get(job["status"], 0) + 1
+        self.queue_wait_seconds += job["queue_wait_s"] or 0
+        if job["status"] == "encoded":
+            self.input_bytes += job["input_bytes"] or 0
+            self.output_bytes += job["output_bytes"] or 0
+            self.encode_seconds += job["wall_s"] or 0
+
+    @property
+    def bytes_saved(self):
+        return self.input_bytes - self.output_bytes
+
+class JobMetrics:
+    """Collects job records for the engine and writes them out; safe to call from any worker thread."""
+
+    def __init__(self, output_dir, file_format="jsonl", prometheus_file=None, write_files=True):
+        if file_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format: {file_format}")
+        self.file_format = file_format
+        self.jobs_path = os.path.join(output_dir, f"{JOBS_FILE}.{file_format}")
+        self.batches_path = os.path.join(output_dir, f"{BATCHES_FILE}.{file_format}")
+        self.prometheus_file = prometheus_file
+        self.write_files = write_files  # False writes only the Prometheus file
+        self.lock = threading.Lock()
+        self.totals = BatchTotals()  # Since this process started, for Prometheus counters
+        self.batch = BatchTotals()
+        self.batch_id = None
+        self.batch_started = None
+        self.last_batch = None
+        self.last_fps = {}  # Encoder -> average fps of its last encode
+
+    @classmethod
+    def from_settings(cls, settings):
+        """JobMetrics for settings, or None when neither metrics file is wanted."""
+        prometheus_file = settings.get("prometheus_file") or None
+        if not settings.get("write_metrics") and not prometheus_file:
+            return None
+        return cls(settings["output_dir"], settings.get("metrics_format", "jsonl"), prometheus_file,
+                   bool(settings.get("write_metrics")))
+
+    def start_batch(self):
+        with self.lock:
+            self.batch = BatchTotals()
+            self.batch_started = time.time()
+            self.batch_id = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.batch_started))
+
+    def add_job(self, job):
+        """Write out a job record completed by finish_job_record."""
+        job["batch_id"] = self.batch_id
+        with self.lock:
+            self.batch.add(job)
+            self.totals.add(job)
+            if job["status"] == "encoded" and job["avg_fps"] and job["encoder"]:
+                self.last_fps[job["encoder"]] = job["avg_fps"]
+            if self.write_files:
+                append_record(self.jobs_path, JOB_FIELDS, job, self.file_format)
+            self.write_prometheus()
+
+    def finish_batch(self):
+        """Record the batch summary and return it."""
+        finished = time.time()
+        with self.lock:
+            batch = self.batch
+            summary = {
+                "batch_id": self.batch_id,
+                "started_at": iso_time(self.batch_started),
+                "finished_at": iso_time(finished),
+                "wall_s": round(finished - (self.batch_started or finished), 3),
+                "files": sum(count for status, count in batch.jobs.items() if status != "retried"),
+                **batch.jobs,
+                "input_bytes": batch.input_bytes,
+                "output_bytes": batch.output_bytes,
+                "bytes_saved": batch.bytes_saved,
+                "compression_ratio": compression_ratio(batch.input_bytes, batch.output_bytes),
+                "encode_s": round(batch.encode_seconds, 3),
+                "queue_wait_s": round(batch.queue_wait_seconds, 3)
+            }
+            self.last_batch = dict(summary, finished_ts=finished)
+            if self.write_files:
+                append_record(self.batches_path, BATCH_FIELDS, summary, self.file_format)
+            self.write_prometheus()
+        return summary
+
+    def write_prometheus(self):
+        """Rewrite the Prometheus text file; caller holds the lock."""
+        if not self.prometheus_file:
+            return
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP obsrecode_{name} {help_text}")
+            lines.append(f"# TYPE obsrecode_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"obsrecode_{name}{labels} {value}")
+
+        totals = self.totals
+        metric("jobs_total", "counter", "Jobs finished since OBSRecode started, by status.",
+               [(f'{{status="{status}"}}', count) for status, count in totals.jobs.items()])
+        metric("input_bytes_total", "counter", "Source bytes of encoded files.", [("", totals.input_bytes)])
+        metric("output_bytes_total", "counter", "Output bytes of encoded files.", [("", totals.output_bytes)])
+        metric("saved_bytes_total", "counter", "Source minus output bytes of encoded files.", [("", totals.bytes_saved)])
+        metric("encode_seconds_total", "counter", "Wall time spent on encoded files.", [("", round(totals.encode_seconds, 3))])
+        metric("queue_wait_seconds_total", "counter", "Time jobs waited between being queued and starting.",
+               [("", round(totals.queue_wait_seconds, 3))])
+        if self.last_fps:
+            metric("last_encode_fps", "gauge", "Average fps of the last encode, by encoder.",
+                   [(f'{{encoder="{encoder}"}}', fps) for encoder, fps in sorted(self.last_fps.items())])
+        if self.last_batch:
+            batch = self.last_batch
+            metric("last_batch_end_timestamp_seconds", "gauge", "When the last batch finished.", [("", round(batch["finished_ts"], 3))])
+            metric("last_batch_duration_seconds", "gauge", "Wall time of the last batch.", [("", batch["wall_s"])])
+            metric("last_batch_saved_bytes", "gauge", "Bytes saved by the last batch.", [("", batch["bytes_saved"])])
+
+        # Written aside and renamed so the collector never reads half a file
+        temp_file = self.prometheus_file + ".tmp"
+        try:
+            with open(temp_file, "w", encoding="utf-8", newline="\n") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(temp_file, self.prometheus_file)
+        except OSError:
+            pass  # A missing textfile directory must not fail the encode
@@ -0,0 +1,158 @@
+"""Scheduling priority of spawned encoders: nice level, CPU affinity and I/O class.
+
+Encoder profiles may set "nice" (-20 to 19, higher yields more), "cpu_affinity"
+(CPU numbers such as "0-5,8" or a hex mask such as "0x3f") and "io_class"
+("best_effort" or "idle"). On Linux they are applied to every thread of the
+encoder with setpriority, sched_setaffinity and ioprio_set. On Windows the
+nice level picks a priority class, the CPUs become the affinity mask and the
+idle I/O class sets very low I/O priority.
+
+With throttle_encoders on, every encoder runs at THROTTLED instead, which
+keeps a batch from taking CPU and disk time away from OBS or a game.
+"""
+import os
+import sys
+import ctypes
+import ctypes.util
+import platform
+
+IO_CLASSES = ["best_effort", "idle"]
+THROTTLED = {"nice": 19, "io_class": "idle"}
+
+# ioprio_set(2)
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_CLASSES = {"best_effort": 2, "idle": 3}
+IOPRIO_BEST_EFFORT_LEVEL = 4  # The kernel's default level
+IOPRIO_SET_SYSCALLS = {"x86_64": 251, "aarch64": 30, "riscv64": 30, "i386": 289, "i686": 289, "armv7l": 314}
+
+# Windows priority classes, from the lowest nice level each one covers
+WINDOWS_PRIORITY_CLASSES = [
+    (15, 0x00000040),  # IDLE_PRIORITY_CLASS
+    (5, 0x00004000),  # BELOW_NORMAL_PRIORITY_CLASS
+    (-4, 0x00000020),  # NORMAL_PRIORITY_CLASS
+    (-9, 0x00008000),  # ABOVE_NORMAL_PRIORITY_CLASS
+    (-20, 0x00000080)  # HIGH_PRIORITY_CLASS
+]
+PROCESS_SET_INFORMATION = 0x0200
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+PROCESS_IO_PRIORITY = 33  # NtSetInformationProcess information class
+WINDOWS_IO_PRIORITY = {"idle": 0, "best_effort": 2}  # Very low, normal
+
+def parse_cpu_list(value):
+    """Return the set of CPU numbers in value ("0-3,6", "0xf" or a list), or None for all CPUs; raises ValueError."""
+    if value is None or value == "" or value == []:
+        return None
+    if isinstance(value, (list, tuple)):
+        cpus = {int(cpu) for cpu in value}
+    elif str(value).lower().startswith("0x"):
+        mask = int(str(value), 16)
+        cpus = {bit for bit in range(mask.bit_length()) if mask >> bit & 1}
+    else:
+        cpus = set()
+        for item in str(value).split(","):
+            first, _, last = item.strip().partition("-")
+            cpus.update(range(int(first), int(last or first) + 1))
+    if not cpus or min(cpus) < 0:
+        raise ValueError(f"Invalid CPU list: {value}")
+    return cpus
+
+def check_priority_settings(profile):
+    """Raise ValueError if the profile's priority keys are invalid."""
+    if profile.get("nice") is not None and not -20 <= int(profile["nice"]) <= 19:
+        raise ValueError(f"nice must be between -20 and 19, not {profile['nice']}")
+    if profile.get("io_class") not in [None] + IO_CLASSES:
+        raise ValueError(f"io_class must be one of {', '.join(IO_CLASSES)}")
+    parse_cpu_list(profile.get("cpu_affinity"))
+
+def encoder_priority(profile, throttled=False):
+    """Nice level, CPU set and I/O class an encoder of profile should run with; None leaves a value alone."""
+    priority = {
+        "nice": int(profile["nice"]) if profile.get("nice") is not None else None,
+        "cpus": parse_cpu_list(profile.get("cpu_affinity")),
+        "io_class": profile.get("io_class")
+    }
+    if throttled:
+        priority.update(THROTTLED)
+    return priority
+
+def inherited_priority():
+    """What encoders get without any priority setting, used to undo a setting on a running encoder."""
+    priority = {"nice": 0, "cpus": None, "io_class": "best_effort"}
+    if hasattr(os, "getpriority"):
+        priority["nice"] = os.getpriority(os.PRIO_PROCESS, 0)
+    if hasattr(os, "sched_getaffinity"):
+        priority["cpus"] = os.sched_getaffinity(0)
+    return priority
+
+def apply_priority(pid, priority):
+    """Apply priority to process pid; returns a list of error messages for what could not be set."""
+    if sys.platform == "win32":
+        return apply_windows_priority(pid, priority)
+    errors = []
+    # Linux keeps these per thread, so every thread HandBrake has started so far is changed
+    try:
+        threads = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        threads = [pid]
+    for tid in threads:
+        for name, setter in (("nice", set_nice), ("cpus", set_affinity), ("io_class", set_io_class)):
+            if priority.get(name) is None:
+                continue
+            try:
+                setter(tid, priority[name])
+            except (OSError, ValueError) as e:
+                if getattr(e, "errno", None) == 3:
+                    break  # ESRCH: the thread has exited
+                errors.append(f"{name}: {e}")
+    return sorted(set(errors))
+
+def set_nice(tid, nice):
+    os.setpriority(os.PRIO_PROCESS, tid, nice)
+
+def set_affinity(tid, cpus):
+    if not hasattr(os, "sched_setaffinity"):
+        raise OSError("CPU affinity is not supported on this system")
+    os.sched_setaffinity(tid, cpus)
+
+def set_io_class(tid, io_class):
+    number = IOPRIO_SET_SYSCALLS.get(platform.machine())
+    if not sys.platform.startswith("linux") or number is None:
+        raise OSError("I/O class is not supported on this system")
+    ioprio = IOPRIO_CLASSES[io_class] << IOPRIO_CLASS_SHIFT
+    if io_class == "best_effort":
+        ioprio |= IOPRIO_BEST_EFFORT_LEVEL
+    libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, tid, ioprio) < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def windows_priority_class(nice):
+    for lowest_nice, priority_class in WINDOWS_PRIORITY_CLASSES:
+        if nice >= lowest_nice:
+            return priority_class
+    return WINDOWS_PRIORITY_CLASSES[-1][1]
+
+def apply_windows_priority(pid, priority):
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(PROCESS_SET_INFORMATION | PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return [f"cannot open process {pid}"]
+    errors = []
+    try:
+        if priority.get("nice") is not None and not kernel32.SetPriorityClass(handle, windows_priority_class(priority["nice"])):
+            errors.append("nice: SetPriorityClass failed")
+        if priority.get("cpus") is not None:
+            mask = sum(1 << cpu for cpu in priority["cpus"])
+            if not kernel32.SetProcessAffinityMask(handle, ctypes.c_size_t(mask)):
+                errors.append("cpus: SetProcessAffinityMask failed")
+        if priority.get("io_class") is not None:
+            # Undocumented but stable since Vista; Task Manager's "Low" I/O priority
+            io_priority = ctypes.c_ulong(WINDOWS_IO_PRIORITY[priority["io_class"]])
+            status = ctypes.windll.ntdll.NtSetInformationProcess(
+                handle, PROCESS_IO_PRIORITY, ctypes.byref(io_priority), ctypes.sizeof(io_priority))
+            if status != 0:
+                errors.append(f"io_class: NtSetInformationProcess returned {status:#x}")
+    finally:
+        kernel32.CloseHandle(handle)
+    return errors
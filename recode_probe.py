@@ -0,0 +1,77 @@
+"""Source probing with HandBrakeCLI --scan and the encode/skip decision built on it."""
+import os
+import json
+import subprocess
+
+PROBE_TIMEOUT = 120  # Seconds before a hanging scan is abandoned
+
+def parse_scan_output(text, file_size):
+    """Return width/height/fps/codec/duration (s)/bitrate (kbps) from `--scan --json` output, or None."""
+    marker = text.find("JSON Title Set:")
+    if marker < 0:
+        return None
+    start = text.find("{", marker)
+    try:
+        title_set, _ = json.JSONDecoder().raw_decode(text[start:])
+        title = title_set["TitleList"][0]
+    except (ValueError, KeyError, IndexError):
+        return None
+
+    duration = title.get("Duration", {})
+    seconds = duration.get("Hours", 0) * 3600 + duration.get("Minutes", 0) * 60 + duration.get("Seconds", 0)
+    frame_rate = title.get("FrameRate", {})
+    geometry = title.get("Geometry", {})
+    info = {
+        "width": geometry.get("Width"),
+        "height": geometry.get("Height"),
+        "fps": round(frame_rate["Num"] / frame_rate["Den"], 3) if frame_rate.get("Den") else None,
+        "codec": (title.get("VideoCodec") or "").lower() or None,
+        "duration": seconds or None,
+        # Overall bitrate (video + audio) is what matters for "would it shrink?"
+        "bitrate": round(file_size * 8 / seconds / 1000) if seconds else None
+    }
+    return info
+
+def probe_source(cli_path, input_file):
+    """Scan input_file with HandBrakeCLI; returns the parse_scan_output dict or None if it failed."""
+    command = [cli_path, "--scan", "--json", "-t", "1", "-i", input_file]
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=PROBE_TIMEOUT,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)  # Windows only
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return parse_scan_output(result.stdout.decode("utf-8", "replace"), os.path.getsize(input_file))
+
+def describe_probe(info):
+    parts = []
+    if info.get("width") and info.get("height"):
+        parts.append(f"{info['width']}x{info['height']}")
+    if info.get("fps"):
+        parts.append(f"{info['fps']:g} fps")
+    if info.get("codec"):
+        parts.append(info["codec"])
+    if info.get("bitrate") is not None:
+        parts.append(f"{info['bitrate']} kbps")
+    return " ".join(parts)
+
+def plan_encode(settings, info, target):
+    """Return ("encode" or "skip", reason) for a probed source (info may be None).
+
+    target is the video plus audio kbps the encode would produce.
+    """
+    if info is None:
+        return "encode", "source could not be probed"
+    description = describe_probe(info)
+    if not settings.get("skip_efficient", True):
+        return "encode", description
+    codec = info.get("codec")
+    if codec and codec in [c.lower() for c in settings.get("skip_codecs", [])]:
+        return "skip", f"already {codec} ({description})"
+    if info.get("bitrate") is not None and info["bitrate"] <= target * float(settings.get("skip_bitrate_ratio", 1.2)):
+        return "skip", f"{info['bitrate']} kbps source would not shrink at {target} kbps"
+    return "encode", description
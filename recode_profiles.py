@@ -0,0 +1,98 @@
+"""Named encoder profiles and the HandBrakeCLI command builder.
+
+Profiles live in settings["encoder_profiles"]. Each one names a HandBrake
+video encoder plus its own bitrate/preset/audio arguments and the number of
+encode slots it may use at the same time, so one host can, say, run two GPU
+jobs and one CPU job side by side. Profiles can also pin their encoders to
+some CPUs and lower their CPU and disk priority (see recode_priority).
+"""
+
+# Keys a profile may set; anything it leaves out falls back to these
+PROFILE_DEFAULTS = {
+    "encoder": "nvenc_av1",
+    "encoder_preset": None,  # HandBrake --encoder-preset, None keeps the encoder's default
+    "video_bitrate": None,  # kbps, None uses the global "bitrate" setting
+    "audio_encoder": "opus",
+    "audio_bitrate": 160,
+    "mixdown": "stereo",
+    "container": "mkv",
+    "extra_args": [],  # Appended to the command as-is
+    "handbrake_cli_path": None,  # None uses the global HandBrakeCLI
+    "nice": None,  # -20 to 19 (Windows: priority class), None inherits OBSRecode's
+    "cpu_affinity": None,  # CPUs the encoder may run on, e.g. "0-7" or "0xff"; None allows all
+    "io_class": None,  # "best_effort" or "idle"; None inherits OBSRecode's
+    "slots": 0  # Concurrent encodes for this profile, 0 disables it
+}
+
+DEFAULT_ENCODER_PROFILES = {
+    "nvenc_av1": {"encoder": "nvenc_av1", "slots": 2},
+    "svt_av1": {"encoder": "svt_av1", "encoder_preset": "8", "slots": 0},
+    "x265": {"encoder": "x265", "encoder_preset": "medium", "slots": 0}
+}
+
+def resolve_profile(settings, name):
+    """Return the named profile with every key filled in."""
+    profile = dict(PROFILE_DEFAULTS)
+    profile.update(settings["encoder_profiles"][name])
+    profile["name"] = name
+    return profile
+
+def enabled_profiles(settings):
+    """Profiles with at least one slot, in settings order (earlier profiles are preferred)."""
+    profiles = [resolve_profile(settings, name) for name in settings["encoder_profiles"]]
+    return [profile for profile in profiles if int(profile["slots"]) > 0]
+
+def primary_profile(settings):
+    profiles = enabled_profiles(settings)
+    return profiles[0] if profiles else resolve_profile(settings, next(iter(settings["encoder_profiles"])))
+
+def target_bitrate(settings, profile):
+    """Video plus audio kbps an encode with this profile aims for."""
+    return int(profile["video_bitrate"] or settings["bitrate"]) + int(profile["audio_bitrate"])
+
+def parse_slot_overrides(text):
+    """Parse "nvenc_av1=2, svt_av1=1" into {"nvenc_av1": 2, "svt_av1": 1}; raises ValueError."""
+    slots = {}
+    for item in text.replace(";", ",").split(","):
+        if not item.strip():
+            continue
+        name, _, count = item.partition("=")
+        if not name.strip() or int(count) < 0:
+            raise ValueError(f"Invalid profile slots: {item.strip()}")
+        slots[name.strip()] = int(count)
+    return slots
+
+def format_slots(settings):
+    return ", ".join(f"{name}={profile.get('slots', 0)}" for name, profile in settings["encoder_profiles"].items())
+
+def apply_slot_overrides(settings, slots):
+    """Set the slot counts of existing profiles; raises ValueError for unknown names."""
+    for name, count in slots.items():
+        if name not in settings["encoder_profiles"]:
+            raise ValueError(f"Unknown encoder profile: {name}")
+    profiles = {name: dict(profile) for name, profile in settings["encoder_profiles"].items()}
+    for name, count in slots.items():
+        profiles[name]["slots"] = count
+    settings["encoder_profiles"] = profiles
+
+def build_encode_command(settings, profile, input_file, output_file):
+    command = [
+        profile["handbrake_cli_path"] or settings["handbrake_cli_path"],
+        "-v",
+        "-i", input_file,
+        "-o", output_file,
+        "-e", profile["encoder"]
+    ]
+    if profile["encoder_preset"]:
+        command += ["--encoder-preset", str(profile["encoder_preset"])]
+    command += [
+        "-b", str(profile["video_bitrate"] or settings["bitrate"]),
+        # Peak-limited: lower frame rate sources are kept as they are instead of being frame-doubled
+        "--rate", str(settings["max_frame_rate"]), "--pfr",
+        "-f", profile["container"],
+        "-m",
+        "-E", profile["audio_encoder"],
+        "-B", str(profile["audio_bitrate"]),
+        "--mixdown", profile["mixdown"]
+    ]
+    return command + [str(arg) for arg in profile["extra_args"]]
@@ -0,0 +1,210 @@
+"""Resource sampler for OBSRecode and the HandBrakeCLI processes it runs.
+
+At a fixed interval a thread reads CPU time, resident memory, bytes read and
+written and the thread count of every process, from /proc on Linux and the
+process API on Windows. Each sample is handed to a callback for the live
+readout and can be appended to a CSV time series, one file per batch.
+
+CPU is in percent of one core, as in top, so four busy encoder threads show
+about 400%. Read and write bytes count everything passed through read and
+write calls, including reads served from the page cache or a network share,
+which is what tells a slow source share apart from a slow encoder.
+"""
+import os
+import sys
+import csv
+import time
+import ctypes
+import threading
+from collections import namedtuple
+
+RESOURCES_FILE = "OBSRecode_resources"
+APP_LABEL = "OBSRecode"
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+SAMPLE_FIELDS = [
+    "time", "process", "pid", "cpu_percent", "rss_bytes", "read_bytes", "write_bytes", "read_rate", "write_rate", "threads"
+]
+
+# Totals since the process started, as read from the system
+ProcessCounters = namedtuple("ProcessCounters", ["cpu_seconds", "rss_bytes", "read_bytes", "write_bytes", "threads"])
+# One process at one sample; cpu_percent and the rates (bytes per second) are None for its first sample
+ResourceSample = namedtuple("ResourceSample", [
+    "process", "pid", "cpu_percent", "rss_bytes", "read_bytes", "write_bytes", "read_rate", "write_rate", "threads"
+])
+
+def sampling_supported():
+    return sys.platform == "win32" or os.path.isdir("/proc/self")
+
+def read_processes(pids):
+    """Return {pid: ProcessCounters} for the pids that could be read; exited processes are left out."""
+    if sys.platform == "win32":
+        return read_windows_processes(pids)
+    counters = {}
+    for pid in pids:
+        try:
+            counters[pid] = read_proc(pid)
+        except (OSError, ValueError, IndexError):
+            pass  # Exited since it was listed
+    return counters
+
+def read_proc(pid):
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        stat = f.read()
+    # The command name may contain spaces and parentheses; the fields after it may not
+    fields = stat[stat.rindex(b")") + 2:].split()
+    io = {}
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                name, _, value = line.partition(b":")
+                io[name] = int(value)
+    except OSError:
+        pass  # Hidden by hardened kernels; CPU and memory still count
+    return ProcessCounters(
+        cpu_seconds=(int(fields[11]) + int(fields[12])) / CLOCK_TICKS,  # utime + stime
+        rss_bytes=int(fields[21]) * PAGE_SIZE,
+        read_bytes=io.get(b"rchar"),
+        write_bytes=io.get(b"wchar"),
+        threads=int(fields[17])
+    )
+
+# Windows process API
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+TH32CS_SNAPPROCESS = 0x00000002
+INVALID_HANDLE_VALUE = ctypes.c_void_p(-1).value
+
+class IO_COUNTERS(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_ulonglong) for name in (
+        "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+        "ReadTransferCount", "WriteTransferCount", "OtherTransferCount"
+    )]
+
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [(name, ctypes.c_size_t) for name in (
+        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+        "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage"
+    )]
+
+class PROCESSENTRY32W(ctypes.Structure):
+    _fields_ = [
+        ("dwSize", ctypes.c_ulong), ("cntUsage", ctypes.c_ulong), ("th32ProcessID", ctypes.c_ulong),
+        ("th32DefaultHeapID", ctypes.c_size_t), ("th32ModuleID", ctypes.c_ulong), ("cntThreads", ctypes.c_ulong),
+        ("th32ParentProcessID", ctypes.c_ulong), ("pcPriClassBase", ctypes.c_long), ("dwFlags", ctypes.c_ulong),
+        ("szExeFile", ctypes.c_wchar * 260)
+    ]
+
+def windows_thread_counts(kernel32):
+    """{pid: thread count} of every process, from one Toolhelp snapshot."""
+    kernel32.CreateToolhelp32Snapshot.restype = ctypes.c_void_p
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    if snapshot in (None, INVALID_HANDLE_VALUE):
+        return {}
+    counts = {}
+    try:
+        entry = PROCESSENTRY32W(dwSize=ctypes.sizeof(PROCESSENTRY32W))
+        found = kernel32.Process32FirstW(ctypes.c_void_p(snapshot), ctypes.byref(entry))
+        while found:
+            counts[entry.th32ProcessID] = entry.cntThreads
+            found = kernel32.Process32NextW(ctypes.c_void_p(snapshot), ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(ctypes.c_void_p(snapshot))
+    return counts
+
+def read_windows_processes(pids):
+    kernel32 = ctypes.windll.kernel32
+    threads = windows_thread_counts(kernel32)
+    counters = {}
+    for pid in pids:
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            continue
+        try:
+            created, exited, kernel, user = (ctypes.c_ulonglong() for _ in range(4))  # FILETIMEs, 100 ns units
+            memory = PROCESS_MEMORY_COUNTERS(cb=ctypes.sizeof(PROCESS_MEMORY_COUNTERS))
+            io = IO_COUNTERS()
+            if not kernel32.GetProcessTimes(handle, ctypes.byref(created), ctypes.byref(exited), ctypes.byref(kernel), ctypes.byref(user)):
+                continue
+            kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb)
+            kernel32.GetProcessIoCounters(handle, ctypes.byref(io))
+            counters[pid] = ProcessCounters(
+                cpu_seconds=(kernel.value + user.value) / 1e7,
+                rss_bytes=memory.WorkingSetSize,
+                read_bytes=io.ReadTransferCount,
+                write_bytes=io.WriteTransferCount,
+                threads=threads.get(pid)
+            )
+        finally:
+            kernel32.CloseHandle(handle)
+    return counters
+
+class ResourceSampler:
+    """Thread sampling OBSRecode and the processes get_pids() returns ({pid: label}) every interval seconds."""
+
+    def __init__(self, interval, get_pids, path=None, on_sample=None):
+        self.interval = interval
+        self.get_pids = get_pids
+        self.path = path
+        self.on_sample = on_sample  # Called on the sampler thread with the list of ResourceSamples
+        self.previous = {}  # pid -> (time.monotonic(), ProcessCounters) of the last sample
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.file = None
+        self.writer = None
+        if path:
+            # Opened here so the caller can report a bad output directory before the batch starts
+            self.file = open(path, "a", encoding="utf-8", newline="")
+            self.writer = csv.writer(self.file)
+            if self.file.tell() == 0:
+                self.writer.writerow(SAMPLE_FIELDS)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="resource-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and close the time series file."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def run(self):
+        wait = 0  # The first sample is only a baseline for CPU and rates
+        while not self.stop_event.wait(wait):
+            try:
+                self.sample()
+            except OSError:
+                self.writer = None  # Time series file lost (e.g. the share went away); keep the live readout
+            wait = self.interval
+
+    def sample(self):
+        """Take one sample of every process and return it as a list of ResourceSamples."""
+        targets = {os.getpid(): APP_LABEL, **self.get_pids()}
+        now = time.monotonic()
+        counters = read_processes(targets)
+        samples = []
+        for pid, label in targets.items():
+            current = counters.get(pid)
+            if current is None:
+                continue
+            cpu_percent = read_rate = write_rate = None
+            if pid in self.previous:
+                then, last = self.previous[pid]
+                elapsed = max(now - then, 1e-6)
+                cpu_percent = round(max(current.cpu_seconds - last.cpu_seconds, 0) / elapsed * 100, 1)
+                if current.read_bytes is not None and last.read_bytes is not None:
+                    read_rate = round(max(current.read_bytes - last.read_bytes, 0) / elapsed)
+                    write_rate = round(max(current.write_bytes - last.write_bytes, 0) / elapsed)
+            samples.append(ResourceSample(label, pid, cpu_percent, current.rss_bytes, current.read_bytes,
+                                          current.write_bytes, read_rate, write_rate, current.threads))
+        self.previous = {pid: (now, current) for pid, current in counters.items()}
+        if self.writer:
+            stamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+            self.writer.writerows([stamp, *sample] for sample in samples)
+            self.file.flush()  # A crashed batch still leaves its samples
+        if self.on_sample:
+            self.on_sample(samples)
+        return samples
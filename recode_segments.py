@@ -0,0 +1,123 @@
+"""Segment-parallel encoding of long recordings.
+
+A recording longer than segment_min_duration is cut into time ranges with
+HandBrakeCLI --start-at/--stop-at, the ranges are encoded on every free
+slot of the same encoder profile, and the pieces are joined without
+re-encoding by mkvmerge or ffmpeg.
+"""
+import os
+import math
+import shutil
+import threading
+from collections import deque
+
+JOIN_TIMEOUT = 3600  # Seconds; joining only copies streams
+
+def find_joiner(settings):
+    """Path of the tool used to join segments (settings, then mkvmerge or ffmpeg on PATH), or None."""
+    configured = settings.get("segment_joiner_path")
+    if configured:
+        return configured if os.path.exists(configured) else None
+    return shutil.which("mkvmerge") or shutil.which("ffmpeg")
+
+def split_duration(duration, segment_length):
+    """Return (start, length) pairs covering duration; the last length is None (encode to the end)."""
+    count = max(1, math.ceil(duration / segment_length))
+    length = math.ceil(duration / count)
+    return [(i * length, length if i < count - 1 else None) for i in range(count)]
+
+def segment_file_paths(partial_file, count):
+    return [f"{partial_file}.{index + 1:03d}" for index in range(count)]
+
+def segment_args(start, length):
+    # --stop-at counts from --start-at, not from the start of the file
+    args = ["--start-at", f"seconds:{start}"]
+    if length is not None:
+        args += ["--stop-at", f"seconds:{length}"]
+    return args
+
+def join_command(joiner, segment_files, output_file, list_file):
+    """Command that concatenates segment_files into output_file without re-encoding.
+
+    ffmpeg reads the segment names from list_file, which the caller writes
+    with write_concat_list; mkvmerge takes them on the command line.
+    """
+    if "mkvmerge" in os.path.basename(joiner).lower():
+        command = [joiner, "--quiet", "-o", output_file, segment_files[0]]
+        for segment_file in segment_files[1:]:
+            command += ["+", segment_file]
+        return command
+    return [joiner, "-hide_banner", "-loglevel", "error", "-y", "-f", "concat", "-safe", "0",
+            "-i", list_file, "-map", "0", "-c", "copy", "-f", "matroska", output_file]
+
+def write_concat_list(list_file, segment_files):
+    with open(list_file, "w", encoding="utf-8") as f:
+        for segment_file in segment_files:
+            escaped = os.path.abspath(segment_file).replace("\\", "/").replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+def join_succeeded(joiner, returncode):
+    # mkvmerge exits with 1 when it only printed warnings
+    if "mkvmerge" in os.path.basename(joiner).lower():
+        return returncode in (0, 1)
+    return returncode == 0
+
+class SegmentedEncode:
+    """Shared state of one recording encoded as segments by several slots."""
+
+    def __init__(self, input_file, profile, partial_file, segments, duration):
+        self.input_file = input_file
+        self.read_file = input_file  # What HandBrake reads, a staged copy of input_file if there is one
+        self.profile = profile
+        self.segments = segments
+        self.duration = duration
+        self.weights = [length if length is not None else max(duration - start, 1) for start, length in segments]
+        self.segment_files = segment_file_paths(partial_file, len(segments))
+        self.condition = threading.Condition()
+        self.pending = deque(range(len(segments)))
+        self.active = 0
+        self.completed = 0
+        self.returncode = 0  # First non-zero segment exit code
+        self.output_tail = []
+        self.percents = [0.0] * len(segments)
+        self.fps = [None] * len(segments)
+        self.on_progress = lambda percent, fps: None  # Set by the engine to forward overall progress
+
+    def take(self, cancelled):
+        """Next segment index to encode, or None once all are taken or the job is failing."""
+        with self.condition:
+            if cancelled or self.returncode or not self.pending:
+                return None
+            self.active += 1
+            return self.pending.popleft()
+
+    def report(self, index, progress):
+        """Record a segment's progress; returns overall percent and combined fps."""
+        with self.condition:
+            self.percents[index] = progress["percent"]
+            self.fps[index] = progress["fps"]
+            percent = sum(w * p for w, p in zip(self.weights, self.percents)) / sum(self.weights)
+            running_fps = [fps for i, fps in enumerate(self.fps) if fps is not None and self.percents[i] < 100]
+            return percent, (sum(running_fps) if running_fps else None)
+
+    def finish(self, index, returncode, output_tail):
+        with self.condition:
+            self.active -= 1
+            self.fps[index] = None
+            if returncode == 0:
+                self.completed += 1
+                self.percents[index] = 100.0
+            elif not self.returncode:
+                self.returncode = returncode
+                self.output_tail = list(output_tail)
+            self.condition.notify_all()
+
+    def wait(self):
+        """Block until no segment is being encoded."""
+        with self.condition:
+            while self.active:
+                self.condition.wait()
+
+    @property
+    def succeeded(self):
+        return self.completed == len(self.segments)
@@ -0,0 +1,188 @@
+"""Read-ahead staging of queued recordings onto a fast local drive.
+
+While one file encodes, the next stage_ahead queued files are copied from
+the source share or spinning disk into stage_dir with large sequential
+reads, and HandBrakeCLI reads the local copy instead of seeking over the
+network. Copies are kept within stage_max_gb: the least recently used one
+that no encoder is reading is evicted first. The copy only ever replaces
+the -i argument; the job journal, the output name and deleting the
+original all keep using the path in source_dir.
+"""
+import os
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+STAGE_CHUNK_BYTES = 8 * 1024 * 1024  # One sequential read; large enough that a NAS streams instead of seeking
+STAGED_NAME = re.compile(r"^[0-9a-f]{12} ")  # Every staged copy starts with its source's hash
+
+def source_key(path):
+    """(size, mtime_ns) of path, to tell whether a staged copy still matches its source; raises OSError."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def copy_sequential(source, target, should_stop):
+    """Copy source to target in STAGE_CHUNK_BYTES reads; returns False if should_stop() said to give up."""
+    buffer = bytearray(STAGE_CHUNK_BYTES)
+    view = memoryview(buffer)
+    with open(source, "rb", buffering=0) as src, open(target, "wb") as dst:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)  # Let the kernel read further ahead
+        while True:
+            if should_stop():
+                return False
+            count = src.readinto(buffer)
+            if not count:
+                return True
+            dst.write(view[:count])
+
+class StagedFile:
+    __slots__ = ("path", "size", "key")
+
+    def __init__(self, path, size, key):
+        self.path = path
+        self.size = size
+        self.key = key
+
+class StagingCache:
+    """Local copies of source files within a byte budget, evicted least recently used first.
+
+    stage() runs on the engine's staging thread; checkout() and release() on encode slots.
+    """
+
+    def __init__(self, stage_dir, max_bytes, log=None):
+        self.stage_dir = stage_dir
+        self.max_bytes = max_bytes
+        self.log = log or (lambda message, level="INFO": None)
+        self.lock = threading.Lock()
+        self.files = OrderedDict()  # input_file -> StagedFile, least recently used first
+        self.in_use = set()  # input_files an encoder is reading from their staged copy
+        self.wanted_now = set()  # input_files whose encode started; a copy still in progress is abandoned
+        self.too_large = set()  # input_files that can never fit the budget
+        self.remove_leftovers()
+
+    @property
+    def used_bytes(self):
+        return sum(staged.size for staged in self.files.values())
+
+    def staged_size(self, input_file):
+        with self.lock:
+            staged = self.files.get(input_file)
+        return staged.size if staged else 0
+
+    def path_for(self, input_file):
+        name = os.path.basename(input_file)
+        digest = hashlib.sha1(input_file.encode("utf-8", "surrogatepass")).hexdigest()[:12]
+        return os.path.join(self.stage_dir, f"{digest} {name}")
+
+    def remove_leftovers(self):
+        """Delete copies left by an earlier run; their sources may have changed since."""
+        try:
+            names = os.listdir(self.stage_dir)
+        except OSError:
+            return
+        for name in names:
+            if STAGED_NAME.match(name):
+                try:
+                    os.remove(os.path.join(self.stage_dir, name))
+                except OSError:
+                    pass  # Still open in another OBSRecode; it cleans up after itself
+
+    def needs_staging(self, input_file):
+        with self.lock:
+            return input_file not in self.files and input_file not in self.wanted_now and input_file not in self.too_large
+
+    def make_room(self, size, protected=()):
+        """Evict copies not in use or protected until size more bytes fit; caller holds the lock. False if they cannot."""
+        if size > self.max_bytes:
+            return False
+        evictable = [f for f in self.files if f not in self.in_use and f not in protected]
+        while self.used_bytes + size > self.max_bytes and evictable:
+            self.discard(evictable.pop(0))
+        return self.used_bytes + size <= self.max_bytes
+
+    def discard(self, input_file):
+        """Forget and delete input_file's copy; caller holds the lock."""
+        staged = self.files.pop(input_file, None)
+        if staged:
+            try:
+                os.remove(staged.path)
+            except OSError:
+                pass
+
+    def stage(self, input_file, should_stop, upcoming=()):
+        """Copy input_file into stage_dir; returns False if it was not staged (no room, stopped or unreadable).
+
+        Copies of the upcoming files are never evicted to make room for it.
+        """
+        try:
+            key = source_key(input_file)
+        except OSError:
+            return False  # The encode reports the missing file
+        with self.lock:
+            if not self.make_room(key[0], upcoming):
+                if key[0] > self.max_bytes:
+                    self.too_large.add(input_file)
+                return False
+        path = self.path_for(input_file)
+        partial = path + ".part"
+        stop = lambda: should_stop() or input_file in self.wanted_now
+        try:
+            copied = copy_sequential(input_file, partial, stop)
+            if copied and (os.path.getsize(partial) != key[0] or source_key(input_file) != key):
+                copied = False  # Changed while it was copied; the encoder reads the source instead
+            if copied:
+                os.replace(partial, path)
+        except OSError as e:
+            self.log(f"Cannot stage {os.path.basename(input_file)}: {e}", "WARNING")
+            copied = False
+        if not copied:
+            try:
+                os.remove(partial)
+            except OSError:
+                pass
+            return False
+        with self.lock:
+            if input_file in self.wanted_now or not self.make_room(key[0], upcoming):
+                try:
+                    os.remove(path)  # Its encode started while the last chunk was copied
+                except OSError:
+                    pass
+                return False
+            self.files[input_file] = StagedFile(path, key[0], key)
+        return True
+
+    def checkout(self, input_file):
+        """Path the encoder should read input_file from: its staged copy if current, else input_file itself."""
+        with self.lock:
+            self.wanted_now.add(input_file)
+            staged = self.files.get(input_file)
+        if staged is None:
+            return input_file
+        try:
+            current = source_key(input_file) == staged.key
+        except OSError:
+            current = False
+        with self.lock:
+            if not current or input_file not in self.files:
+                self.discard(input_file)
+                return input_file
+            self.files.move_to_end(input_file)
+            self.in_use.add(input_file)
+        return staged.path
+
+    def release(self, input_file, keep=False):
+        """The encode of input_file ended; keep its copy (e.g. for a retry) until the budget needs the room."""
+        with self.lock:
+            self.in_use.discard(input_file)
+            self.wanted_now.discard(input_file)
+            if not keep:
+                self.discard(input_file)
+
+    def clear(self):
+        with self.lock:
+            for input_file in list(self.files):
+                self.discard(input_file)
+            self.in_use.clear()
+            self.wanted_now.clear()
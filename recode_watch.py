@@ -0,0 +1,144 @@
+"""Watch-folder mode: hand recordings to the encoder as soon as OBS has finished writing them.
+
+New files are noticed through inotify on Linux and by rescanning source_dir
+every watch_poll_interval seconds elsewhere (and in recursive mode); both go
+through the shared SourceIndex. A file is only reported once its size and
+mtime have stayed the same for watch_quiet_period seconds, so half-written
+recordings are never picked up.
+"""
+import os
+import sys
+import time
+import select
+import threading
+import ctypes
+import ctypes.util
+
+from recode_engine import find_video_files
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+TICK_INTERVAL = 1.0  # Seconds between stability checks
+
+class InotifyWatch:
+    """Minimal ctypes binding to inotify for a single directory."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Writes are not watched: stability is checked by stat on every tick
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout):
+        """Return True if anything changed in the folder within timeout seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            os.read(self.fd, 65536)  # Drain; which file changed is settled by the rescan
+        except BlockingIOError:
+            return False
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    """Calls on_ready(path) once for every new, finished recording in settings["source_dir"]."""
+
+    def __init__(self, settings, on_ready, known_files=(), log=None, journal=None):
+        self.settings = settings
+        self.journal = journal  # Files it records as encoded are not reported again
+        self.source_dir = settings["source_dir"]
+        self.on_ready = on_ready
+        self.log = log or (lambda message, level="INFO": None)
+        self.quiet_period = float(settings.get("watch_quiet_period", 30))
+        self.poll_interval = float(settings.get("watch_poll_interval", 5))
+        self.seen = {os.path.abspath(path) for path in known_files}  # Already queued or ignored
+        self.candidates = {}  # path -> (size, mtime, time the pair was last seen changing)
+        self.stop_flag = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="folder-watch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_flag.set()
+        if self.thread:
+            self.thread.join()
+
+    def is_candidate(self, path):
+        # Never feed our own output back in when encoding into the source folder
+        if os.path.basename(path).startswith("RE ") and \
+                os.path.normcase(os.path.dirname(path)) == os.path.normcase(os.path.abspath(self.settings["output_dir"])):
+            return False
+        return True
+
+    def rescan(self):
+        try:
+            present = set(find_video_files(self.settings, self.journal))
+        except OSError as e:
+            self.log(f"Watch: cannot list {self.source_dir}: {e}", "WARNING")
+            return
+        for path in present:
+            if path not in self.seen and path not in self.candidates and self.is_candidate(path):
+                self.candidates[path] = (None, None, time.monotonic())
+        self.seen &= present  # Forget deleted originals so a re-recorded name is picked up again
+
+    def check_candidates(self):
+        """Report candidates whose size and mtime have been stable for the quiet period."""
+        now = time.monotonic()
+        for path, (size, mtime, changed_at) in list(self.candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]  # Renamed or deleted before it settled
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                self.candidates[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - changed_at >= self.quiet_period:
+                del self.candidates[path]
+                self.seen.add(path)
+                self.log(f"Watch: {os.path.basename(path)} finished writing, queueing for encode.")
+                self.on_ready(path)
+
+    def open_inotify(self):
+        if not sys.platform.startswith("linux") or self.settings.get("recursive_scan"):
+            return None
+        try:
+            return InotifyWatch(self.source_dir)
+        except (OSError, AttributeError) as e:
+            self.log(f"Watch: inotify unavailable ({e}), polling every {self.poll_interval:g}s instead.", "DEBUG")
+            return None
+
+    def run(self):
+        inotify = self.open_inotify()
+        self.log(f"Watching {self.source_dir} for new recordings ({'inotify' if inotify else 'polling'}, "
+                 f"{self.quiet_period:g}s quiet period).")
+        self.rescan()
+        last_scan = time.monotonic()
+        try:
+            while not self.stop_flag.is_set():
+                if inotify:
+                    if inotify.wait(TICK_INTERVAL):
+                        self.rescan()
+                else:
+                    self.stop_flag.wait(TICK_INTERVAL)
+                    if time.monotonic() - last_scan >= self.poll_interval:
+                        self.rescan()
+                        last_scan = time.monotonic()
+                self.check_candidates()
+        finally:
+            if inotify:
+                inotify.close()